@@ -0,0 +1,218 @@
+"""
+asyncio versions of the Point API and File API calls made by the other examples.
+
+These take the same parameters and return the same 'data' and 'files' structures as the blocking calls in
+utils.py and file_api_download_full_issuance.py, so either can be used by the example scripts. Requests take a
+slot from the same limiter as the blocking calls (see rate_limit.py), and are retried in the same way when the
+API is rate limiting us, has a server error or the connection fails.
+
+To use, first install aiohttp from pip:
+    pip install aiohttp
+"""
+import asyncio
+import json
+import os
+import time
+from urllib.parse import urljoin
+
+import aiohttp
+
+from instrumentation import record_retry, trace
+from rate_limit import DEFAULT_RETRIES, backoff_delay, get_limiter, get_retry_after, is_overloaded
+from utils import HOST, PointResult, build_point_api_params, get_api_key
+
+# Limits on the number of open connections, in total and to any single host.
+DEFAULT_CONNECTION_LIMIT = 100
+DEFAULT_CONNECTION_LIMIT_PER_HOST = 32
+
+# The number of seconds to allow for a single request, including reading the response body.
+DEFAULT_TIMEOUT = 60
+
+
+def create_session(limit=DEFAULT_CONNECTION_LIMIT, limit_per_host=DEFAULT_CONNECTION_LIMIT_PER_HOST,
+                   timeout=DEFAULT_TIMEOUT):
+    """
+    Create a client session whose connection pool is bounded in total and per host.
+
+    The session should be shared by all requests and closed when done, ideally with 'async with'.
+    """
+    connector = aiohttp.TCPConnector(limit=limit, limit_per_host=limit_per_host)
+    return aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=timeout))
+
+
+def _is_retryable(error):
+    if isinstance(error, aiohttp.ClientResponseError):
+        return is_overloaded(error.status)
+
+    return isinstance(error, (aiohttp.ClientConnectionError, asyncio.TimeoutError))
+
+
+def _retry_delay(error, attempt):
+    # A ClientResponseError carries the response headers, so the Retry-After header can be read from it.
+    delay = get_retry_after(error) if isinstance(error, aiohttp.ClientResponseError) else None
+    return delay if delay is not None else backoff_delay(attempt)
+
+
+async def _get_json(session, operation, url, params, headers, retries=DEFAULT_RETRIES):
+    """
+    Make a GET request in a slot from the shared limiter and decode the JSON response, retrying after the
+    Retry-After delay or an exponential backoff if the API is overloaded or the connection fails.
+    """
+    for attempt in range(retries + 1):
+        try:
+            async with get_limiter().async_slot() as slot:
+                with trace(operation, url) as request_trace:
+                    async with session.get(url, headers=headers, params=params) as response:
+                        slot.record(response)
+                        request_trace.status = response.status
+                        response.raise_for_status()
+                        body = await response.read()
+                    request_trace.add_bytes(len(body))
+                    return request_trace.decode_json(lambda: json.loads(body))
+        except Exception as error:
+            if attempt == retries or not _is_retryable(error):
+                raise
+
+            delay = _retry_delay(error, attempt)
+            record_retry(operation, url, attempt + 1, delay, error)
+            await asyncio.sleep(delay)
+
+
+async def get_point_api_response(lat, lon, bundles=None, time_bundle=None, valid_time_interval=None,
+                                 issuance_time=None, api_key=None, session=None):
+    """
+    Fetch the point forecast data.
+
+    If no session is given a temporary one is created for this request.
+    """
+    if api_key is None:
+        api_key = get_api_key()
+    if session is None:
+        async with create_session() as session:
+            return await get_point_api_response(lat, lon, bundles, time_bundle, valid_time_interval,
+                                                issuance_time, api_key, session)
+
+    url = urljoin(HOST, '/forecast/point')
+    params = build_point_api_params(lat, lon, bundles, time_bundle, valid_time_interval, issuance_time)
+    json_response = await _get_json(session, 'point', url, params, {'spire-api-key': api_key})
+
+    # If there is no 'data' element then raise an error.
+    if 'data' not in json_response:
+        raise Exception('Response did not contain a data element', json_response)
+
+    return json_response['data']
+
+
+async def get_point_api_responses(points, bundles=None, time_bundle=None, valid_time_interval=None,
+                                  issuance_time=None, api_key=None, session=None, max_concurrency=100):
+    """
+    Fetch the point forecast data for many (lat, lon) points.
+
+    At most max_concurrency requests run at once. The shared limiter (see rate_limit.py) is asked to allow that
+    many, but it halves its limit whenever the API responds with a 429 or a server error, and if the
+    spire-api-max-concurrency environment variable is set it never allows more than that. A session passed in
+    also needs a connection pool at least as large (see create_session), or requests wait for connections.
+
+    A PointResult is yielded for each point as soon as its request finishes. If the caller stops iterating or is
+    cancelled, any requests still running are cancelled.
+    """
+    if api_key is None:
+        api_key = get_api_key()
+    if session is None:
+        async with create_session(limit=max_concurrency, limit_per_host=max_concurrency) as session:
+            async for result in get_point_api_responses(points, bundles, time_bundle, valid_time_interval,
+                                                        issuance_time, api_key, session, max_concurrency):
+                yield result
+        return
+
+    get_limiter(max_concurrency)
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def fetch(lat, lon):
+        async with semaphore:
+            start = time.perf_counter()
+            data = await get_point_api_response(lat, lon, bundles, time_bundle, valid_time_interval,
+                                                issuance_time, api_key, session)
+            return PointResult(lat, lon, data, time.perf_counter() - start)
+
+    # Tasks wait on the semaphore before making a request, so creating one per point is cheap.
+    tasks = [asyncio.ensure_future(fetch(lat, lon)) for lat, lon in points]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def get_file_list(bundles='basic', time_bundle='medium_range_std_freq', api_key=None, session=None):
+    """
+    List the forecast files currently available from the File API.
+    """
+    if api_key is None:
+        api_key = get_api_key()
+    if session is None:
+        async with create_session() as session:
+            return await get_file_list(bundles, time_bundle, api_key, session)
+
+    url = urljoin(HOST, '/forecast/file')
+    params = {'bundles': bundles, 'time_bundle': time_bundle}
+    json_response = await _get_json(session, 'file_list', url, params, {'spire-api-key': api_key})
+
+    if 'files' not in json_response:
+        raise Exception('Response did not contain a files element', json_response)
+
+    return json_response['files']
+
+
+async def download_file(forecast, output_directory=None, api_key=None, session=None, chunk_size=1024 * 1024,
+                        retries=DEFAULT_RETRIES):
+    """
+    Download a single forecast file from the File API, streaming it to disk. Returns the output path.
+
+    The download is retried from the start if the API is overloaded or the connection fails.
+    """
+    if api_key is None:
+        api_key = get_api_key()
+    if session is None:
+        async with create_session() as session:
+            return await download_file(forecast, output_directory, api_key, session, chunk_size, retries)
+
+    for attempt in range(retries + 1):
+        try:
+            return await _download_file(forecast, output_directory, api_key, session, chunk_size)
+        except Exception as error:
+            if attempt == retries or not _is_retryable(error):
+                raise
+
+            delay = _retry_delay(error, attempt)
+            record_retry('file', forecast, attempt + 1, delay, error)
+            await asyncio.sleep(delay)
+
+
+async def _download_file(forecast, output_directory, api_key, session, chunk_size):
+    output_file_path = os.path.join(output_directory, forecast) if output_directory else forecast
+    url = urljoin(HOST, '/forecast/file/') + forecast
+    headers = {'spire-api-key': api_key}
+    # Large files can take much longer than the session timeout to download,
+    # so only time out if the server stops sending data.
+    timeout = aiohttp.ClientTimeout(total=None, sock_read=DEFAULT_TIMEOUT)
+    try:
+        async with get_limiter().async_slot() as slot:
+            with trace('file', url) as request_trace:
+                async with session.get(url, headers=headers, allow_redirects=True, timeout=timeout) as response:
+                    slot.record(response)
+                    request_trace.status = response.status
+                    response.raise_for_status()
+                    with open(output_file_path, 'wb') as f:
+                        async for chunk in response.content.iter_chunked(chunk_size):
+                            f.write(chunk)
+                            request_trace.add_bytes(len(chunk))
+    except BaseException:
+        # Don't leave a truncated file behind if the download failed or was cancelled.
+        if os.path.exists(output_file_path):
+            os.remove(output_file_path)
+        raise
+
+    return output_file_path
@@ -0,0 +1,66 @@
+"""
+Compare the scalar and NumPy array wind conversions on a global 0.125° grid.
+
+    python examples/benchmarks/bench_conversions.py
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from conversions import (wind_direction_from_u_v, wind_direction_from_u_v_array, wind_speed_from_u_v,
+                         wind_speed_from_u_v_array)
+
+# The shape of a global grid at 0.125° resolution.
+GLOBAL_0P125_SHAPE = (1441, 2880)
+
+
+def time_call(func, repeat):
+    """
+    Return the best time in seconds of several calls to func.
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+
+    return best
+
+
+def run_benchmark(shape, scalar_points, repeat):
+    rng = np.random.default_rng(0)
+    u = rng.normal(0, 8, shape).astype(np.float32)
+    v = rng.normal(0, 8, shape).astype(np.float32)
+    speed = np.empty_like(u)
+    direction = np.empty_like(u)
+
+    array_time = time_call(lambda: (wind_speed_from_u_v_array(u, v, out=speed),
+                                    wind_direction_from_u_v_array(u, v, out=direction)), repeat)
+
+    # The scalar functions are far too slow to run over a whole grid, so time a sample and scale it up.
+    u_sample = u.ravel()[:scalar_points].tolist()
+    v_sample = v.ravel()[:scalar_points].tolist()
+    sample_time = time_call(lambda: [(wind_speed_from_u_v(a, b), wind_direction_from_u_v(a, b))
+                                     for a, b in zip(u_sample, v_sample)], repeat)
+    scalar_time = sample_time * u.size / len(u_sample)
+
+    print('Grid of %d x %d points' % shape)
+    print('  array:  %8.1f ms' % (array_time * 1000))
+    print('  scalar: %8.1f ms (estimated from %d points)' % (scalar_time * 1000, len(u_sample)))
+    print('  speedup: %.0fx' % (scalar_time / array_time))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the scalar and array wind conversions')
+    parser.add_argument('--scalar_points', type=int, default=100000,
+                        help='The number of points to time the scalar conversions over')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='The number of times to repeat each measurement')
+
+    args = parser.parse_args()
+    run_benchmark(GLOBAL_0P125_SHAPE, args.scalar_points, args.repeat)
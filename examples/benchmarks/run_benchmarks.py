@@ -0,0 +1,347 @@
+"""
+Run the benchmark suite offline and write the results as JSON
+
+The API scenarios run against a local stub server (see stub_server.py) with a simulated network latency,
+and the GRIB scenarios use synthetic GRIB2 files (see synthetic_grib.py). Each scenario runs in its own
+process so that its peak memory use can be measured. For every scenario the results record the number
+of operations, throughput, p50 and p99 latency and peak RSS.
+
+    python run_benchmarks.py --resolution 0p25 --latency_ms 20 --output bench_results.json
+
+The scenarios are:
+
+    single_point        sequential point requests with utils.get_point_api_response
+    batch_points        concurrent point requests with utils.get_point_api_responses
+    issuance_download   downloading a full 29 file issuance from the File API
+    export_download     downloading the files of a data export
+    cli_cold_start      running spire_wx.py point and file --list in a new interpreter each time
+    wind_conversion     converting global u/v wind grids to speed and direction
+    grid_conversion     converting an issuance of GRIB files to a memory-mapped store (requires pygrib)
+    issuance_pipeline   extracting points and wind speed from an issuance with one worker and with one per CPU
+                        (requires pygrib)
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import redirect_stdout
+from datetime import datetime, timezone
+
+import numpy as np
+
+BENCHMARKS_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+EXAMPLES_DIRECTORY = os.path.dirname(BENCHMARKS_DIRECTORY)
+sys.path.insert(0, EXAMPLES_DIRECTORY)
+sys.path.insert(0, os.path.join(EXAMPLES_DIRECTORY, 'working_with_grib_data'))
+
+import synthetic_grib
+from stub_server import StubApi, start_server
+
+# The file names of a medium range, standard frequency issuance: 29 lead times at 6 hour intervals.
+ISSUANCE_FILES = ['sof-d.20190920.t00z.%s.basic.global.f%03d.grib2' % ('{resolution}', step)
+                  for step in range(0, 169, 6)]
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def summarise(latencies, elapsed):
+    latencies = np.asarray(latencies) * 1000
+    return {
+        'operations': len(latencies),
+        'seconds': elapsed,
+        'throughput_per_second': len(latencies) / elapsed if elapsed else None,
+        'p50_ms': float(np.percentile(latencies, 50)) if len(latencies) else None,
+        'p99_ms': float(np.percentile(latencies, 99)) if len(latencies) else None,
+    }
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def single_point(options):
+    import utils
+
+    latencies = []
+    start = time.perf_counter()
+    for i in range(options['points']):
+        _, latency = timed(utils.get_point_api_response, 10.0 + i * 0.01, 20.0, 'basic', 'medium_range_std_freq')
+        latencies.append(latency)
+
+    return summarise(latencies, time.perf_counter() - start)
+
+
+def batch_points(options):
+    import utils
+
+    points = [(10.0 + i * 0.01, 20.0) for i in range(options['points'])]
+    start = time.perf_counter()
+    latencies = [result.latency for result in utils.get_point_api_responses(
+        points, 'basic', 'medium_range_std_freq', max_in_flight=options['concurrency']
+    )]
+
+    return summarise(latencies, time.perf_counter() - start)
+
+
+def issuance_download(options):
+    import file_api_download_full_issuance as file_api
+    import utils
+
+    session = utils.get_session()
+    headers = {'spire-api-key': utils.get_api_key()}
+    output_directory = os.path.join(options['work_directory'], 'issuance_download')
+    os.makedirs(output_directory)
+
+    start = time.perf_counter()
+    file_list = file_api.get_file_list(session, headers)
+    with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+        results = list(pool.map(lambda forecast: timed(file_api.download_forecast_file, session, headers, forecast,
+                                                       output_directory), file_list))
+    elapsed = time.perf_counter() - start
+
+    summary = summarise([latency for _, latency in results], elapsed)
+    total_bytes = sum(size for size, _ in results)
+    summary['bytes'] = total_bytes
+    summary['bytes_per_second'] = total_bytes / elapsed
+    return summary
+
+
+def export_download(options):
+    from requests import Session
+
+    import export_download as export
+
+    export.base_url = options['url'] + '/export'
+    session = Session()
+    local_path = os.path.join(options['work_directory'], 'export_download')
+
+    start = time.perf_counter()
+    files = export.get_file_list(session, 'benchmark')
+    with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+        results = list(pool.map(lambda path: timed(export.download_file, session, 'benchmark', path, local_path),
+                                files))
+    elapsed = time.perf_counter() - start
+
+    summary = summarise([latency for _, latency in results], elapsed)
+    total_bytes = sum(entry['size'] for entry, _ in results)
+    summary['bytes'] = total_bytes
+    summary['bytes_per_second'] = total_bytes / elapsed
+    return summary
+
+
+def cli_cold_start(options):
+    """
+    Time whole runs of the command line tool, including starting Python, for a single point and a file listing.
+    """
+    script = os.path.join(EXAMPLES_DIRECTORY, 'spire_wx.py')
+    commands = {
+        'point': ['point', '--lat', '10.0', '--lon', '20.0'],
+        'file': ['file', '--list'],
+    }
+
+    summary = {}
+    for name, command in commands.items():
+        latencies = []
+        start = time.perf_counter()
+        for _ in range(options['repeat']):
+            run_start = time.perf_counter()
+            subprocess.run([sys.executable, script] + command, stdout=subprocess.DEVNULL, check=True)
+            latencies.append(time.perf_counter() - run_start)
+        summary[name] = summarise(latencies, time.perf_counter() - start)
+
+    # The interpreter alone, for comparison.
+    latencies = [timed(subprocess.run, [sys.executable, '-c', 'pass'])[1] for _ in range(options['repeat'])]
+    summary['python_startup_p50_ms'] = float(np.percentile(latencies, 50)) * 1000
+    return summary
+
+
+def wind_conversion(options):
+    from conversions import wind_direction_from_u_v_array, wind_speed_from_u_v_array
+
+    shape = synthetic_grib.grid_shape(options['resolution'])
+    u = synthetic_grib.synthetic_field(shape, 1, 0).astype(np.float32)
+    v = synthetic_grib.synthetic_field(shape, 2, 0).astype(np.float32)
+    speed = np.empty_like(u)
+    direction = np.empty_like(u)
+
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(options['repeat']):
+        _, latency = timed(lambda: (wind_speed_from_u_v_array(u, v, out=speed),
+                                    wind_direction_from_u_v_array(u, v, out=direction)))
+        latencies.append(latency)
+
+    summary = summarise(latencies, time.perf_counter() - start)
+    summary['grid_points'] = u.size
+    return summary
+
+
+def grid_conversion(options):
+    from grid_store import GridStore, convert_issuance
+
+    files = sorted(os.path.join(options['grib_directory'], name) for name in os.listdir(options['grib_directory']))
+    output_directory = os.path.join(options['work_directory'], 'grid_conversion')
+
+    _, elapsed = timed(convert_issuance, files, output_directory)
+
+    # Time point reads from the converted store as well.
+    store = GridStore(output_directory)
+    rng = np.random.default_rng(0)
+    latencies = []
+    for lat, lon in zip(rng.uniform(-80, 80, 1000), rng.uniform(-180, 180, 1000)):
+        _, latency = timed(store.point, '2t', lat, lon)
+        latencies.append(latency)
+
+    summary = summarise(latencies, sum(latencies))
+    summary['conversion_seconds'] = elapsed
+    summary['files'] = len(files)
+    return summary
+
+
+def issuance_pipeline(options):
+    """
+    Run the same pipeline over the synthetic issuance with one worker process and with one per CPU, to show
+    how it scales.
+    """
+    from issuance_pipeline import build_stages, find_issuance_files, run_pipeline
+
+    files = find_issuance_files(options['grib_directory'])
+    rng = np.random.default_rng(0)
+    points = (rng.uniform(-80, 80, options['points']), rng.uniform(-180, 180, options['points']))
+    stages = build_stages(['10u', '10v', '2t'], points=points, derived=['wind_speed'])
+
+    summary = {'files': len(files)}
+    for workers in sorted({1, os.cpu_count()}):
+        latencies = []
+        for _ in range(options['repeat']):
+            _, latency = timed(lambda: list(run_pipeline(files, stages, workers)))
+            latencies.append(latency)
+        summary['workers_%d' % workers] = summarise(latencies, sum(latencies))
+
+    summary['speedup'] = (summary['workers_1']['p50_ms'] /
+                          summary['workers_%d' % os.cpu_count()]['p50_ms'])
+    return summary
+
+
+SCENARIOS = {
+    'single_point': single_point,
+    'batch_points': batch_points,
+    'issuance_download': issuance_download,
+    'export_download': export_download,
+    'cli_cold_start': cli_cold_start,
+    'wind_conversion': wind_conversion,
+    'grid_conversion': grid_conversion,
+    'issuance_pipeline': issuance_pipeline,
+}
+
+
+def run_scenario(name, options):
+    """
+    Run a scenario in a worker process, with its output suppressed, and add its peak memory use.
+    """
+    with redirect_stdout(io.StringIO()):
+        result = SCENARIOS[name](options)
+
+    result['peak_rss_mb'] = peak_rss_mb()
+    return result
+
+
+def run_benchmarks(scenarios, resolution, latency_ms, points, concurrency, repeat, grib_steps):
+    work_directory = tempfile.mkdtemp(prefix='spire-benchmarks-')
+    try:
+        # Write a few lead times of synthetic GRIB data. The stub serves the first one for any other lead times.
+        grib_directory = os.path.join(work_directory, 'grib')
+        os.makedirs(grib_directory)
+        for step in range(0, 6 * grib_steps, 6):
+            name = 'sof-d.20190920.t00z.%s.basic.global.f%03d.grib2' % (resolution, step)
+            synthetic_grib.write_file(os.path.join(grib_directory, name), resolution, step)
+
+        forecast_files = [name.format(resolution=resolution) for name in ISSUANCE_FILES]
+        api = StubApi(grib_directory=grib_directory, latency=latency_ms / 1000, forecast_files=forecast_files)
+        server, url = start_server(api)
+
+        # Point the examples at the stub server. These are read when each worker process imports utils.
+        os.environ['spire-api-host'] = url
+        os.environ['spire-api-key'] = 'benchmark'
+
+        options = {
+            'url': url,
+            'resolution': resolution,
+            'points': points,
+            'concurrency': concurrency,
+            'repeat': repeat,
+            'grib_directory': grib_directory,
+            'work_directory': work_directory,
+        }
+
+        results = {}
+        for name in scenarios:
+            print('Running %s...' % name)
+            with ProcessPoolExecutor(max_workers=1) as pool:
+                try:
+                    results[name] = pool.submit(run_scenario, name, options).result()
+                except ImportError as error:
+                    results[name] = {'skipped': str(error)}
+
+        server.shutdown()
+    finally:
+        shutil.rmtree(work_directory, ignore_errors=True)
+
+    return {
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'parameters': {
+            'resolution': resolution,
+            'latency_ms': latency_ms,
+            'points': points,
+            'concurrency': concurrency,
+            'repeat': repeat,
+            'grib_steps': grib_steps,
+        },
+        'results': results,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run the benchmark suite and write the results as JSON')
+    parser.add_argument('--scenarios', type=str, default=','.join(SCENARIOS),
+                        help='The scenarios to run (separate by commas)')
+    parser.add_argument('--resolution', type=str, choices=sorted(synthetic_grib.RESOLUTIONS), default='0p25',
+                        help='The resolution of the synthetic GRIB data')
+    parser.add_argument('--latency_ms', type=float, default=20,
+                        help='The simulated network latency of the stub API in milliseconds')
+    parser.add_argument('--points', type=int, default=200,
+                        help='The number of points to request in the point scenarios')
+    parser.add_argument('--concurrency', type=int, default=8,
+                        help='The number of concurrent requests or downloads')
+    parser.add_argument('--repeat', type=int, default=10,
+                        help='The number of repetitions of the conversion scenarios')
+    parser.add_argument('--grib_steps', type=int, default=3,
+                        help='The number of synthetic GRIB lead times to write for the grid conversion')
+    parser.add_argument('--output', type=str, default='bench_results.json',
+                        help='The file to write the results to')
+
+    args = parser.parse_args()
+    report = run_benchmarks(args.scenarios.split(','), args.resolution, args.latency_ms, args.points,
+                            args.concurrency, args.repeat, args.grib_steps)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    for scenario, result in report['results'].items():
+        print('%-18s %s' % (scenario, json.dumps(result)))
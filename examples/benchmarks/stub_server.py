@@ -0,0 +1,242 @@
+"""
+A local stand-in for the Spire Weather Point, File and Export APIs
+
+The server replays recorded responses so that the API examples can be benchmarked offline. Every response
+is delayed by a configurable latency to simulate the network. Point responses and file listings can be
+recorded from the real API and placed in a directory:
+
+    point.json         the body of a /forecast/point response
+    files.json         the body of a /forecast/file response
+    export.json        the body of an /export/<export id> response
+
+Any that are missing are generated. Forecast files are served from a directory of GRIB files (for example
+written by synthetic_grib.py), and export files are filled with random bytes. Range requests are supported
+so that resumed downloads can be benchmarked.
+
+For tests, fail_next() makes the next requests fail with an error status such as 429, and the server counts
+the requests it has received and the most it has handled at once.
+
+    python stub_server.py --port 8081 --latency_ms 20 --grib_directory synthetic
+"""
+import argparse
+import json
+import os
+import re
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+# The number of lead times and the interval between them in generated point responses.
+GENERATED_STEPS = 29
+GENERATED_STEP_HOURS = 6
+
+_RANGE = re.compile(r'bytes=(\d+)-(\d*)')
+
+
+def generate_point_response(steps=GENERATED_STEPS, step_hours=GENERATED_STEP_HOURS,
+                            issuance_time=datetime(2019, 9, 20)):
+    data = []
+    for step in range(steps):
+        valid_time = issuance_time + timedelta(hours=step * step_hours)
+        data.append({
+            'times': {'issuance_time': issuance_time.isoformat() + '+00:00',
+                      'valid_time': valid_time.isoformat() + '+00:00'},
+            'values': {
+                'air_temperature': 280.0 + step % 8,
+                'eastward_wind': 3.0 - step % 5,
+                'northward_wind': -1.0 + step % 3,
+                'precipitation_amount': 0.5 * step,
+                'relative_humidity': 60.0 + step % 20,
+            },
+        })
+
+    return {'data': data}
+
+
+class StubApi(object):
+    """
+    The recorded responses and files served by the stub server.
+    """
+
+    def __init__(self, recordings_directory=None, grib_directory=None, latency=0.0, forecast_files=None,
+                 export_files=100, export_file_size=64 * 1024):
+        self.latency = latency
+        self.grib_directory = grib_directory
+        self.export_file_size = export_file_size
+
+        self.point = self._load(recordings_directory, 'point.json') or generate_point_response()
+
+        grib_files = sorted(os.listdir(grib_directory)) if grib_directory else []
+        self.files = self._load(recordings_directory, 'files.json') or {'files': forecast_files or grib_files}
+
+        self.export = self._load(recordings_directory, 'export.json') or {
+            'files': ['part-%05d.bin' % i for i in range(export_files)]
+        }
+        self.export_content = os.urandom(export_file_size)
+
+        # The (status, Retry-After) of the responses to send instead of the next requests' real ones.
+        self.failures = deque()
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+        self.point_body = json.dumps(self.point).encode('utf-8')
+        self.files_body = json.dumps(self.files).encode('utf-8')
+        self.export_body = json.dumps(self.export).encode('utf-8')
+
+    @staticmethod
+    def _load(directory, filename):
+        if directory and os.path.exists(os.path.join(directory, filename)):
+            with open(os.path.join(directory, filename)) as f:
+                return json.load(f)
+
+        return None
+
+    def fail_next(self, status, count=1, retry_after=None):
+        """
+        Respond to the next count requests with an error status, and a Retry-After header if one is given.
+        """
+        self.failures.extend([(status, retry_after)] * count)
+
+    def start_request(self):
+        """
+        Count a request, returning the (status, Retry-After) to fail it with or None to serve it.
+        """
+        with self._lock:
+            self.requests += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            return self.failures.popleft() if self.failures else None
+
+    def end_request(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def forecast_file(self, name):
+        """
+        Return the content of a forecast file. Files which are listed but not in the GRIB directory
+        are served with the content of the first GRIB file.
+        """
+        if not self.grib_directory:
+            return None
+
+        path = os.path.join(self.grib_directory, os.path.basename(name))
+        if not os.path.exists(path):
+            available = sorted(os.listdir(self.grib_directory))
+            if not available:
+                return None
+            path = os.path.join(self.grib_directory, available[0])
+
+        with open(path, 'rb') as f:
+            return f.read()
+
+
+class StubRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # The headers and body are written separately, so without this every keep-alive response waits for a
+    # delayed ACK and adds about 40ms to the simulated latency.
+    disable_nagle_algorithm = True
+
+    # Set by start_server().
+    api = None
+
+    def send_body(self, status, body, content_type='application/octet-stream', headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_content(self, content):
+        """
+        Send file content, honouring a Range header if there is one.
+        """
+        match = _RANGE.match(self.headers.get('Range', ''))
+        if not match:
+            self.send_body(200, content)
+            return
+
+        start = int(match.group(1))
+        end = int(match.group(2)) if match.group(2) else len(content) - 1
+        if start >= len(content):
+            self.send_body(416, b'', headers={'Content-Range': 'bytes */%d' % len(content)})
+            return
+
+        end = min(end, len(content) - 1)
+        self.send_body(206, content[start:end + 1],
+                       headers={'Content-Range': 'bytes %d-%d/%d' % (start, end, len(content))})
+
+    def do_GET(self):
+        failure = self.api.start_request()
+        try:
+            time.sleep(self.api.latency)
+            if failure is None:
+                self.serve(urlparse(self.path).path)
+            else:
+                status, retry_after = failure
+                self.send_body(status, b'', headers={'Retry-After': str(retry_after)} if retry_after is not None
+                               else None)
+        finally:
+            self.api.end_request()
+
+    def serve(self, path):
+        if path == '/forecast/point':
+            self.send_body(200, self.api.point_body, 'application/json')
+        elif path == '/forecast/file':
+            self.send_body(200, self.api.files_body, 'application/json')
+        elif path.startswith('/forecast/file/'):
+            content = self.api.forecast_file(path[len('/forecast/file/'):])
+            if content is None:
+                self.send_body(404, b'')
+            else:
+                self.send_content(content)
+        elif re.match(r'^/export/[^/]+$', path):
+            self.send_body(200, self.api.export_body, 'application/json')
+        elif path.startswith('/export/'):
+            self.send_content(self.api.export_content)
+        else:
+            self.send_body(404, b'')
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(api, host='localhost', port=0):
+    """
+    Start the stub server on a background thread. Returns the server and its base URL.
+    A port of 0 picks any free port.
+    """
+    handler = type('Handler', (StubRequestHandler,), {'api': api})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, 'http://%s:%d' % server.server_address[:2]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve recorded Spire Weather API responses locally')
+    parser.add_argument('--port', type=int, default=8081,
+                        help='The port to listen on')
+    parser.add_argument('--latency_ms', type=float, default=0,
+                        help='The delay added to every response in milliseconds')
+    parser.add_argument('--recordings', type=str,
+                        help='A directory of recorded responses')
+    parser.add_argument('--grib_directory', type=str,
+                        help='A directory of GRIB files to serve from the File API')
+
+    args = parser.parse_args()
+    stub_api = StubApi(args.recordings, args.grib_directory, args.latency_ms / 1000)
+    stub_server, url = start_server(stub_api, port=args.port)
+    print('Serving stub API on %s' % url)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        stub_server.shutdown()
@@ -0,0 +1,146 @@
+"""
+Write synthetic GRIB2 files for benchmarking
+
+The fields are smooth, deterministic patterns on a global regular latitude/longitude grid, encoded with
+GRIB2 simple packing. This only needs NumPy, so benchmark data can be generated without eccodes. Fields with
+NaN values are written with a bitmap, which can be marked as the same as the previous message's.
+
+    python synthetic_grib.py output.grib2 --resolution 0p25
+"""
+import argparse
+import struct
+from datetime import datetime
+
+import numpy as np
+
+# Grid spacing in degrees for each resolution used in Spire file names.
+RESOLUTIONS = {
+    '0p125': 0.125,
+    '0p25': 0.25,
+    '0p5': 0.5,
+    '1p0': 1.0,
+}
+
+# (name, parameter category, parameter number, type of surface, height in metres) for each field in the
+# synthetic basic bundle. These are the GRIB2 codes for meteorology (discipline 0).
+BASIC_FIELDS = (
+    ('2 metre temperature', 0, 0, 103, 2),
+    ('10 metre U wind component', 2, 2, 103, 10),
+    ('10 metre V wind component', 2, 3, 103, 10),
+    ('Pressure reduced to MSL', 3, 1, 101, 0),
+)
+
+# The number of decimal places kept when packing values.
+DECIMAL_SCALE = 2
+
+
+def grid_shape(resolution):
+    step = RESOLUTIONS[resolution]
+    return int(round(180 / step)) + 1, int(round(360 / step))
+
+
+def _signed(value, size):
+    # GRIB2 stores negative numbers as a sign bit followed by the magnitude.
+    bits = size * 8
+    return ((1 << (bits - 1)) | -value if value < 0 else value).to_bytes(size, 'big')
+
+
+def _section(number, body):
+    return struct.pack('>IB', len(body) + 5, number) + body
+
+
+def pack_bits(values, bits):
+    """
+    Pack unsigned integers into a big-endian bit stream using the given number of bits per value.
+    """
+    if bits == 0:
+        return b''
+
+    as_bytes = values.astype('>u4').view(np.uint8).reshape(-1, 4)
+    unpacked = np.unpackbits(as_bytes, axis=1)[:, 32 - bits:]
+    return np.packbits(unpacked.ravel()).tobytes()
+
+
+def encode_message(values, step, reference_time, category, number, surface_type, surface_value,
+                   previous_bitmap=False):
+    """
+    Encode a 2-D field running north to south and west to east as a GRIB2 message. NaN values are left out
+    using a bitmap, or with previous_bitmap, by referring to the bitmap of the previous message (indicator 254).
+    """
+    nlat, nlon = values.shape
+    lat_step = 180.0 / (nlat - 1)
+    lon_step = 360.0 / nlon
+    micro = 1000000
+
+    section1 = struct.pack('>HHBBBHBBBBBBB', 0, 0, 2, 0, 1, reference_time.year, reference_time.month,
+                           reference_time.day, reference_time.hour, reference_time.minute, reference_time.second,
+                           0, 1)
+
+    section3 = struct.pack('>BIBBH', 0, values.size, 0, 0, 0)
+    section3 += struct.pack('>BBIBIBIIIII', 6, 0, 0, 0, 0, 0, 0, nlon, nlat, 0, 0xFFFFFFFF)
+    section3 += _signed(90 * micro, 4) + _signed(0, 4) + struct.pack('>B', 0x30)
+    section3 += _signed(-90 * micro, 4) + _signed(int(round((360 - lon_step) * micro)), 4)
+    section3 += struct.pack('>IIB', int(round(lon_step * micro)), int(round(lat_step * micro)), 0)
+
+    section4 = struct.pack('>HHBBBBBHBBIBB', 0, 0, category, number, 2, 0, 0, 0, 0, 1, step, surface_type, 0)
+    section4 += struct.pack('>IBBI', surface_value, 255, 0, 0)
+
+    # Simple packing: value = (reference + packed) / 10 ** DECIMAL_SCALE
+    present = ~np.isnan(values.ravel())
+    if present.all():
+        section6 = struct.pack('>B', 255)
+    elif previous_bitmap:
+        section6 = struct.pack('>B', 254)
+    else:
+        section6 = struct.pack('>B', 0) + np.packbits(present).tobytes()
+
+    scaled = np.round(values.ravel()[present] * 10 ** DECIMAL_SCALE).astype(np.int64)
+    reference = int(scaled.min())
+    packed = scaled - reference
+    bits = int(packed.max()).bit_length()
+    section5 = struct.pack('>IH', len(packed), 0) + struct.pack('>f', reference)
+    section5 += _signed(0, 2) + _signed(DECIMAL_SCALE, 2) + struct.pack('>BB', bits, 0)
+
+    sections = (_section(1, section1) + _section(3, section3) + _section(4, section4) + _section(5, section5) +
+                _section(6, section6) + _section(7, pack_bits(packed, bits)) + b'7777')
+    return b'GRIB' + struct.pack('>HBBQ', 0, 0, 2, len(sections) + 16) + sections
+
+
+def synthetic_field(shape, index, step):
+    """
+    A smooth field which varies with latitude, longitude, the field and the lead time.
+    """
+    nlat, nlon = shape
+    lats = np.linspace(90, -90, nlat)[:, None]
+    lons = np.linspace(0, 360, nlon, endpoint=False)[None, :]
+    phase = np.radians(lons + 15 * step + 40 * index)
+    return (10 * np.cos(np.radians(lats)) * np.sin(phase) + 5 * index).astype(np.float64)
+
+
+def write_file(filepath, resolution='0p25', step=0, reference_time=datetime(2019, 9, 20), fields=BASIC_FIELDS):
+    """
+    Write a synthetic GRIB2 file containing one message per field for a lead time. Returns the file size.
+    """
+    shape = grid_shape(resolution)
+    size = 0
+    with open(filepath, 'wb') as f:
+        for index, (_, category, number, surface_type, surface_value) in enumerate(fields):
+            message = encode_message(synthetic_field(shape, index, step), step, reference_time, category, number,
+                                     surface_type, surface_value)
+            f.write(message)
+            size += len(message)
+
+    return size
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Write a synthetic GRIB2 file')
+    parser.add_argument('filepath', type=str,
+                        help='The file to write')
+    parser.add_argument('--resolution', type=str, choices=sorted(RESOLUTIONS), default='0p25',
+                        help='The grid resolution')
+    parser.add_argument('--step', type=int, default=0,
+                        help='The lead time in hours')
+
+    args = parser.parse_args()
+    print('Wrote %d bytes' % write_file(args.filepath, args.resolution, args.step))
@@ -1,5 +1,7 @@
 from math import atan2, pi, sqrt
 
+import numpy as np
+
 
 def wind_speed_from_u_v(u, v):
     return sqrt(pow(u, 2) + pow(v, 2))
@@ -18,3 +20,33 @@ def wind_direction_from_u_v(u, v):
         return 0.0
     else:
         return (180.0 / pi) * atan2(u, v) + 180.0
+
+
+def wind_speed_from_u_v_array(u, v, out=None):
+    """
+    Wind speed for arrays of u and v components, such as whole GRIB grids or point time series.
+
+    If out is given the result is written into it rather than a new array.
+    """
+    return np.hypot(u, v, out=out)
+
+
+def wind_direction_from_u_v_array(u, v, out=None):
+    """
+    Meteorological wind direction for arrays of u and v components, using the same convention
+    as wind_direction_from_u_v. Points with no wind are set to 0° using a mask.
+
+    If out is given the result is written into it rather than a new array.
+    """
+    u = np.asarray(u)
+    v = np.asarray(v)
+    if out is None:
+        out = np.empty(np.broadcast(u, v).shape, dtype=np.result_type(u, v, 1.0))
+
+    np.arctan2(u, v, out=out)
+    np.multiply(out, 180.0 / pi, out=out)
+    np.add(out, 180.0, out=out)
+
+    calm = (u == 0.0) & (v == 0.0)
+    np.copyto(out, 0.0, where=calm)
+    return out
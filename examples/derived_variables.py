@@ -0,0 +1,199 @@
+"""
+Variables derived from the raw forecast variables.
+
+Each derived variable declares the variables it is calculated from, which can be raw variables (by their Point
+API name) or other derived variables, and a function which calculates it from whole arrays of their values:
+
+    wind_speed              m/s     from eastward_wind and northward_wind
+    wind_direction          degrees from eastward_wind and northward_wind, the direction the wind blows from
+    gust_factor             ratio   from wind_gust and wind_speed, NaN where there is no wind
+    interval_precipitation  kg/m2   from precipitation_amount and lead_time, the amount since the previous lead
+                                    time (see precipitation.py), with lead times along the last axis
+    relative_humidity       %       from air_temperature and dew_point_temperature (in K), using the Magnus
+                                    formula
+    swell_wave_power        kW/m    from swell_height and swell_period, the deep water wave energy flux
+
+A VariableEvaluator gets the values of raw and derived variables for one forecast or GRIB file. It asks its
+source for each raw variable at most once, and keeps every value it calculates, so an input shared by several
+derived variables (such as wind_speed for gust_factor) is only read or calculated once:
+
+    evaluator = forecast_evaluator(get_point_api_response(49.6, 6.1, columnar=True))
+    values = evaluator.compute(['wind_speed', 'gust_factor'])
+
+Raw variables are used in preference to derived ones, so a relative_humidity returned by the API is not
+recalculated. New variables can be added to DERIVED_VARIABLES with register.
+"""
+from math import pi
+
+import numpy as np
+
+from conversions import wind_direction_from_u_v_array, wind_speed_from_u_v_array
+from precipitation import deaccumulate, get_lead_times
+
+# The constants of the Magnus formula for saturation vapour pressure over water (Alduchov and Eskridge, 1996).
+MAGNUS_A = 17.625
+MAGNUS_B = 243.04
+
+ZERO_CELSIUS = 273.15
+
+# The density of sea water in kg/m3 and the acceleration due to gravity in m/s2.
+SEA_WATER_DENSITY = 1025.0
+GRAVITY = 9.81
+
+
+class DerivedVariable(object):
+
+    def __init__(self, name, inputs, function, units):
+        self.name = name
+        self.inputs = tuple(inputs)
+        self.function = function
+        self.units = units
+
+
+DERIVED_VARIABLES = {}
+
+
+def register(name, inputs, function, units):
+    """
+    Add a derived variable calculated by function, which is called with the arrays of the inputs in order.
+    """
+    variable = DerivedVariable(name, inputs, function, units)
+    DERIVED_VARIABLES[name] = variable
+    return variable
+
+
+def gust_factor(wind_gust, wind_speed):
+    """
+    The ratio of the gust speed to the mean wind speed, NaN where there is no wind.
+    """
+    wind_gust = np.asarray(wind_gust, dtype=np.float64)
+    wind_speed = np.asarray(wind_speed, dtype=np.float64)
+    out = np.full(np.broadcast(wind_gust, wind_speed).shape, np.nan)
+    return np.divide(wind_gust, wind_speed, out=out, where=wind_speed > 0)
+
+
+def interval_precipitation(precipitation_amount, lead_time):
+    """
+    The precipitation since the previous lead time from forecast-total amounts.
+    """
+    return deaccumulate(precipitation_amount, lead_time)[1]
+
+
+def relative_humidity_from_temperature_dew_point(air_temperature, dew_point_temperature):
+    """
+    Relative humidity in percent from the air and dew point temperatures in Kelvin.
+    """
+    t = np.asarray(air_temperature, dtype=np.float64) - ZERO_CELSIUS
+    td = np.asarray(dew_point_temperature, dtype=np.float64) - ZERO_CELSIUS
+    humidity = 100.0 * np.exp(MAGNUS_A * td / (MAGNUS_B + td) - MAGNUS_A * t / (MAGNUS_B + t))
+    return np.minimum(humidity, 100.0, out=humidity, where=~np.isnan(humidity))
+
+
+def wave_power(height, period):
+    """
+    The energy flux of deep water waves in kW per metre of wave front, from the significant wave height in metres
+    and the period in seconds. The formula is for the energy period, so using the mean period is an approximation.
+    """
+    height = np.asarray(height, dtype=np.float64)
+    return SEA_WATER_DENSITY * GRAVITY ** 2 / (64.0 * pi) / 1000.0 * height ** 2 * np.asarray(period)
+
+
+WIND_SPEED = register('wind_speed', ('eastward_wind', 'northward_wind'), wind_speed_from_u_v_array, 'm/s')
+WIND_DIRECTION = register('wind_direction', ('eastward_wind', 'northward_wind'), wind_direction_from_u_v_array,
+                          'degrees')
+GUST_FACTOR = register('gust_factor', ('wind_gust', 'wind_speed'), gust_factor, '1')
+INTERVAL_PRECIPITATION = register('interval_precipitation', ('precipitation_amount', 'lead_time'),
+                                  interval_precipitation, 'kg/m2')
+RELATIVE_HUMIDITY = register('relative_humidity', ('air_temperature', 'dew_point_temperature'),
+                             relative_humidity_from_temperature_dew_point, '%')
+SWELL_WAVE_POWER = register('swell_wave_power', ('swell_height', 'swell_period'), wave_power, 'kW/m')
+
+
+def raw_inputs(names, available=()):
+    """
+    The raw variables needed to get the named variables, in the order they are first needed. Variables in
+    available, and any which can't be derived, are taken to be raw.
+    """
+    inputs = []
+    pending = list(reversed(list(names)))
+    seen = set()
+    while pending:
+        name = pending.pop()
+        if name in seen:
+            continue
+        seen.add(name)
+
+        if name in available or name not in DERIVED_VARIABLES:
+            inputs.append(name)
+        else:
+            pending.extend(reversed(DERIVED_VARIABLES[name].inputs))
+
+    return inputs
+
+
+class VariableEvaluator(object):
+    """
+    Gets raw and derived variables for one forecast or file, keeping every value it reads or calculates.
+
+    source is called with the name of a raw variable in available and returns its array of values.
+    """
+
+    def __init__(self, source, available):
+        self.source = source
+        self.available = set(available)
+        self.values = {}
+        self._calculating = set()
+
+    def __contains__(self, name):
+        return not self.missing([name])
+
+    def missing(self, names):
+        """
+        The raw variables which the named variables need but which aren't available.
+        """
+        return [name for name in raw_inputs(names, self.available) if name not in self.available]
+
+    def __getitem__(self, name):
+        if name in self.values:
+            return self.values[name]
+
+        if name in self.available:
+            value = self.source(name)
+        elif name in DERIVED_VARIABLES:
+            if name in self._calculating:
+                raise Exception('%s depends on itself' % name)
+
+            variable = DERIVED_VARIABLES[name]
+            self._calculating.add(name)
+            try:
+                value = variable.function(*[self[input_name] for input_name in variable.inputs])
+            finally:
+                self._calculating.discard(name)
+        else:
+            raise KeyError('%s is not available and can\'t be derived' % name)
+
+        self.values[name] = value
+        return value
+
+    def compute(self, names):
+        """
+        Return a dict of the values of the named variables. Raises an exception naming every missing input
+        before anything is read.
+        """
+        missing = self.missing(names)
+        if missing:
+            raise Exception('Missing the inputs %s needed for %s' % (', '.join(missing), ', '.join(names)))
+
+        return {name: self[name] for name in names}
+
+
+def forecast_evaluator(forecast):
+    """
+    A VariableEvaluator for a PointForecast, which also provides the lead_time of each forecast time in hours.
+    """
+    def source(name):
+        if name == 'lead_time':
+            return get_lead_times(forecast.issuance_times, forecast.valid_times)
+        return forecast[name]
+
+    return VariableEvaluator(source, list(forecast.fields) + ['lead_time'])
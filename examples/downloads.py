@@ -0,0 +1,166 @@
+"""
+Helpers for streaming large files from the Spire Weather APIs to disk.
+
+Files are written to a '.part' file next to the destination and only renamed into place once the number of
+bytes received matches the size reported by the server. A file at the destination path is therefore always
+complete, and an interrupted download can be resumed from the end of its '.part' file with a Range request.
+A destination file which doesn't match the size of the remote file is downloaded again from the start, and only
+replaced once the new copy is complete.
+"""
+import os
+import re
+import sys
+import time
+
+from instrumentation import record_retry, trace
+from rate_limit import DEFAULT_BACKOFF, DEFAULT_RETRIES, backoff_delay, get_limiter, get_retry_after, is_overloaded
+
+# The number of bytes to read from the response and write to disk at a time.
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+
+PARTIAL_SUFFIX = '.part'
+
+_CONTENT_RANGE = re.compile(r'bytes (?:(\d+)-\d+|\*)/(\d+)')
+
+
+def _total_size(response):
+    """
+    Get the full size of the remote file from a response to a (possibly ranged) request.
+    """
+    content_range = response.headers.get('Content-Range')
+    if content_range:
+        match = _CONTENT_RANGE.match(content_range)
+        if match:
+            return int(match.group(2))
+
+    if response.status_code == 200 and 'Content-Length' in response.headers:
+        return int(response.headers['Content-Length'])
+
+    return None
+
+
+def get_remote_size(session, url, headers=None, operation='download'):
+    """
+    Get the size of a remote file by asking for just its first byte.
+    """
+    headers = dict(headers or {}, Range='bytes=0-0')
+    with get_limiter().slot() as slot, trace(operation + '_size', url) as request_trace:
+        with session.get(url, headers=headers, allow_redirects=True, stream=True) as response:
+            slot.record(response)
+            request_trace.status = response.status_code
+            response.raise_for_status()
+            return _total_size(response)
+
+
+def download_file(session, url, output_path, headers=None, chunk_size=DEFAULT_CHUNK_SIZE, operation='download'):
+    """
+    Stream a file to output_path, resuming from a previous partial download if there is one.
+
+    Returns the number of bytes downloaded, which is zero if the file was already complete.
+    Raises an exception if the size of the downloaded file doesn't match the size reported by the server.
+    The request is traced under the given operation name (see instrumentation.py), and holds a slot from the
+    shared limiter (see rate_limit.py) until the whole file has been received.
+    """
+    # Only skip files we can confirm are complete. Anything else at the destination may not be a prefix of the
+    # remote file (such as an older version of it), so it is never resumed; it is left in place until replaced.
+    if os.path.exists(output_path) and \
+            os.path.getsize(output_path) == get_remote_size(session, url, headers, operation):
+        return 0
+
+    partial_path = output_path + PARTIAL_SUFFIX
+    offset = os.path.getsize(partial_path) if os.path.exists(partial_path) else 0
+
+    headers = dict(headers or {}, Range='bytes=%d-' % offset)
+    with get_limiter().slot() as slot, trace(operation, url) as request_trace, \
+            session.get(url, headers=headers, allow_redirects=True, stream=True) as response:
+        slot.record(response)
+        request_trace.status = response.status_code
+        if response.status_code == 416:
+            # The partial file already holds everything the server has.
+            total_size = _total_size(response)
+        else:
+            response.raise_for_status()
+            total_size = _total_size(response)
+
+            # If the server ignored the Range header it is sending the whole file, so start again.
+            mode = 'ab' if response.status_code == 206 else 'wb'
+            if mode == 'wb':
+                offset = 0
+
+            with open(partial_path, mode) as f:
+                for chunk in response.iter_content(chunk_size=chunk_size):
+                    f.write(chunk)
+                    request_trace.add_bytes(len(chunk))
+
+    downloaded = request_trace.bytes_received
+
+    size = offset + downloaded
+    if total_size is not None and size != total_size:
+        if size > total_size:
+            # The partial file can't be resumed, so make sure the next attempt starts from scratch.
+            os.remove(partial_path)
+        raise Exception('Downloaded %d bytes of %s but expected %d' % (size, url, total_size))
+
+    os.replace(partial_path, output_path)
+    return downloaded
+
+
+def _is_retryable(error):
+    """
+    Check whether a download failed because of rate limiting, a server error or a dropped connection.
+
+    Errors from both requests and simple_http.SimpleSession are recognised.
+    """
+    response = getattr(error, 'response', None)
+    if response is not None:
+        return is_overloaded(response.status_code)
+
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+
+    # These are only imported once something has gone wrong, so they don't slow down starting a download.
+    import http.client
+    if isinstance(error, http.client.HTTPException):
+        return True
+
+    import requests
+    return isinstance(error, (requests.ConnectionError, requests.Timeout,
+                              requests.exceptions.ChunkedEncodingError))
+
+
+def download_file_with_retries(session, url, output_path, headers=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                               retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF, operation='download'):
+    """
+    Download a file as download_file does, retrying with exponential backoff on rate limiting, server errors
+    and dropped connections. Each retry resumes from wherever the previous attempt got to. If the server sent
+    a Retry-After header then that is how long we wait instead.
+    """
+    for attempt in range(retries + 1):
+        try:
+            return download_file(session, url, output_path, headers=headers, chunk_size=chunk_size,
+                                 operation=operation)
+        except Exception as error:
+            if attempt == retries or not _is_retryable(error):
+                raise
+
+            delay = get_retry_after(getattr(error, 'response', None))
+            if delay is None:
+                delay = backoff_delay(attempt, backoff)
+            print('Retrying %s in %.1fs after error: %s' % (url, delay, error), file=sys.stderr)
+            record_retry(operation, url, attempt + 1, delay, error)
+            time.sleep(delay)
+
+
+def file_sha256(path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Calculate the SHA-256 checksum of a file.
+    """
+    # hashlib is only imported when it's needed, as most downloads aren't checksummed.
+    import hashlib
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+
+    return digest.hexdigest()
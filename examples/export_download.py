@@ -1,7 +1,7 @@
 """
 This script will download all files from a Spire data export in parallel.
 
-For more detail on Spire weather archive requests and retrievals see 
+For more detail on Spire weather archive requests and retrievals see
 our developer documentation and getting started guides:
 https://developers.wx.spire.com/swagger_ui/index.html#/Archive%20Data/get_archive_file_list
 https://developers.wx.spire.com/getting-started.pdf
@@ -10,12 +10,25 @@ To use, first install requests from pip:
     pip install requests
 
 Then insert your export id below and run the script.
+
+Each file is written to a temporary file and renamed once complete, and failed downloads are retried with
+exponential backoff. The size and checksum of every completed file is recorded in a JSON manifest next to the
+downloaded files, so if the script is run again it only downloads the files that are missing or don't match it.
 """
 
+import json
+import os
+import time
 from pathlib import Path
-from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from requests import Session
+from requests.adapters import HTTPAdapter
 
-from requests import get
+from downloads import download_file_with_retries, file_sha256
+from instrumentation import MetricsCollector, add_hooks, trace
+from rate_limit import get_limiter
 
 
 # The export id given to you by Spire
@@ -23,52 +36,163 @@ export_id = "<insert export id>"
 
 base_url = "https://api.wx.spire.com/export"
 
-# The number of download workers
-parallelism = 8
+# The maximum number of download workers. The shared limiter (see rate_limit.py) adapts how many downloads
+# actually run at once to what the API will sustain, backing off if it starts returning 429 responses.
+parallelism = 32
 
 # The local path where files will be downloaded
 prefix = "."
 
+# How often, in completed files, the manifest is saved while downloading
+manifest_save_interval = 100
+
+# If set, request metrics are written to this file in the Prometheus text format when the script finishes
+metrics_path = None
+
 
-def get_file_list(export_id: str) -> list[str]:
-    resp = get(f"{base_url}/{export_id}")
+def get_file_list(session: Session, export_id: str) -> list[str]:
+    url = f"{base_url}/{export_id}"
+    with get_limiter().slot() as slot, trace("export_list", url) as request_trace:
+        resp = session.get(url)
+        slot.record(resp)
+        request_trace.status = resp.status_code
+        request_trace.add_bytes(len(resp.content))
     if resp.status_code == 404:
         raise Exception("Unknown export id")
 
     return resp.json()["files"]
 
 
-def download_file(export_id: str, path: str, local_path: str) -> bool:
-    prefix = Path(local_path)
-    with get(f"{base_url}/{export_id}/{path}", allow_redirects=True, stream=True) as resp:
-        if resp.status_code == 404:
-            return False
-        download_path = prefix / path
-        if download_path.exists():
-            return True
+def get_manifest_path(export_id: str, local_path: str) -> Path:
+    return Path(local_path) / f".{export_id}.manifest.json"
 
-        try:
-            download_path.parent.mkdir(parents=True, exist_ok=True)
-            with download_path.open("rb") as f:
-                for chunk in resp.iter_content(chunk_size=8192):
-                    f.write(chunk)
-        except BaseException:
-            if download_path.exists():
-                download_path.unlink()
-                return False
 
-    return True
+def load_manifest(manifest_path: Path) -> dict:
+    if not manifest_path.exists():
+        return {}
 
+    with manifest_path.open() as f:
+        return json.load(f)
 
-if __name__ == "__main__":
-    files = get_file_list(export_id)
-    print(f"Downloading {len(files)} files...")
+
+def save_manifest(manifest_path: Path, manifest: dict) -> None:
+    # Write to a temporary file first so an interrupted save can't corrupt the manifest.
+    manifest_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = manifest_path.with_name(manifest_path.name + ".tmp")
+    with tmp_path.open("w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+
+def is_downloaded(manifest: dict, path: str, local_path: str) -> bool:
+    """
+    Whether the file was downloaded and still matches the size and checksum recorded in the manifest.
+    """
+    entry = manifest.get(path)
+    download_path = Path(local_path) / path
+    if entry is None or not download_path.exists() or download_path.stat().st_size != entry["size"]:
+        return False
+
+    # Only checksum files of the right size, since reading every file is much slower than checking the size.
+    return file_sha256(download_path) == entry["sha256"]
+
+
+def download_file(session: Session, export_id: str, path: str, local_path: str) -> Optional[dict]:
+    """
+    Download a single file from the export, returning its manifest entry or None if it doesn't exist.
+    """
+    download_path = Path(local_path) / path
+    download_path.parent.mkdir(parents=True, exist_ok=True)
+
+    try:
+        downloaded = download_file_with_retries(session, f"{base_url}/{export_id}/{path}", str(download_path),
+                                                operation="export")
+    except Exception as error:
+        if getattr(error, "response", None) is not None and error.response.status_code == 404:
+            return None
+        raise
+
+    return {
+        "size": download_path.stat().st_size,
+        "sha256": file_sha256(download_path),
+        "downloaded": downloaded,
+    }
+
+
+def download_export(export_id: str, local_path: str, parallelism: int = parallelism) -> int:
+    """
+    Download every file of an export that isn't already in local_path, returning the number that failed.
+    """
+    session = Session()
+    adapter = HTTPAdapter(pool_maxsize=parallelism)
+    session.mount("https://", adapter)
+
+    files = get_file_list(session, export_id)
+    manifest_path = get_manifest_path(export_id, local_path)
+    manifest = load_manifest(manifest_path)
+
+    # Checksumming is mostly I/O and hashlib releases the GIL, so check the existing files in parallel.
     with ThreadPoolExecutor(max_workers=parallelism) as pool:
-        results = pool.map(lambda f: download_file(export_id, f, prefix), files)
-        for i, result in enumerate(results):
-            if not result:
-                print(f"Failed to download {files[i]}")
+        downloaded = list(pool.map(lambda f: is_downloaded(manifest, f, local_path), files))
+    missing = [f for f, is_done in zip(files, downloaded) if not is_done]
+    for path in missing:
+        # A file in the manifest which no longer matches it has changed since it was downloaded. It may still be
+        # the same size as the remote file, which download_file would take as complete, so start it again.
+        if manifest.pop(path, None) is not None:
+            (Path(local_path) / path).unlink(missing_ok=True)
+    print(f"Downloading {len(missing)} of {len(files)} files...")
+
+    failed = 0
+    total_bytes = 0
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=parallelism) as pool:
+        futures = {pool.submit(download_file, session, export_id, f, local_path): f for f in missing}
+        for i, future in enumerate(as_completed(futures), start=1):
+            path = futures[future]
+            try:
+                entry = future.result()
+                error = "not found"
+            except Exception as e:
+                entry = None
+                error = e
+
+            if entry is None:
+                failed += 1
+                print(f"Failed to download {path}: {error}")
             else:
-                print(files[i])
+                total_bytes += entry.pop("downloaded")
+                manifest[path] = entry
+                elapsed = time.perf_counter() - start
+                print(f"{path} ({total_bytes / elapsed / 1e6:.1f} MB/s)")
+
+            if i % manifest_save_interval == 0:
+                save_manifest(manifest_path, manifest)
+
+    save_manifest(manifest_path, manifest)
+
+    elapsed = time.perf_counter() - start
+    print(f"Downloaded {total_bytes / 1e6:.1f} MB in {elapsed:.1f}s ({total_bytes / elapsed / 1e6:.1f} MB/s)")
+    print(f"Settled on {get_limiter().limit} concurrent downloads")
+    if failed:
+        print(f"{failed} files failed to download; run the script again to retry them")
+
+    return failed
+
+
+def print_metrics_summary(metrics: MetricsCollector) -> None:
+    for operation, summary in metrics.summary().items():
+        print(f"{operation}: {summary['requests']} requests, {summary['retries']} retries, "
+              f"p50 <= {summary['p50_seconds']}s, p99 <= {summary['p99_seconds']}s")
+
+
+if __name__ == "__main__":
+    metrics = MetricsCollector()
+    add_hooks(metrics)
+
+    download_export(export_id, prefix, parallelism)
+
+    print_metrics_summary(metrics)
+    if metrics_path:
+        Path(metrics_path).write_text(metrics.to_prometheus())
 
-        print("done")
+    print("done")
@@ -3,51 +3,89 @@ Example of how to use the Spire Weather File API to download all GRIB files for
 bundle and time bundle. This code is set up to download all data files once the full forecast has
 finished rather than individual files as they populate the API.
 
+Files are downloaded in parallel and streamed straight to disk. Files which have already been downloaded
+are skipped, and partially downloaded files are resumed from where they left off.
 """
 import argparse
 import os
+import time
 from urllib.parse import urljoin
 
-import requests
+from downloads import download_file
+from instrumentation import MetricsCollector, add_hooks, trace
+from rate_limit import get_limiter
+from utils import HOST, get_expected_forecast_size, get_session
 
-HOST = 'https://api.wx.spire.com'
 API_KEY = os.getenv('spire-api-key')
 
+# The number of files to download at once.
+DEFAULT_WORKERS = 4
 
-def download_complete_issuance(api_key, output_directory=None):
+
+def download_forecast_file(session, headers, forecast, output_directory=None):
+    """
+    Download a single forecast file, returning the number of bytes downloaded.
+    """
+    if output_directory:
+        output_file_path = os.path.join(output_directory, forecast)
+    else:
+        output_file_path = forecast
+
+    single_file_url = urljoin(HOST, '/forecast/file/') + forecast
+    downloaded = download_file(session, single_file_url, output_file_path, headers=headers, operation='file')
+
+    if downloaded:
+        print('Downloaded: %s to %s' % (forecast, output_file_path))
+    else:
+        print('Skipping: %s is already downloaded' % output_file_path)
+
+    return downloaded
+
+
+def get_file_list(session, headers, bundles='basic', time_bundle='medium_range_std_freq'):
+    """
+    List the forecast files currently available for the bundles and time bundle.
+    """
     # Build the URL, add the headers and query parameters.
     url = urljoin(HOST, '/forecast/file')
-    params = {'bundles': 'basic', 'time_bundle': 'medium_range_std_freq'}
-    headers = {'spire-api-key': api_key}
-    response = requests.get(url, headers=headers, params=params)
+    params = {'bundles': bundles, 'time_bundle': time_bundle}
+    with get_limiter().slot() as slot, trace('file_list', url) as request_trace:
+        response = session.get(url, headers=headers, params=params)
+        slot.record(response)
+        request_trace.status = response.status_code
+        request_trace.add_bytes(len(response.content))
+        json_response = request_trace.decode_json(response.json)
 
-    json_response = response.json()
     if 'files' not in json_response:
         raise Exception('Response did not contain a files element', json_response)
 
-    file_list = json_response['files']
+    return json_response['files']
 
-    # The medium range, standard time frequency bundle contains data for 29 lead times (or steps)
-    # representing forecasts at six hour intervals from 0 to 168 hours.
-    # Only perform the download once the complete forecast dataset is available.
-    expected_number_of_files = 29
+
+def download_complete_issuance(api_key, output_directory=None, workers=DEFAULT_WORKERS, bundles='basic',
+                               time_bundle='medium_range_std_freq', session=None):
+    session = session or get_session()
+    headers = {'spire-api-key': api_key}
+    file_list = get_file_list(session, headers, bundles, time_bundle)
+
+    # There is one file per lead time, so only perform the download once the complete forecast dataset
+    # is available.
+    expected_number_of_files = get_expected_forecast_size(time_bundle)
     if len(file_list) == expected_number_of_files:
-        for forecast in file_list:
-            if output_directory:
-                output_file_path = os.path.join(output_directory, forecast)
-            else:
-                output_file_path = forecast
-
-            print('Downloading: %s to %s' % (forecast, output_file_path))
-
-            # Retrieve the file content.
-            # NB: No checking is performed to skip downloading previously downloaded data files.
-            single_file_url = urljoin(HOST, '/forecast/file/') + forecast
-            download_file_response = requests.get(single_file_url, headers=headers, allow_redirects=True)
-
-            # Save the file content to the output directory.
-            with open(output_file_path, 'wb') as f:
-                f.write(download_file_response.content)
+        if output_directory:
+            os.makedirs(output_directory, exist_ok=True)
+
+        # Imported here so that only listing the files (spire_wx.py file --list) starts quickly.
+        from concurrent.futures import ThreadPoolExecutor
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            sizes = pool.map(lambda forecast: download_forecast_file(session, headers, forecast, output_directory),
+                             file_list)
+            total_bytes = sum(sizes)
+
+        elapsed = time.perf_counter() - start
+        print('Downloaded %.1f MB in %.1fs (%.1f MB/s)' % (total_bytes / 1e6, elapsed, total_bytes / 1e6 / elapsed))
     else:
         print(f'There are {len(file_list)} files and we were expecting {expected_number_of_files}')
 
@@ -59,6 +97,17 @@ if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Download all forecast files')
     parser.add_argument('--output_directory', type=str,
                         help='The directory to download the files into')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help='The number of files to download at once')
+    parser.add_argument('--metrics', action='store_true',
+                        help='Print request metrics in the Prometheus text format when done')
 
     args = parser.parse_args()
-    download_complete_issuance(API_KEY, args.output_directory)
+    metrics = MetricsCollector()
+    if args.metrics:
+        add_hooks(metrics)
+
+    download_complete_issuance(API_KEY, args.output_directory, args.workers)
+
+    if args.metrics:
+        print(metrics.to_prometheus())
@@ -0,0 +1,132 @@
+"""
+Example of how to use the Spire Weather File API to download forecast files as soon as they are published.
+
+Rather than waiting for a whole issuance to finish like file_api_download_full_issuance.py, this keeps
+polling the File API and downloads each new lead time file as it appears. Polling is frequent while new
+files are arriving and backs off while nothing is changing. Once every lead time of an issuance has been
+downloaded a completion message is printed, or the script can exit so that the next stage can start.
+"""
+import argparse
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from file_api_download_full_issuance import DEFAULT_WORKERS, download_forecast_file, get_file_list
+from utils import get_expected_forecast_size, get_session
+
+API_KEY = os.getenv('spire-api-key')
+
+# The shortest and longest times in seconds to wait between polls of the File API.
+MIN_POLL_INTERVAL = 30
+MAX_POLL_INTERVAL = 600
+
+_ISSUANCE = re.compile(r'\.(\d{8}\.t\d{2}z)\.')
+
+
+def get_issuance(forecast):
+    """
+    Get the issuance from a forecast file name, such as '20190920.t00z' from
+    sof-d.20190920.t00z.0p125.basic.global.f006.grib2
+    """
+    match = _ISSUANCE.search(forecast)
+    return match.group(1) if match else None
+
+
+def print_issuance_complete(issuance, output_paths):
+    print('Issuance %s is complete: %d files downloaded' % (issuance, len(output_paths)))
+
+
+def watch_issuances(api_key, output_directory=None, bundles='basic', time_bundle='medium_range_std_freq',
+                    workers=DEFAULT_WORKERS, on_complete=print_issuance_complete, exit_on_complete=False):
+    """
+    Poll the File API and download new forecast files as they appear.
+
+    on_complete is called with the issuance and the list of downloaded file paths once every
+    lead time of every bundle of an issuance has been downloaded. Issuances whose files were all
+    on disk before the watcher started are not reported, so a restart doesn't report them again.
+    """
+    session = get_session()
+    headers = {'spire-api-key': api_key}
+    # There is one file per lead time for each bundle.
+    expected_number_of_files = get_expected_forecast_size(time_bundle) * len(bundles.split(','))
+    if output_directory:
+        os.makedirs(output_directory, exist_ok=True)
+
+    submitted = set()
+    downloaded = {}
+    # The issuances which this watcher has downloaded at least one file of.
+    fetched = set()
+    completed = set()
+    pending = {}
+    interval = MIN_POLL_INTERVAL
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while True:
+            # Collect the downloads which have finished since the last poll.
+            for forecast, future in list(pending.items()):
+                if future.done():
+                    del pending[forecast]
+                    try:
+                        size = future.result()
+                    except Exception as error:
+                        # Try again on the next poll.
+                        print('Failed to download %s: %s' % (forecast, error))
+                        submitted.discard(forecast)
+                        continue
+
+                    issuance = get_issuance(forecast)
+                    if size:
+                        fetched.add(issuance)
+                    downloaded.setdefault(issuance, []).append(
+                        os.path.join(output_directory, forecast) if output_directory else forecast
+                    )
+
+            for issuance, output_paths in downloaded.items():
+                if issuance in fetched and issuance not in completed and len(output_paths) == expected_number_of_files:
+                    completed.add(issuance)
+                    on_complete(issuance, sorted(output_paths))
+                    if exit_on_complete:
+                        return issuance
+
+            # Start downloading any files we haven't seen before. Files which are already on disk are
+            # skipped by the downloader, so restarting the watcher doesn't download them again.
+            try:
+                file_list = get_file_list(session, headers, bundles, time_bundle)
+            except Exception as error:
+                print('Failed to list files: %s' % error)
+                file_list = []
+
+            new_files = [f for f in file_list if f not in submitted]
+            for forecast in new_files:
+                submitted.add(forecast)
+                pending[forecast] = pool.submit(download_forecast_file, session, headers, forecast, output_directory)
+
+            # Poll again soon while files are arriving, and back off when nothing has changed.
+            if new_files or pending:
+                interval = MIN_POLL_INTERVAL
+            else:
+                interval = min(interval * 2, MAX_POLL_INTERVAL)
+
+            time.sleep(interval)
+
+
+if __name__ == '__main__':
+    if not API_KEY:
+        raise Exception('spire-api-key environment variable is not set.')
+
+    parser = argparse.ArgumentParser(description='Download forecast files as they are published')
+    parser.add_argument('--output_directory', type=str,
+                        help='The directory to download the files into')
+    parser.add_argument('--bundles', type=str, default='basic',
+                        help='The bundles to download')
+    parser.add_argument('--time_bundle', type=str, default='medium_range_std_freq',
+                        help='The time bundle to download')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help='The number of files to download at once')
+    parser.add_argument('--exit_on_complete', action='store_true',
+                        help='Exit once the first complete issuance has been downloaded')
+
+    args = parser.parse_args()
+    watch_issuances(API_KEY, args.output_directory, args.bundles, args.time_bundle, args.workers,
+                    exit_on_complete=args.exit_on_complete)
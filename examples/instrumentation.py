@@ -0,0 +1,300 @@
+"""
+Instrumentation hooks for the requests made by the API examples.
+
+Every Point API request, File API listing and file download is wrapped in a RequestTrace, which times the
+request and records its HTTP status, the number of bytes received and how long the JSON took to decode.
+Registered hooks are told when each request starts and ends, when data arrives and when a request is retried:
+
+    from instrumentation import MetricsCollector, add_hooks
+
+    metrics = MetricsCollector()
+    add_hooks(metrics)
+    ...
+    print(metrics.to_prometheus())
+
+Hooks subclass RequestHooks and override the methods they need. MetricsCollector is a built-in hook which
+keeps counters and histograms in memory and exports them in the Prometheus text format, either as a string
+or from a small HTTP server that Prometheus can scrape.
+
+With no hooks registered the cost of a trace is a couple of clock reads.
+"""
+import bisect
+import threading
+import time
+
+# Histogram bucket upper bounds, in seconds for durations and bytes for sizes.
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+SIZE_BUCKETS = (1024, 10 * 1024, 100 * 1024, 1024 ** 2, 10 * 1024 ** 2, 100 * 1024 ** 2, 1024 ** 3)
+
+# The registered hooks. The list is replaced rather than changed so requests can iterate it without a lock.
+_hooks = []
+_hooks_lock = threading.Lock()
+
+
+class RequestHooks(object):
+    """
+    Base class for instrumentation hooks. Each method is a no-op, so subclasses only override what they need.
+
+    Hooks are called on the thread making the request, so they should be quick and thread safe.
+    """
+
+    def request_start(self, trace):
+        pass
+
+    def bytes_received(self, trace, count):
+        pass
+
+    def request_end(self, trace):
+        pass
+
+    def retry(self, operation, url, attempt, delay, error):
+        pass
+
+
+def add_hooks(hooks):
+    global _hooks
+    with _hooks_lock:
+        _hooks = _hooks + [hooks]
+
+
+def remove_hooks(hooks):
+    global _hooks
+    with _hooks_lock:
+        _hooks = [registered for registered in _hooks if registered is not hooks]
+
+
+class RequestTrace(object):
+    """
+    The timing and outcome of a single request. Use as a context manager around the request, and set the
+    status and decode time and add received bytes as they become known.
+    """
+
+    def __init__(self, operation, url):
+        self.operation = operation
+        self.url = url
+        self.status = None
+        self.bytes_received = 0
+        self.decode_seconds = None
+        self.error = None
+        self.start = None
+        self.seconds = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        for hooks in _hooks:
+            hooks.request_start(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.seconds = time.perf_counter() - self.start
+        if exc_value is not None:
+            self.error = exc_value
+            # Keep the status of HTTP errors raised by raise_for_status.
+            response = getattr(exc_value, 'response', None)
+            if self.status is None and response is not None:
+                self.status = getattr(response, 'status_code', None) or getattr(response, 'status', None)
+
+        for hooks in _hooks:
+            hooks.request_end(self)
+        return False
+
+    def add_bytes(self, count):
+        self.bytes_received += count
+        for hooks in _hooks:
+            hooks.bytes_received(self, count)
+
+    def decode_json(self, decode):
+        """
+        Call decode, for example response.json, and record how long it took.
+        """
+        start = time.perf_counter()
+        try:
+            return decode()
+        finally:
+            self.decode_seconds = time.perf_counter() - start
+
+    @property
+    def network_seconds(self):
+        """
+        The time spent on the request excluding JSON decoding.
+        """
+        if self.seconds is None:
+            return None
+        return self.seconds - (self.decode_seconds or 0)
+
+
+def trace(operation, url):
+    return RequestTrace(operation, url)
+
+
+def record_retry(operation, url, attempt, delay, error):
+    for hooks in _hooks:
+        hooks.retry(operation, url, attempt, delay, error)
+
+
+class Histogram(object):
+    """
+    Counts of observations falling into fixed buckets, as Prometheus histograms are reported.
+    """
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """
+        Estimate a quantile as the upper bound of the bucket it falls in.
+        """
+        if not self.count:
+            return None
+
+        target = q * self.count
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            cumulative += count
+            if cumulative >= target:
+                return bound
+
+    def cumulative_counts(self):
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            cumulative += count
+            yield bound, cumulative
+
+
+def _format_labels(labels):
+    return '{%s}' % ','.join('%s="%s"' % (name, str(value).replace('"', '\\"')) for name, value in labels)
+
+
+def _format_bound(bound):
+    return '+Inf' if bound == float('inf') else repr(float(bound))
+
+
+class MetricsCollector(RequestHooks):
+    """
+    Collects request counts, retries, bytes received and histograms of request duration, JSON decode time
+    and response size for each operation, and exports them in the Prometheus text format.
+    """
+
+    def __init__(self, prefix='spire_weather'):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self.requests = {}
+        self.retries = {}
+        self.bytes = {}
+        self.in_flight = {}
+        self.durations = {}
+        self.decode_durations = {}
+        self.sizes = {}
+
+    def request_start(self, trace):
+        with self._lock:
+            self.in_flight[trace.operation] = self.in_flight.get(trace.operation, 0) + 1
+
+    def request_end(self, trace):
+        operation = trace.operation
+        # Requests which failed before a response arrived are counted with a status of 'error'.
+        key = (operation, trace.status or 'error')
+        with self._lock:
+            self.in_flight[operation] = self.in_flight.get(operation, 0) - 1
+            self.requests[key] = self.requests.get(key, 0) + 1
+            self.bytes[operation] = self.bytes.get(operation, 0) + trace.bytes_received
+            self.durations.setdefault(operation, Histogram(DURATION_BUCKETS)).observe(trace.seconds)
+            self.sizes.setdefault(operation, Histogram(SIZE_BUCKETS)).observe(trace.bytes_received)
+            if trace.decode_seconds is not None:
+                self.decode_durations.setdefault(operation, Histogram(DURATION_BUCKETS)).observe(trace.decode_seconds)
+
+    def retry(self, operation, url, attempt, delay, error):
+        with self._lock:
+            self.retries[operation] = self.retries.get(operation, 0) + 1
+
+    def summary(self):
+        """
+        A dict of the request count, p50 and p99 duration (upper bucket bounds) and bytes for each operation.
+        """
+        with self._lock:
+            return {
+                operation: {
+                    'requests': histogram.count,
+                    'p50_seconds': histogram.quantile(0.5),
+                    'p99_seconds': histogram.quantile(0.99),
+                    'bytes': self.bytes.get(operation, 0),
+                    'retries': self.retries.get(operation, 0),
+                }
+                for operation, histogram in self.durations.items()
+            }
+
+    def to_prometheus(self):
+        prefix = self.prefix
+        lines = []
+
+        def counter(name, help_text, values, labels):
+            lines.append('# HELP %s_%s %s' % (prefix, name, help_text))
+            lines.append('# TYPE %s_%s counter' % (prefix, name))
+            for key, value in sorted(values.items(), key=lambda item: str(item[0])):
+                key = key if isinstance(key, tuple) else (key,)
+                lines.append('%s_%s%s %s' % (prefix, name, _format_labels(zip(labels, key)), value))
+
+        def histogram(name, help_text, histograms):
+            lines.append('# HELP %s_%s %s' % (prefix, name, help_text))
+            lines.append('# TYPE %s_%s histogram' % (prefix, name))
+            for operation, values in sorted(histograms.items()):
+                for bound, count in values.cumulative_counts():
+                    labels = _format_labels((('operation', operation), ('le', _format_bound(bound))))
+                    lines.append('%s_%s_bucket%s %d' % (prefix, name, labels, count))
+                labels = _format_labels((('operation', operation),))
+                lines.append('%s_%s_sum%s %r' % (prefix, name, labels, values.sum))
+                lines.append('%s_%s_count%s %d' % (prefix, name, labels, values.count))
+
+        with self._lock:
+            counter('requests_total', 'Requests made, by operation and HTTP status.',
+                    self.requests, ('operation', 'status'))
+            counter('retries_total', 'Requests retried after an error.', self.retries, ('operation',))
+            counter('received_bytes_total', 'Bytes received in response bodies.', self.bytes, ('operation',))
+            lines.append('# HELP %s_requests_in_flight Requests currently being made.' % prefix)
+            lines.append('# TYPE %s_requests_in_flight gauge' % prefix)
+            for operation, value in sorted(self.in_flight.items()):
+                lines.append('%s_requests_in_flight%s %d' % (prefix, _format_labels((('operation', operation),)),
+                                                              value))
+            histogram('request_duration_seconds', 'Time taken by requests, including reading the body.',
+                      self.durations)
+            histogram('json_decode_duration_seconds', 'Time taken to decode JSON responses.',
+                      self.decode_durations)
+            histogram('response_size_bytes', 'Size of response bodies.', self.sizes)
+
+        return '\n'.join(lines) + '\n'
+
+
+def start_metrics_server(collector, host='localhost', port=9464):
+    """
+    Serve the collector's metrics at /metrics on a background thread. Returns the server.
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsRequestHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != '/metrics':
+                self.send_error(404)
+                return
+
+            content = collector.to_prometheus().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsRequestHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,109 @@
+"""
+Find the latest complete forecast issuance for a set of bundles and time bundle.
+
+The most recent issuance is still being populated for several hours after it first appears in the API.
+IssuanceResolver finds the latest issuance that is complete by probing a single point, stepping back one
+issuance at a time, and caches the answer until the next issuance can be expected to be complete. The
+resolved issuance time can then be passed to every point lookup in a batch.
+"""
+import threading
+from datetime import datetime, timedelta, timezone
+
+from utils import get_api_key, get_expected_forecast_size, get_issuance_interval, get_point_api_response
+
+# The point used to probe for complete issuances. Any point in the forecast domain will do.
+DEFAULT_PROBE_POINT = (0.0, 0.0)
+
+# The maximum number of issuances to check before giving up.
+MAX_ATTEMPTS = 5
+
+# How long after its issuance time a forecast is expected to be complete.
+DEFAULT_PUBLISH_DELAY = timedelta(hours=6)
+
+# The shortest time to cache an answer for, so that a late issuance isn't probed for on every lookup.
+DEFAULT_MIN_TTL = timedelta(minutes=5)
+
+
+def parse_issuance_time(issuance_time):
+    """
+    Parse an ISO 8601 issuance time from the API into a UTC datetime. Times without an offset are taken as UTC.
+    """
+    # datetime.fromisoformat doesn't accept a trailing 'Z' before Python 3.11.
+    if issuance_time.endswith('Z'):
+        issuance_time = issuance_time[:-1] + '+00:00'
+
+    parsed = datetime.fromisoformat(issuance_time)
+    return parsed if parsed.tzinfo is not None else parsed.replace(tzinfo=timezone.utc)
+
+
+class IssuanceResolver(object):
+    """
+    Resolves and caches the latest complete issuance time for each (bundles, time_bundle) pair.
+
+    If a PointCache is given, its cached latest-issuance responses are invalidated whenever a newer
+    complete issuance is found.
+    """
+
+    def __init__(self, api_key=None, probe_point=DEFAULT_PROBE_POINT, publish_delay=DEFAULT_PUBLISH_DELAY,
+                 min_ttl=DEFAULT_MIN_TTL, cache=None):
+        self.api_key = api_key or get_api_key()
+        self.probe_point = probe_point
+        self.publish_delay = publish_delay
+        self.min_ttl = min_ttl
+        self.cache = cache
+
+        self._lock = threading.Lock()
+        self._issuances = {}
+
+    def get_last_complete_issuance(self, bundles, time_bundle, point=None):
+        """
+        Return the issuance time of the latest complete issuance as an ISO 8601 string.
+
+        If it has to be looked up, the (lat, lon) point is probed, or the resolver's probe point if none is given.
+        """
+        key = (bundles, time_bundle)
+        now = datetime.now(timezone.utc)
+
+        # Only one thread probes at a time, and the others then use its answer.
+        with self._lock:
+            if key in self._issuances:
+                issuance_time, expires = self._issuances[key]
+                if now < expires:
+                    return issuance_time
+
+            issuance_time = self._probe(bundles, time_bundle, point or self.probe_point)
+
+            # The next issuance can't be complete until its publish delay has passed.
+            interval = timedelta(hours=get_issuance_interval(time_bundle))
+            next_complete = parse_issuance_time(issuance_time) + interval + self.publish_delay
+            self._issuances[key] = (issuance_time, max(next_complete, now + self.min_ttl))
+
+        if self.cache is not None:
+            self.cache.invalidate_before(bundles, time_bundle, issuance_time)
+
+        return issuance_time
+
+    def _probe(self, bundles, time_bundle, point):
+        lat, lon = point
+        expected_data_size = get_expected_forecast_size(time_bundle)
+        interval = timedelta(hours=get_issuance_interval(time_bundle))
+
+        issuance_time = None
+        for _ in range(MAX_ATTEMPTS):
+            data = get_point_api_response(lat, lon, bundles=bundles, time_bundle=time_bundle,
+                                          issuance_time=issuance_time, api_key=self.api_key)
+            if not data:
+                break
+
+            issuance_time = data[0]['times']['issuance_time']
+            if len(data) == expected_data_size:
+                return issuance_time
+
+            # This issuance is not yet complete, so try the previous one.
+            issuance_time = (parse_issuance_time(issuance_time) - interval).isoformat()
+
+        raise Exception('Last complete issuance was not found', bundles, time_bundle)
+
+    def clear(self):
+        with self._lock:
+            self._issuances.clear()
@@ -0,0 +1,382 @@
+"""
+Streaming output writers for tables of forecast data.
+
+The examples produce tables, a row per forecast time, point or grid cell, which can be large. Instead of
+building the whole table in memory and formatting it at the end, each entry point opens a sink for the chosen
+format and writes rows or blocks of columns to it as they are produced:
+
+    with open_sink('csv', ['latitude', 'longitude', 'swell_height'], 'swell.csv') as sink:
+        for block in blocks:
+            sink.write_block(block)
+
+The formats are:
+
+    table    a human readable table printed with tabulate, which has to hold every row until the end
+    csv      comma separated values
+    ndjson   one JSON object per row, with NaN written as null
+    parquet  Parquet with a row group per row_group_size rows, which requires pyarrow:
+                 pip install pyarrow
+    npy      a directory with a NumPy .npy file per column, which can be loaded with memory mapping. Times are
+             stored as datetime64 and other strings as fixed width unicode, as wide as the longest in the
+             first rows written
+
+Rows are sequences of values in column order. Blocks are either a 2-D array with a column per column, or a
+list of 1-D arrays (or scalars, which are repeated) for the columns. Writing blocks avoids handling each value
+in Python for the csv, parquet and npy formats. write_columns takes a dict of columns by name instead, and fills
+any column it doesn't have with NaN, for results such as GRIB files where a variable is missing from some lead
+times.
+
+Every format keeps the same columns from start to end, so that the output is one table. The columns can be left
+out when the sink is opened and given with set_columns before the first write, for writers that only know them
+once the first results arrive, but they can't be changed after that.
+
+The table, csv and ndjson formats write to standard output when no path is given. NumPy is only imported
+when blocks are written or the parquet and npy formats are used, and the csv module only by the csv format,
+so importing this module to add the arguments of a command and writing rows of text stay quick to start.
+"""
+import json
+import os
+import re
+import sys
+from abc import ABC, abstractmethod
+
+FORMATS = ('table', 'csv', 'ndjson', 'parquet', 'npy')
+
+# The number of rows to buffer for each Parquet row group.
+DEFAULT_ROW_GROUP_SIZE = 65536
+
+# The .npy files are written with a fixed size header so it can be rewritten with the final number of rows.
+_NPY_HEADER_SIZE = 128
+_NPY_MAGIC = b'\x93NUMPY\x01\x00'
+
+# Columns of strings which all start like an ISO 8601 date are stored as times by the parquet and npy formats.
+_ISO_DATE = re.compile(r'\d{4}-\d\d-\d\d')
+
+
+def add_output_arguments(parser, default='table'):
+    """
+    Add the --format and --output arguments to an argparse parser.
+    """
+    parser.add_argument('--format', type=str, choices=FORMATS, default=default,
+                        help='The output format')
+    parser.add_argument('--output', type=str,
+                        help='The file (or directory for npy) to write to, rather than standard output')
+
+
+def _block_columns(block, width):
+    """
+    Split a block into a list of column arrays of the same length.
+    """
+    import numpy as np
+
+    if isinstance(block, np.ndarray) and block.ndim == 2:
+        return list(block.T)
+
+    length = max((len(column) for column in block if np.ndim(column)), default=1)
+    columns = [np.asarray(column) if np.ndim(column) else np.full(length, column) for column in block]
+    if len(columns) != width:
+        raise Exception('Expected %d columns but the block has %d' % (width, len(columns)))
+
+    return columns
+
+
+def _block_rows(block, width):
+    return zip(*[column.tolist() for column in _block_columns(block, width)])
+
+
+class Sink(ABC):
+    """
+    Base class for the output formats. Subclasses implement write_block and, if it can be done faster than by
+    turning the rows into a block, write_rows.
+    """
+
+    def __init__(self, columns=None, path=None):
+        self.columns = None
+        self.path = path
+        self.rows_written = 0
+        if columns is not None:
+            self.set_columns(columns)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def set_columns(self, columns):
+        """
+        Set the columns of the rows written after this. Setting the same columns again does nothing, and setting
+        different ones raises an exception.
+        """
+        if self.columns is None:
+            self.columns = list(columns)
+            self._start()
+        elif list(columns) != self.columns:
+            raise Exception('The %s format needs the same columns throughout, but they changed from %s to %s'
+                            % (type(self).__name__, self.columns, list(columns)))
+
+    def _start(self):
+        # Called once the columns are known, for formats which write a header.
+        pass
+
+    def write_rows(self, rows):
+        rows = list(rows)
+        if rows:
+            self.write_block([list(column) for column in zip(*rows)])
+
+    @abstractmethod
+    def write_block(self, block):
+        pass
+
+    def write_columns(self, columns):
+        """
+        Write a block given as a dict of column name to array (or scalar), in any order. Columns which are
+        missing from it are filled with NaN.
+        """
+        unknown = [name for name in columns if name not in self.columns]
+        if unknown:
+            raise Exception('The columns %s are not among %s' % (unknown, self.columns))
+
+        self.write_block([columns.get(name, float('nan')) for name in self.columns])
+
+    def close(self):
+        pass
+
+
+class _TextSink(Sink):
+    """
+    A sink which writes text to a file or standard output.
+    """
+
+    def __init__(self, columns=None, path=None):
+        self.file = open(path, 'w', newline='') if path else sys.stdout
+        super().__init__(columns, path)
+
+    def write_block(self, block):
+        self.write_rows(_block_rows(block, len(self.columns)))
+
+    def close(self):
+        if self.file is not sys.stdout:
+            self.file.close()
+        else:
+            self.file.flush()
+
+
+class TableSink(_TextSink):
+
+    def __init__(self, columns=None, path=None):
+        self.rows = []
+        super().__init__(columns, path)
+
+    def write_rows(self, rows):
+        for row in rows:
+            self.rows.append(row)
+            self.rows_written += 1
+
+    def _print_table(self):
+        from tabulate import tabulate
+
+        if self.rows:
+            print(tabulate(self.rows, headers=self.columns), file=self.file)
+        self.rows = []
+
+    def close(self):
+        self._print_table()
+        super().close()
+
+
+class CsvSink(_TextSink):
+
+    def __init__(self, columns=None, path=None, float_format=None):
+        self.float_format = float_format
+        import csv
+
+        super().__init__(None, path)
+        self.writer = csv.writer(self.file)
+        if columns is not None:
+            self.set_columns(columns)
+
+    def _start(self):
+        self.writer.writerow(self.columns)
+
+    def write_rows(self, rows):
+        for row in rows:
+            self.writer.writerow(row)
+            self.rows_written += 1
+
+    def write_block(self, block):
+        if self.float_format and getattr(block, 'ndim', None) == 2:
+            import numpy as np
+
+            np.savetxt(self.file, block, delimiter=',', fmt=self.float_format)
+            self.rows_written += len(block)
+        else:
+            super().write_block(block)
+
+
+class NdjsonSink(_TextSink):
+
+    def write_rows(self, rows):
+        columns = self.columns
+        for row in rows:
+            # JSON has no NaN, so write missing values as null.
+            record = {name: None if value != value else value for name, value in zip(columns, row)}
+            self.file.write(json.dumps(record, default=str) + '\n')
+            self.rows_written += 1
+
+
+def _is_number(value):
+    return value is None or isinstance(value, (int, float))
+
+
+def _column_dtype(values):
+    """
+    Choose the type to store a column in from its first values.
+    """
+    import numpy as np
+
+    values = np.asarray(values)
+    if values.dtype.kind == 'M':
+        return values.dtype
+    if values.dtype.kind in 'biuf' or all(_is_number(value) for value in values.tolist()):
+        return np.dtype(np.float64)
+
+    strings = [str(value) for value in values.tolist()]
+    if all(_ISO_DATE.match(value) for value in strings):
+        return np.dtype('datetime64[s]')
+
+    return np.dtype('<U%d' % max([len(value) for value in strings] + [1]))
+
+
+def _convert_column(values, dtype):
+    """
+    Convert a column's values to the type chosen for it. Missing (None) numbers become NaN.
+    """
+    import numpy as np
+
+    values = np.asarray(values)
+    if dtype.kind == 'f' and values.dtype.kind == 'O':
+        return np.array([np.nan if value is None else value for value in values.tolist()], dtype=dtype)
+    if dtype.kind == 'M' and values.dtype.kind != 'M':
+        from point_columns import to_datetime64
+        return to_datetime64([str(value) for value in values.tolist()]).astype(dtype)
+    if dtype.kind == 'U':
+        values = values.astype(str)
+        if values.dtype.itemsize > dtype.itemsize:
+            raise Exception('Values are longer than the %s the column was started with' % dtype)
+
+    return values.astype(dtype)
+
+
+class ParquetSink(Sink):
+
+    def __init__(self, columns=None, path=None, row_group_size=DEFAULT_ROW_GROUP_SIZE):
+        if not path:
+            raise Exception('The parquet format needs an output path')
+
+        super().__init__(columns, path)
+        self.row_group_size = row_group_size
+        self.writer = None
+        self.dtypes = None
+        self.pending = []
+        self.pending_rows = 0
+
+    def write_block(self, block):
+        columns = _block_columns(block, len(self.columns))
+        self.pending.append(columns)
+        self.pending_rows += len(columns[0])
+        if self.pending_rows >= self.row_group_size:
+            self._write_row_group()
+
+    def _write_row_group(self):
+        import numpy as np
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if not self.pending:
+            return
+
+        columns = [np.concatenate([chunk[i] for chunk in self.pending]) for i in range(len(self.columns))]
+        if self.dtypes is None:
+            self.dtypes = [_column_dtype(column) for column in columns]
+
+        table = pa.table({name: _convert_column(column, dtype)
+                          for name, column, dtype in zip(self.columns, columns, self.dtypes)})
+        if self.writer is None:
+            self.writer = pq.ParquetWriter(self.path, table.schema)
+        self.writer.write_table(table)
+        self.rows_written += len(columns[0])
+        self.pending = []
+        self.pending_rows = 0
+
+    def close(self):
+        self._write_row_group()
+        if self.writer is not None:
+            self.writer.close()
+
+
+def _npy_header(dtype, rows):
+    import struct
+
+    import numpy as np
+
+    header = "{'descr': %r, 'fortran_order': False, 'shape': (%d,), }" % (np.lib.format.dtype_to_descr(dtype),
+                                                                           rows)
+    header = header.ljust(_NPY_HEADER_SIZE - len(_NPY_MAGIC) - 3) + '\n'
+    return _NPY_MAGIC + struct.pack('<H', len(header)) + header.encode('latin1')
+
+
+class NpySink(Sink):
+    """
+    Writes each column to its own .npy file, appending the data as it arrives and filling in the number of
+    rows in the header when the sink is closed.
+    """
+
+    def __init__(self, columns=None, path=None):
+        if not path:
+            raise Exception('The npy format needs an output directory')
+
+        super().__init__(columns, path)
+        os.makedirs(path, exist_ok=True)
+        self.files = None
+        self.dtypes = None
+
+    def write_block(self, block):
+        columns = _block_columns(block, len(self.columns))
+        if self.files is None:
+            self.dtypes = [_column_dtype(column) for column in columns]
+            self.files = []
+            for name, dtype in zip(self.columns, self.dtypes):
+                f = open(os.path.join(self.path, name + '.npy'), 'wb')
+                f.write(_npy_header(dtype, 0))
+                self.files.append(f)
+
+        for f, column, dtype in zip(self.files, columns, self.dtypes):
+            f.write(_convert_column(column, dtype).tobytes())
+        self.rows_written += len(columns[0])
+
+    def close(self):
+        for f, dtype in zip(self.files or [], self.dtypes or []):
+            f.seek(0)
+            f.write(_npy_header(dtype, self.rows_written))
+            f.close()
+
+
+_SINKS = {
+    'table': TableSink,
+    'csv': CsvSink,
+    'ndjson': NdjsonSink,
+    'parquet': ParquetSink,
+    'npy': NpySink,
+}
+
+
+def open_sink(output_format, columns=None, path=None, **options):
+    """
+    Open a sink which writes rows with the given columns in one of FORMATS, to path or standard output.
+    Options such as float_format (csv) or row_group_size (parquet) are passed to the sink.
+    """
+    if output_format not in _SINKS:
+        raise Exception('Unknown output format', output_format)
+
+    return _SINKS[output_format](columns, path, **options)
@@ -0,0 +1,41 @@
+"""
+An example of retrieving the forecast for many points concurrently using asyncio.
+
+This is the asyncio equivalent of point_api_batch_example.py. All requests run on a single thread,
+so thousands of points can be in flight without a thread per request.
+"""
+import argparse
+import asyncio
+
+from async_utils import create_session, get_point_api_responses
+from point_api_batch_example import read_points
+
+
+async def print_point_api_responses(points, bundles, time_bundle, max_concurrency, timeout):
+    """
+    Fetch the forecast data for each point and print a summary line as each one arrives.
+    """
+    # The connection pool has to be as large as the number of requests in flight.
+    async with create_session(limit=max_concurrency, limit_per_host=max_concurrency, timeout=timeout) as session:
+        async for result in get_point_api_responses(points, bundles=bundles, time_bundle=time_bundle,
+                                                    session=session, max_concurrency=max_concurrency):
+            print(f'({result.lat},{result.lon}): {len(result.data)} forecast times in {result.latency * 1000:.0f}ms')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Print forecast data for many points using asyncio')
+    parser.add_argument('points_file', type=str,
+                        help='A CSV file of points, one "lat,lon" pair per line')
+    parser.add_argument('--bundles', type=str, default='basic',
+                        help='The bundles to include separated by commas')
+    parser.add_argument('--time_bundle', type=str, default='medium_range_std_freq',
+                        help='The time bundle for the forecast')
+    parser.add_argument('--max_concurrency', type=int, default=100,
+                        help='The maximum number of requests to run at once, unless the API starts rate limiting '
+                             'or spire-api-max-concurrency is lower')
+    parser.add_argument('--timeout', type=float, default=60,
+                        help='The number of seconds to allow for each request')
+
+    args = parser.parse_args()
+    asyncio.run(print_point_api_responses(list(read_points(args.points_file)), args.bundles, args.time_bundle,
+                                          args.max_concurrency, args.timeout))
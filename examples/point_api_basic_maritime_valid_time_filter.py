@@ -7,10 +7,11 @@ access to all requested bundles.
 import argparse
 from datetime import datetime
 
+from output_sinks import add_output_arguments
 from utils import get_point_api_response, print_point_api_data
 
 
-def print_point_api_response(lat, lon):
+def print_point_api_response(lat, lon, output_format='table', output=None):
     """
     Fetch the forecast data and print it out for a given lat/lon.
     """
@@ -19,26 +20,15 @@ def print_point_api_response(lat, lon):
     time_now = datetime.now().isoformat()
     valid_time_interval = f'{time_now}/P0DT15H'
 
-    data = []
-    headers = []
+    forecast = get_point_api_response(lat, lon, bundles='basic,maritime', time_bundle='medium_range_std_freq',
+                                      valid_time_interval=valid_time_interval, columnar=True)
 
-    for entry in get_point_api_response(lat, lon, bundles='basic,maritime', time_bundle='medium_range_std_freq',
-                                        valid_time_interval=valid_time_interval):
-        # The dict is unsorted by default which could cause issues as we iterate over each entry,
-        # so ensure they are sorted identically.
-        sorted_values = sorted(entry['values'])
-
-        issuance_time = entry['times']['issuance_time']
-        valid_time = entry['times']['valid_time']
-
-        # Get all the values that have been returned and merge them with the times.
-        d = [issuance_time, valid_time] + [entry['values'][f] for f in sorted_values]
-        data.append(d)
-
-        headers.extend(['issuance_time', 'valid_time'] + sorted_values)
+    # The variables in the columnar forecast are already sorted, so each row lines up with the headers.
+    headers = ['issuance_time', 'valid_time'] + list(forecast.fields)
+    data = list(forecast.rows())
 
     # Print out the values we have collected above in a friendly format.
-    print_point_api_data(headers=headers, data=data)
+    print_point_api_data(headers=headers, data=data, output_format=output_format, output=output)
 
 
 if __name__ == '__main__':
@@ -48,7 +38,8 @@ if __name__ == '__main__':
                         help='The latitude of the point')
     parser.add_argument('--lon', type=float, default=6.1,
                         help='The longitude of the point')
+    add_output_arguments(parser)
 
     # Parse the command line arguments and invoke the function.
     args = parser.parse_args()
-    print_point_api_response(args.lat, args.lon)
+    print_point_api_response(args.lat, args.lon, args.format, args.output)
@@ -0,0 +1,119 @@
+"""
+An example of retrieving the forecast for many points at once.
+
+Requests are made concurrently over a shared pool of keep-alive connections, and the results are printed
+as each request completes along with how long it took.
+"""
+import argparse
+import csv
+import statistics
+
+from instrumentation import MetricsCollector, add_hooks
+from issuance_resolver import IssuanceResolver
+from point_cache import PointCache
+from output_sinks import FORMATS, open_sink
+from point_dedup import DEFAULT_GRID_RESOLUTION, get_point_api_responses_deduplicated
+from point_history import PointHistory
+from utils import get_point_api_responses
+
+
+def read_points(filepath):
+    """
+    Read (lat, lon) pairs from a CSV file with one point per line.
+    """
+    with open(filepath, newline='') as f:
+        for row in csv.reader(f):
+            if row:
+                yield float(row[0]), float(row[1])
+
+
+def print_point_api_responses(points, bundles, time_bundle, max_in_flight, cache=None, issuance_time=None,
+                              snap=None, blend=False, history=None, output_format='csv', output=None):
+    """
+    Fetch the forecast data for each point and print a summary line as each one arrives.
+
+    If snap is set to a grid resolution in degrees, points are snapped to the grid and only one request is made
+    for each grid node (see point_dedup.py). With blend, the surrounding grid nodes are interpolated instead.
+    If a PointHistory is given, every forecast is added to it. If output is given, every forecast is also written
+    to it in output_format (see output_sinks.py), a row per point and forecast time.
+    """
+    if snap:
+        results = get_point_api_responses_deduplicated(points, bundles, time_bundle, issuance_time=issuance_time,
+                                                       max_in_flight=max_in_flight, cache=cache, resolution=snap,
+                                                       blend=blend, history=history)
+    else:
+        results = get_point_api_responses(points, bundles=bundles, time_bundle=time_bundle,
+                                          issuance_time=issuance_time, max_in_flight=max_in_flight, cache=cache,
+                                          history=history)
+
+    latencies = []
+    sink = open_sink(output_format, path=output) if output else None
+    try:
+        for result in results:
+            latencies.append(result.latency)
+            print(f'({result.lat},{result.lon}): {len(result.data)} forecast times in {result.latency * 1000:.0f}ms')
+
+            if sink is not None and result.data:
+                # The columns are fixed by the first forecast. Variables it doesn't have are left out of the rest.
+                if sink.columns is None:
+                    sink.set_columns(['lat', 'lon', 'issuance_time', 'valid_time'] + sorted(result.data[0]['values']))
+                fields = sink.columns[4:]
+                sink.write_rows([result.lat, result.lon, entry['times']['issuance_time'], entry['times']['valid_time']]
+                                + [entry['values'].get(field) for field in fields] for entry in result.data)
+    finally:
+        if sink is not None:
+            sink.close()
+
+    if len(latencies) > 1:
+        print(f'Median request latency: {statistics.median(latencies) * 1000:.0f}ms')
+
+    if cache is not None:
+        print('Cache statistics: %s' % cache.stats())
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Print forecast data for many points')
+    parser.add_argument('points_file', type=str,
+                        help='A CSV file of points, one "lat,lon" pair per line')
+    parser.add_argument('--bundles', type=str, default='basic',
+                        help='The bundles to include separated by commas')
+    parser.add_argument('--time_bundle', type=str, default='medium_range_std_freq',
+                        help='The time bundle for the forecast')
+    parser.add_argument('--max_in_flight', type=int, default=8,
+                        help='The maximum number of requests to run at once')
+    parser.add_argument('--cache', action='store_true',
+                        help='Cache complete forecasts on disk and reuse them')
+    parser.add_argument('--last_complete', action='store_true',
+                        help='Fetch every point from the latest complete issuance')
+    parser.add_argument('--snap', type=float, nargs='?', const=DEFAULT_GRID_RESOLUTION,
+                        help='Make one request per grid node, snapping points to a grid of this resolution in degrees')
+    parser.add_argument('--blend', action='store_true',
+                        help='With --snap, interpolate each point from the four surrounding grid nodes')
+    parser.add_argument('--history', type=str,
+                        help='Add every forecast to the point history store in this directory')
+    parser.add_argument('--output', type=str,
+                        help='Write every forecast to this file (or directory for npy)')
+    parser.add_argument('--format', type=str, choices=FORMATS, default='csv',
+                        help='The format of the --output file')
+    parser.add_argument('--metrics', action='store_true',
+                        help='Print request metrics in the Prometheus text format when done')
+
+    args = parser.parse_args()
+    cache = PointCache() if args.cache else None
+    history = PointHistory(args.history) if args.history else None
+    metrics = MetricsCollector()
+    if args.metrics:
+        add_hooks(metrics)
+
+    # Look up the latest complete issuance once and use it for every point.
+    issuance_time = None
+    if args.last_complete:
+        issuance_time = IssuanceResolver(cache=cache).get_last_complete_issuance(args.bundles, args.time_bundle)
+
+    print_point_api_responses(read_points(args.points_file), args.bundles, args.time_bundle, args.max_in_flight,
+                              cache, issuance_time, args.snap, args.blend, history, args.format, args.output)
+    if history is not None:
+        history.close()
+
+    if args.metrics:
+        print(metrics.to_prometheus())
@@ -4,33 +4,31 @@ including converting the wind u and v fields to wind speed and direction.
 """
 import argparse
 
-from conversions import wind_direction_from_u_v, wind_speed_from_u_v
+from derived_variables import forecast_evaluator
+from output_sinks import add_output_arguments
+from point_columns import PointForecast
 from utils import get_point_api_response, print_point_api_data
 
 
-def print_point_api_response(lat, lon):
+def print_point_api_response(lat, lon, output_format='table', output=None):
     """
     Fetch the forecast data and print it out for a given lat/lon.
     """
+    data = get_point_api_response(lat, lon)
 
-    # Build up a list of the values we want to print out from the response.
-    data = []
-    for entry in get_point_api_response(lat, lon):
-        # Get the values we want to print out.
-        issuance_time = entry['times']['issuance_time']
-        valid_time = entry['times']['valid_time']
-        air_temp = entry['values'].get('air_temperature')
-        wind_u = entry['values'].get('eastward_wind')
-        wind_v = entry['values'].get('northward_wind')
+    # Convert the wind vectors to wind speed and direction for every forecast time at once. The wind components
+    # are only read from the forecast once for both.
+    names = ['air_temperature', 'wind_speed', 'wind_direction']
+    values = forecast_evaluator(PointForecast.from_data(data)).compute(names)
 
-        # Convert the wind vectors to wind speed and direction.
-        wind_direction = wind_direction_from_u_v(wind_u, wind_v)
-        wind_speed = wind_speed_from_u_v(wind_u, wind_v)
-
-        data.append([issuance_time, valid_time, air_temp, wind_speed, wind_direction])
+    # Build up a list of the values we want to print out.
+    tabular_data = []
+    for entry, row_values in zip(data, zip(*[values[name].tolist() for name in names])):
+        tabular_data.append([entry['times']['issuance_time'], entry['times']['valid_time']] + list(row_values))
 
     # Print out the values we have collected above in a friendly format.
-    print_point_api_data(headers=['issuance_time', 'valid_time', 'air_temperature', 'wind_speed', 'wind_direction'], data=data)
+    headers = ['issuance_time', 'valid_time'] + names
+    print_point_api_data(headers=headers, data=tabular_data, output_format=output_format, output=output)
 
 
 if __name__ == '__main__':
@@ -40,7 +38,8 @@ if __name__ == '__main__':
                         help='The latitude of the point')
     parser.add_argument('--lon', type=float, default=6.1,
                         help='The longitude of the point')
+    add_output_arguments(parser)
 
     # Parse the command line arguments and invoke the function.
     args = parser.parse_args()
-    print_point_api_response(args.lat, args.lon)
+    print_point_api_response(args.lat, args.lon, args.format, args.output)
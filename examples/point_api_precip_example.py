@@ -1,68 +1,67 @@
 """
 The Spire Weather Point API gives forecast-total accumulated precipitation values since the start of
 the forecast rather than fixed interval accumulations such as 6 hour or 24 hour values. This example
-shows how a user could create 6-hour accumulations from the forecast-total value by differencing
-the totals from adjacant lead times.
+shows how a user could create interval accumulations from the forecast-total value by differencing
+the totals at the lead times either side of each interval.
+
+By default the amounts are for the intervals between the forecast times in the response. With --window,
+they are resampled to fixed 1, 6 or 24 hour windows instead (see precipitation.py).
 """
 import argparse
-import os
-from urllib.parse import urljoin
 
-import requests
-from tabulate import tabulate
+import numpy as np
 
-HOST = 'https://api.wx.spire.com'
-API_KEY = os.getenv('spire-api-key')
+# local scripts
+from output_sinks import add_output_arguments
+from precipitation import deaccumulate, get_lead_times, resample
+from utils import get_point_api_response, print_point_api_data
 
 
-def print_point_api_response(api_key, lat, lon):
+def print_point_api_response(lat, lon, time_bundle='medium_range_std_freq', window=None, output_format='table',
+                             output=None):
     """
-    Fetch the forecast data and print it out for a given lat/lon.
+    Fetch the forecast data and print the precipitation for each interval at a given lat/lon.
     """
+    forecast = get_point_api_response(lat, lon, time_bundle=time_bundle, columnar=True)
 
-    print(f'Retrieving forecast for point ({lat},{lon})')
-
-    # Build the URL, add the headers and query parameters.
-    url = urljoin(HOST, '/forecast/point')
-    params = {'lat': lat, 'lon': lon}
-    headers = {'spire-api-key': api_key}
-    response = requests.get(url, headers=headers, params=params)
-
-    # If there is no 'data' element then raise an error.
-    json_response = response.json()
-    if 'data' not in json_response:
-        raise Exception('Response did not contain a data element', json_response)
+    totals = forecast['precipitation_amount']
+    lead_times = get_lead_times(forecast.issuance_times, forecast.valid_times)
+    issuance_time = forecast.issuance_times[0]
 
-    data = json_response['data']
+    if window:
+        ends, amounts = resample(totals, lead_times, window)
+        starts = ends - window
+    else:
+        starts, amounts = deaccumulate(totals, lead_times)
+        ends = lead_times
 
-    # Build up a list of the values we want to print out from the response.
+    # Build up a list of the values we want to print out, leaving out windows with a missing lead time
+    # and the empty interval at lead time 0.
     tabular_data = []
-    previous_precip_total = 0
-    for entry in data:
-        valid_time = entry['times']['valid_time']
+    for start, end, amount in zip(starts.tolist(), ends.tolist(), amounts.tolist()):
+        if amount != amount or start == end:
+            continue
+        valid_time = issuance_time + np.timedelta64(end, 'h')
+        tabular_data.append([str(valid_time), f'{start}-{end}h', amount])
 
-        # Create the accumulation during the period between the previous output time and the current one.
-        current_precip_total = entry['values']['precipitation_amount']
-        precip_amount = current_precip_total - previous_precip_total
-        previous_precip_total = current_precip_total
-
-        tabular_data.append([valid_time, precip_amount])
-
-    # Using the tabulate library, print out the values we have collected above in a friendly format.
-    print(tabulate(tabular_data, headers=['valid_time', 'precipitation_amount']))
+    # Print out the values we have collected above in a friendly format.
+    print_point_api_data(headers=['valid_time', 'interval', 'precipitation_amount'], data=tabular_data,
+                         output_format=output_format, output=output)
 
 
 if __name__ == '__main__':
-    if not API_KEY:
-        raise Exception('spire-api-key environment variable is not set.')
-
     # Define our command line arguments
     parser = argparse.ArgumentParser(description='Print forecast precipitation for a point')
     parser.add_argument('--lat', type=float, default=49.6,
                         help='The latitude of the point')
     parser.add_argument('--lon', type=float, default=6.1,
                         help='The longitude of the point')
+    parser.add_argument('--time_bundle', type=str, default='medium_range_std_freq',
+                        help='The time bundle for the forecast')
+    parser.add_argument('--window', type=int, choices=(1, 6, 24),
+                        help='Resample to fixed windows of this many hours')
+    add_output_arguments(parser)
 
     # Parse the command line arguments and invoke the function.
     args = parser.parse_args()
-    print_point_api_response(API_KEY, args.lat, args.lon)
+    print_point_api_response(args.lat, args.lon, args.time_bundle, args.window, args.format, args.output)
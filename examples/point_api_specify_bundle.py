@@ -4,33 +4,25 @@ for more or more product bundles.
 """
 import argparse
 
+from output_sinks import add_output_arguments
+from point_cache import PointCache
 from utils import get_point_api_response, print_point_api_data
 
 
-def print_point_api_response(lat, lon, bundles='basic'):
+def print_point_api_response(lat, lon, bundles='basic', cache=None, output_format='table', output=None):
     """
     Fetch the forecast data and print it out for a given lat/lon.
     """
 
-    # Build up a list of the values we want to print out from the response.
-    data = []
-    headers = []
-    for entry in get_point_api_response(lat, lon, bundles=bundles, time_bundle='medium_range_std_freq'):
-        # The dict is unsorted by default which could cause issues as we iterate over each entry,
-        # so ensure they are sorted identically.
-        sorted_values = sorted(entry['values'])
+    forecast = get_point_api_response(lat, lon, bundles=bundles, time_bundle='medium_range_std_freq', cache=cache,
+                                      columnar=True)
 
-        issuance_time = entry['times']['issuance_time']
-        valid_time = entry['times']['valid_time']
-
-        # Get all the values that have been returned and merge them with the times.
-        d = [issuance_time, valid_time] + [entry['values'][f] for f in sorted_values]
-        data.append(d)
-
-        headers.extend(['issuance_time', 'valid_time'] + sorted_values)
+    # The variables in the columnar forecast are already sorted, so each row lines up with the headers.
+    headers = ['issuance_time', 'valid_time'] + list(forecast.fields)
+    data = list(forecast.rows())
 
     # Print out the values we have collected above in a friendly format.
-    print_point_api_data(headers=headers, data=data)
+    print_point_api_data(headers=headers, data=data, output_format=output_format, output=output)
 
 
 if __name__ == '__main__':
@@ -42,7 +34,11 @@ if __name__ == '__main__':
                         help='The longitude of the point')
     parser.add_argument('--bundles', type=str, default='basic',
                         help='The bundles to include separated by commas')
+    parser.add_argument('--cache', action='store_true',
+                        help='Cache complete forecasts on disk and reuse them')
+    add_output_arguments(parser)
 
     # Parse the command line arguments and invoke the function.
     args = parser.parse_args()
-    print_point_api_response(args.lat, args.lon, args.bundles)
+    cache = PointCache() if args.cache else None
+    print_point_api_response(args.lat, args.lon, args.bundles, cache, args.format, args.output)
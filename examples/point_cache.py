@@ -0,0 +1,179 @@
+"""
+A persistent on-disk cache of Point API responses.
+
+Once an issuance is complete, the forecast for a given point, bundles, time bundle and issuance time never
+changes, so repeated lookups can be answered from disk instead of spending API quota. Responses are only
+cached when they contain every lead time expected for the time bundle, so an issuance that is still
+populating the API is never cached as final.
+
+Requests made without an issuance time return the latest issuance. Those entries are remembered along with
+the issuance they resolved to, and are dropped once a newer issuance is seen for the same bundles and time
+bundle, or once they are older than latest_max_age seconds.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from utils import get_expected_forecast_size
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'spire-weather', 'point_cache.sqlite')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    bundles TEXT,
+    time_bundle TEXT,
+    issuance_time TEXT,
+    latest INTEGER,
+    data TEXT,
+    size INTEGER,
+    created REAL,
+    last_access REAL
+);
+CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access);
+CREATE INDEX IF NOT EXISTS entries_issuance ON entries (bundles, time_bundle, latest, issuance_time);
+CREATE TABLE IF NOT EXISTS stats (
+    name TEXT PRIMARY KEY,
+    value INTEGER
+);
+"""
+
+
+def is_complete_issuance(data, time_bundle, valid_time_interval=None):
+    """
+    Check whether a Point API response holds every lead time of its issuance.
+
+    Responses filtered by a valid time interval, or for the default time bundle, can't be checked
+    and are treated as incomplete.
+    """
+    if not data or not time_bundle or valid_time_interval:
+        return False
+
+    return len(data) == get_expected_forecast_size(time_bundle)
+
+
+class PointCache(object):
+    """
+    A size-bounded cache of complete Point API responses stored in a SQLite database.
+
+    When there are more than max_entries responses, or they take up more than max_bytes,
+    the least recently used responses are evicted.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_entries=10000, max_bytes=512 * 1024 * 1024,
+                 latest_max_age=3600):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.latest_max_age = latest_max_age
+
+        # The cache may be shared by the threads of the batch fetcher.
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript(_SCHEMA)
+
+    @staticmethod
+    def _key(lat, lon, bundles, time_bundle, valid_time_interval, issuance_time):
+        return json.dumps([float(lat), float(lon), bundles, time_bundle, valid_time_interval, issuance_time])
+
+    def _count(self, name, amount=1):
+        self._db.execute('INSERT INTO stats (name, value) VALUES (?, ?) '
+                         'ON CONFLICT (name) DO UPDATE SET value = value + excluded.value', (name, amount))
+
+    def get(self, lat, lon, bundles=None, time_bundle=None, valid_time_interval=None, issuance_time=None):
+        """
+        Return the cached 'data' element for the request, or None if it is not cached.
+        """
+        key = self._key(lat, lon, bundles, time_bundle, valid_time_interval, issuance_time)
+        now = time.time()
+        with self._lock, self._db:
+            row = self._db.execute('SELECT data, latest, created FROM entries WHERE key = ?', (key,)).fetchone()
+            if row and row[1] and now - row[2] > self.latest_max_age:
+                # There may have been a newer issuance since this was cached.
+                self._db.execute('DELETE FROM entries WHERE key = ?', (key,))
+                row = None
+
+            if row is None:
+                self._count('misses')
+                return None
+
+            self._db.execute('UPDATE entries SET last_access = ? WHERE key = ?', (now, key))
+            self._count('hits')
+
+        return json.loads(row[0])
+
+    def put(self, lat, lon, data, bundles=None, time_bundle=None, valid_time_interval=None, issuance_time=None):
+        """
+        Cache the 'data' element for the request if it is a complete issuance. Returns whether it was cached.
+        """
+        if not is_complete_issuance(data, time_bundle, valid_time_interval):
+            return False
+
+        key = self._key(lat, lon, bundles, time_bundle, valid_time_interval, issuance_time)
+        resolved_issuance_time = data[0]['times']['issuance_time']
+        payload = json.dumps(data)
+        now = time.time()
+        with self._lock, self._db:
+            self._db.execute(
+                'INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (key, bundles, time_bundle, resolved_issuance_time, issuance_time is None, payload, len(payload),
+                 now, now)
+            )
+            self._invalidate_before(bundles, time_bundle, resolved_issuance_time)
+            self._evict()
+
+        return True
+
+    def invalidate_before(self, bundles, time_bundle, issuance_time):
+        """
+        Drop cached latest-issuance responses that are older than the given issuance time.
+        """
+        with self._lock, self._db:
+            self._invalidate_before(bundles, time_bundle, issuance_time)
+
+    def _invalidate_before(self, bundles, time_bundle, issuance_time):
+        # Responses for an explicit issuance time stay valid; only the latest-issuance lookups go stale.
+        cursor = self._db.execute(
+            'DELETE FROM entries WHERE bundles IS ? AND time_bundle IS ? AND latest AND issuance_time < ?',
+            (bundles, time_bundle, issuance_time)
+        )
+        if cursor.rowcount:
+            self._count('invalidations', cursor.rowcount)
+
+    def _evict(self):
+        entries, size = self._db.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries').fetchone()
+        if entries <= self.max_entries and size <= self.max_bytes:
+            return
+
+        evicted = 0
+        rows = self._db.execute('SELECT key, size FROM entries ORDER BY last_access').fetchall()
+        for key, entry_size in rows:
+            if entries <= self.max_entries and size <= self.max_bytes:
+                break
+            self._db.execute('DELETE FROM entries WHERE key = ?', (key,))
+            entries -= 1
+            size -= entry_size
+            evicted += 1
+
+        self._count('evictions', evicted)
+
+    def stats(self):
+        """
+        Return the hit, miss, eviction and invalidation counts along with the current size of the cache.
+        """
+        with self._lock:
+            stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0}
+            stats.update(self._db.execute('SELECT name, value FROM stats').fetchall())
+            stats['entries'], stats['bytes'] = self._db.execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries'
+            ).fetchone()
+
+        return stats
+
+    def close(self):
+        self._db.close()
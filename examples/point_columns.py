@@ -0,0 +1,146 @@
+"""
+A columnar representation of Point API responses.
+
+The Point API returns a list of {'times': {...}, 'values': {...}} dicts, one per forecast time. PointForecast
+holds the same data as a NumPy array per variable along with datetime64 arrays of the issuance and valid
+times, which is much more compact and can be handed to pandas or other array code without copying.
+
+If orjson is installed it is used to decode responses, otherwise the standard json module is used:
+    pip install orjson
+"""
+import json
+
+import numpy as np
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Field indexes are shared between forecasts with the same set of variables, so a batch of
+# responses for the same bundles only holds one copy of the field names.
+_field_indexes = {}
+
+
+def loads(content):
+    """
+    Decode a JSON document, using orjson if it is available.
+    """
+    if orjson is not None:
+        return orjson.loads(content)
+
+    return json.loads(content)
+
+
+def get_field_index(fields):
+    """
+    Return the shared mapping of field name to column number for a sorted tuple of field names.
+    """
+    index = _field_indexes.get(fields)
+    if index is None:
+        index = _field_indexes.setdefault(fields, {name: i for i, name in enumerate(fields)})
+
+    return index
+
+
+def to_datetime64(times):
+    """
+    Convert a list of ISO 8601 UTC time strings to a datetime64 array.
+    """
+    # NumPy doesn't accept timezone offsets, and all times from the API are in UTC.
+    naive = [t[:-6] if t.endswith('+00:00') else t.rstrip('Z') for t in times]
+    return np.array(naive, dtype='datetime64[s]')
+
+
+def to_iso_strings(times):
+    """
+    Convert a datetime64 array to a list of ISO 8601 time strings with a UTC offset, as the API returns them.
+    """
+    return [t + '+00:00' for t in np.datetime_as_string(times.astype('datetime64[s]')).tolist()]
+
+
+class PointForecast(object):
+    """
+    The forecast for a single point, with one array of values per variable.
+
+    The values are stored in a single 2-D array with a row per variable, so each variable's array is
+    a contiguous view of that row. Variables missing from some forecast times are filled with NaN.
+    """
+
+    def __init__(self, fields, values, issuance_times, valid_times):
+        self.fields = fields
+        self.field_index = get_field_index(fields)
+        self.values = values
+        self.issuance_times = issuance_times
+        self.valid_times = valid_times
+
+    @classmethod
+    def from_data(cls, data, dtype=np.float64):
+        """
+        Build a PointForecast from the 'data' element of a Point API response.
+        """
+        fields = set()
+        for entry in data:
+            fields.update(entry['values'])
+        fields = tuple(sorted(fields))
+
+        # Build each variable's row in one pass over the entries. Missing and null values become NaN.
+        values = np.empty((len(fields), len(data)), dtype=dtype)
+        for i, field in enumerate(fields):
+            values[i] = [entry['values'].get(field) for entry in data]
+
+        issuance_times = to_datetime64([entry['times']['issuance_time'] for entry in data])
+        valid_times = to_datetime64([entry['times']['valid_time'] for entry in data])
+        return cls(fields, values, issuance_times, valid_times)
+
+    @classmethod
+    def from_json(cls, content, dtype=np.float64):
+        """
+        Build a PointForecast straight from the body of a Point API response.
+        """
+        json_response = loads(content)
+        if 'data' not in json_response:
+            raise Exception('Response did not contain a data element', json_response)
+
+        return cls.from_data(json_response['data'], dtype)
+
+    def __len__(self):
+        return len(self.valid_times)
+
+    def __getitem__(self, field):
+        """
+        Return the array of values for a variable. This is a view, not a copy.
+        """
+        return self.values[self.field_index[field]]
+
+    def __contains__(self, field):
+        return field in self.field_index
+
+    def to_dict(self):
+        """
+        Return the forecast as a dict of arrays, keyed by 'issuance_time', 'valid_time' and the variable names.
+        The arrays are views of the forecast's own arrays.
+        """
+        columns = {'issuance_time': self.issuance_times, 'valid_time': self.valid_times}
+        for i, field in enumerate(self.fields):
+            columns[field] = self.values[i]
+
+        return columns
+
+    def to_pandas(self):
+        """
+        Return the forecast as a pandas DataFrame with a row per forecast time, without copying the values.
+        """
+        import pandas as pd
+
+        return pd.DataFrame(self.to_dict(), copy=False)
+
+    def rows(self):
+        """
+        Yield a list of [issuance_time, valid_time, value, ...] for each forecast time, with values in the
+        same order as fields. Times are written as the API writes them, and missing values are None.
+        """
+        issuance_times = to_iso_strings(self.issuance_times)
+        valid_times = to_iso_strings(self.valid_times)
+        for i, values in enumerate(self.values.T.tolist()):
+            yield [issuance_times[i], valid_times[i]] + [None if value != value else value for value in values]
@@ -0,0 +1,187 @@
+"""
+Deduplicate bulk point requests by snapping points to the model grid.
+
+Points within the same grid cell get the same forecast from the Point API, so when many points are close
+together (such as a fleet in port) fetching each one separately wastes requests. Here each point is snapped to
+its nearest grid node with a spatial hash, one request is made per unique node, and the result is fanned back
+out to every point that snapped to it.
+
+With blend set, the four grid nodes surrounding each point are fetched instead and their forecasts are
+bilinearly interpolated to the point. Neighbouring points share nodes, so this still takes far fewer requests
+than fetching each point when points are dense.
+"""
+import sys
+
+import numpy as np
+
+from utils import PointResult, get_point_api_responses
+
+# The spacing in degrees of the grid of Spire's global forecasts.
+DEFAULT_GRID_RESOLUTION = 0.125
+
+
+def _normalise_lon(lons):
+    return (np.asarray(lons, dtype=np.float64) + 180) % 360 - 180
+
+
+def _node(lat_index, lon_index, resolution):
+    """
+    The (lat, lon) of a grid node, rounded so that the same node always has the same coordinates.
+    """
+    return round(lat_index * resolution, 6), round(float(_normalise_lon(lon_index * resolution)), 6)
+
+
+def snap_points(lats, lons, resolution=DEFAULT_GRID_RESOLUTION):
+    """
+    Snap points to their nearest grid node.
+
+    Returns the unique nodes as a list of (lat, lon) and, for each point, the index of its node in that list.
+    """
+    lats = np.clip(np.asarray(lats, dtype=np.float64), -90, 90)
+    lat_indices = np.round(lats / resolution).astype(np.int64)
+    # Wrap longitudes onto the grid so that points either side of the dateline share nodes.
+    lon_count = int(round(360 / resolution))
+    lon_indices = np.round(_normalise_lon(lons) / resolution).astype(np.int64) % lon_count
+
+    keys, inverse = np.unique(np.stack([lat_indices, lon_indices], axis=1), axis=0, return_inverse=True)
+    nodes = [_node(lat_index, lon_index, resolution) for lat_index, lon_index in keys.tolist()]
+    return nodes, inverse.ravel()
+
+
+def bilinear_nodes(lats, lons, resolution=DEFAULT_GRID_RESOLUTION):
+    """
+    Find the four grid nodes surrounding each point and their bilinear weights.
+
+    Returns the unique nodes as a list of (lat, lon), an array of shape (points, 4) indexing each point's
+    nodes in that list, and an array of shape (points, 4) of the weights.
+    """
+    lats = np.clip(np.asarray(lats, dtype=np.float64), -90, 90)
+    lon_count = int(round(360 / resolution))
+
+    lat_position = lats / resolution
+    lon_position = _normalise_lon(lons) / resolution
+    lat0 = np.floor(lat_position).astype(np.int64)
+    lon0 = np.floor(lon_position).astype(np.int64)
+    # At the poles the cell above is the same row, which gets no weight.
+    lat1 = np.minimum(lat0 + 1, int(round(90 / resolution)))
+    lat_fraction = lat_position - lat0
+    lon_fraction = lon_position - lon0
+
+    lat_indices = np.stack([lat0, lat0, lat1, lat1], axis=1)
+    lon_indices = np.stack([lon0, lon0 + 1, lon0, lon0 + 1], axis=1) % lon_count
+    weights = np.stack([
+        (1 - lat_fraction) * (1 - lon_fraction),
+        (1 - lat_fraction) * lon_fraction,
+        lat_fraction * (1 - lon_fraction),
+        lat_fraction * lon_fraction,
+    ], axis=1)
+
+    # Corners with no weight, such as when a point lies on a grid line, don't need to be fetched. The first
+    # corner always has some weight, so use that in their place.
+    unused = weights == 0
+    lat_indices = np.where(unused, lat_indices[:, :1], lat_indices)
+    lon_indices = np.where(unused, lon_indices[:, :1], lon_indices)
+
+    keys, inverse = np.unique(np.stack([lat_indices.ravel(), lon_indices.ravel()], axis=1), axis=0,
+                              return_inverse=True)
+    nodes = [_node(lat_index, lon_index, resolution) for lat_index, lon_index in keys.tolist()]
+    return nodes, inverse.reshape(-1, 4), weights
+
+
+def blend_data(datas, weights):
+    """
+    Combine the 'data' elements of several Point API responses with the given weights.
+
+    Values which are missing from any of the weighted responses are None. If the responses are not for the same
+    forecast times, which can happen when an issuance is published between requests, the response with the
+    largest weight is returned as it is.
+    """
+    datas = [data for data, weight in zip(datas, weights) if weight > 0]
+    weights = [weight for weight in weights if weight > 0]
+    total = sum(weights)
+
+    times = [[entry['times'] for entry in data] for data in datas]
+    if any(other != times[0] for other in times[1:]):
+        return datas[weights.index(max(weights))]
+
+    blended = []
+    for entries in zip(*datas):
+        values = {}
+        for name in entries[0]['values']:
+            components = [entry['values'].get(name) for entry in entries]
+            if any(not isinstance(value, (int, float)) for value in components):
+                values[name] = None
+            else:
+                values[name] = sum(value * weight for value, weight in zip(components, weights)) / total
+        blended.append({'times': entries[0]['times'], 'values': values})
+
+    return blended
+
+
+def get_point_api_responses_deduplicated(points, bundles=None, time_bundle=None, valid_time_interval=None,
+                                         issuance_time=None, api_key=None, max_in_flight=8, cache=None,
+                                         columnar=False, resolution=DEFAULT_GRID_RESOLUTION, blend=False,
+                                         history=None):
+    """
+    Fetch the point forecast data for many (lat, lon) points with one request per grid node.
+
+    Takes the same parameters as utils.get_point_api_responses and yields a PointResult for each input point as
+    soon as the requests it needs have finished. The latency of a result is that of the last of its requests.
+    If a PointHistory is given, each input point's forecast is added to it.
+    """
+    points = list(points)
+    if not points:
+        return
+
+    lats, lons = np.asarray(points, dtype=np.float64).T
+    if blend:
+        nodes, node_indices, weights = bilinear_nodes(lats, lons, resolution)
+    else:
+        nodes, node_indices = snap_points(lats, lons, resolution)
+        node_indices = node_indices[:, None]
+        weights = np.ones(node_indices.shape)
+
+    # The points waiting on each node, and the number of nodes each point is still waiting for.
+    waiting = {}
+    for point_index, indices in enumerate(node_indices.tolist()):
+        for node_index in set(indices):
+            waiting.setdefault(node_index, []).append(point_index)
+    remaining = [len(set(indices)) for indices in node_indices.tolist()]
+    # The number of points still to be yielded that use each node, so results can be dropped once they are done.
+    users = {node_index: len(point_indices) for node_index, point_indices in waiting.items()}
+
+    print(f'Fetching {len(points)} points with {len(nodes)} requests', file=sys.stderr)
+
+    node_index_of = {node: node_index for node_index, node in enumerate(nodes)}
+    results = {}
+    for result in get_point_api_responses(nodes, bundles, time_bundle, valid_time_interval, issuance_time,
+                                          api_key=api_key, max_in_flight=max_in_flight, cache=cache):
+        node_index = node_index_of[(result.lat, result.lon)]
+        results[node_index] = result
+
+        for point_index in waiting.pop(node_index):
+            remaining[point_index] -= 1
+            if remaining[point_index]:
+                continue
+
+            indices = node_indices[point_index].tolist()
+            node_results = [results[index] for index in indices]
+            if len(indices) == 1:
+                data = node_results[0].data
+            else:
+                data = blend_data([node_result.data for node_result in node_results], weights[point_index].tolist())
+
+            lat, lon = points[point_index]
+            if history is not None:
+                history.add(lat, lon, data)
+
+            if columnar:
+                from point_columns import PointForecast
+                data = PointForecast.from_data(data)
+
+            for index in set(indices):
+                users[index] -= 1
+                if not users[index]:
+                    del results[index]
+
+            yield PointResult(lat, lon, data, max(node_result.latency for node_result in node_results))
@@ -0,0 +1,396 @@
+"""
+An append-only local store of point forecasts from every issuance.
+
+The Point API only returns the forecasts of one issuance at a time, so comparing issuances, for example to see
+how the forecast for a given time changed or how error grows with lead time, means keeping each issuance as it
+is fetched. PointHistory keeps every value keyed by (point, issuance time, valid time, variable) on disk:
+
+    history = PointHistory('history')
+    get_point_api_responses(points, 'basic', 'medium_range_std_freq', history=history)
+    history.close()
+
+    runs = history.issuances_valid_at(10.0, 20.0, '2019-09-21T00:00:00')
+    lead_times, bias, mae, counts = history.lead_time_errors(10.0, 20.0, 'air_temperature')
+
+Values are held in long format, one row per value, in columnar segments: a directory with a NumPy array for
+each of the point, issuance time, valid time, variable and value columns. Segments are written once and never
+changed. Each one is sorted by point, so a query memory-maps the columns and only reads the rows of its point.
+New values are buffered and written as a new segment by flush(), which queries call before they run, so
+ingesting an issuance never rewrites what is already stored. If the same value is added again, for example
+when an issuance that was still being published is fetched a second time, the most recent one is returned.
+compact() merges the segments into one and drops the values which have been replaced.
+
+The point, variable and segment lists are kept in catalog.json. Only one process should write to a store at a
+time, but any number can read it.
+"""
+import json
+import os
+import shutil
+import threading
+
+import numpy as np
+
+from point_columns import PointForecast, to_datetime64
+
+CATALOG_NAME = 'catalog.json'
+
+# The number of buffered values which causes a segment to be written without waiting for flush().
+DEFAULT_BUFFER_SIZE = 1000000
+
+# The columns of a segment and their types. Values are stored as float32, which is more precise than any of
+# the forecast variables.
+COLUMNS = {
+    'point': np.int32,
+    'issuance_time': 'datetime64[s]',
+    'valid_time': 'datetime64[s]',
+    'variable': np.int16,
+    'value': np.float32,
+}
+
+
+def _point_key(lat, lon):
+    """
+    The key a point is stored under, rounded so that the same point always has the same key.
+    """
+    return round(float(lat), 6), round(float(lon), 6)
+
+
+def _datetime64(value):
+    if value is None or isinstance(value, np.datetime64):
+        return value
+
+    return to_datetime64([value])[0]
+
+
+def _latest_unique(keys):
+    """
+    Given rows of keys in the order they were written, return the indexes of the last row with each key,
+    sorted by key.
+    """
+    if not len(keys):
+        return np.empty(0, dtype=np.int64)
+
+    _, reversed_indexes = np.unique(keys[::-1], axis=0, return_index=True)
+    return len(keys) - 1 - reversed_indexes
+
+
+class PointHistory(object):
+    """
+    An append-only store of point forecasts in the directory at path, which is created if it doesn't exist.
+    """
+
+    def __init__(self, path, buffer_size=DEFAULT_BUFFER_SIZE):
+        self.path = path
+        self.buffer_size = buffer_size
+        os.makedirs(os.path.join(path, 'segments'), exist_ok=True)
+
+        catalog_path = os.path.join(path, CATALOG_NAME)
+        if os.path.exists(catalog_path):
+            with open(catalog_path) as f:
+                catalog = json.load(f)
+        else:
+            catalog = {'points': [], 'variables': [], 'segments': [], 'next_segment': 0}
+
+        self._points = [tuple(point) for point in catalog['points']]
+        self._point_ids = {point: i for i, point in enumerate(self._points)}
+        self._variables = catalog['variables']
+        self._variable_ids = {name: i for i, name in enumerate(self._variables)}
+        self._segments = catalog['segments']
+        self._next_segment = catalog['next_segment']
+
+        # Open segments, by name, as a dict of memory-mapped columns.
+        self._columns = {}
+        self._buffer = []
+        self._buffered = 0
+        # The batch fetcher adds results from several threads.
+        self._lock = threading.RLock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def points(self):
+        """
+        The (lat, lon) of every point in the store.
+        """
+        return list(self._points)
+
+    @property
+    def variables(self):
+        return list(self._variables)
+
+    def _get_id(self, ids, names, name):
+        if name not in ids:
+            ids[name] = len(names)
+            names.append(name)
+
+        return ids[name]
+
+    def add(self, lat, lon, data):
+        """
+        Add the forecast for a point, given as the 'data' element of a Point API response or a PointForecast.
+        Values which are missing or null are not stored.
+        """
+        forecast = data if isinstance(data, PointForecast) else PointForecast.from_data(data)
+        if not len(forecast):
+            return
+
+        with self._lock:
+            point_id = self._get_id(self._point_ids, self._points, _point_key(lat, lon))
+            variable_ids = np.array([self._get_id(self._variable_ids, self._variables, field)
+                                     for field in forecast.fields], dtype=COLUMNS['variable'])
+
+            # One row per variable and forecast time, leaving out missing values.
+            present = ~np.isnan(forecast.values)
+            variable_index, time_index = np.nonzero(present)
+            columns = {
+                'point': np.full(len(time_index), point_id, dtype=COLUMNS['point']),
+                'issuance_time': forecast.issuance_times[time_index].astype(COLUMNS['issuance_time']),
+                'valid_time': forecast.valid_times[time_index].astype(COLUMNS['valid_time']),
+                'variable': variable_ids[variable_index],
+                'value': forecast.values[present].astype(COLUMNS['value']),
+            }
+            self._buffer.append(columns)
+            self._buffered += len(time_index)
+
+            if self._buffered >= self.buffer_size:
+                self.flush()
+
+    def _write_catalog(self):
+        catalog = {
+            'points': self._points,
+            'variables': self._variables,
+            'segments': self._segments,
+            'next_segment': self._next_segment,
+        }
+        # Write to a temporary file first so an interrupted save can't corrupt the catalog.
+        catalog_path = os.path.join(self.path, CATALOG_NAME)
+        tmp_path = catalog_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(catalog, f)
+        os.replace(tmp_path, catalog_path)
+
+    def _write_segment(self, columns):
+        """
+        Write the columns as a new segment sorted by point, and return its catalog entry.
+        """
+        order = np.lexsort((columns['issuance_time'], columns['valid_time'], columns['variable'],
+                            columns['point']))
+        name = '%08d' % self._next_segment
+        self._next_segment += 1
+
+        # Write the segment under a temporary name so a segment directory is always complete.
+        segment_path = os.path.join(self.path, 'segments', name)
+        tmp_path = segment_path + '.tmp'
+        os.makedirs(tmp_path)
+        for column, values in columns.items():
+            np.save(os.path.join(tmp_path, column + '.npy'), values[order])
+        os.replace(tmp_path, segment_path)
+
+        return {
+            'name': name,
+            'rows': len(order),
+            'issuance_min': str(columns['issuance_time'].min()),
+            'issuance_max': str(columns['issuance_time'].max()),
+        }
+
+    def flush(self):
+        """
+        Write the buffered values to a new segment.
+        """
+        with self._lock:
+            if not self._buffered:
+                return
+
+            columns = {column: np.concatenate([chunk[column] for chunk in self._buffer]) for column in COLUMNS}
+            self._segments.append(self._write_segment(columns))
+            self._write_catalog()
+            self._buffer = []
+            self._buffered = 0
+
+    def close(self):
+        self.flush()
+
+    def _segment_columns(self, segment):
+        columns = self._columns.get(segment['name'])
+        if columns is None:
+            segment_path = os.path.join(self.path, 'segments', segment['name'])
+            columns = {column: np.load(os.path.join(segment_path, column + '.npy'), mmap_mode='r')
+                       for column in COLUMNS}
+            self._columns[segment['name']] = columns
+
+        return columns
+
+    def query(self, lat, lon, variables=None, issuance_start=None, issuance_end=None, valid_start=None,
+              valid_end=None):
+        """
+        Get the stored values for a point, optionally only for some variables and for issuance and valid times
+        in the given inclusive ranges. Times can be ISO 8601 strings or datetime64 values.
+
+        Returns a dict of 'issuance_time', 'valid_time', 'variable' and 'value' arrays with a row per value,
+        sorted by variable, valid time and issuance time. Variable names are given as strings.
+        """
+        issuance_start, issuance_end = _datetime64(issuance_start), _datetime64(issuance_end)
+        valid_start, valid_end = _datetime64(valid_start), _datetime64(valid_end)
+
+        with self._lock:
+            self.flush()
+
+            point_id = self._point_ids.get(_point_key(lat, lon))
+            variable_ids = None
+            if variables is not None:
+                variable_ids = [self._variable_ids[name] for name in variables if name in self._variable_ids]
+
+            chunks = []
+            if point_id is not None:
+                for segment in self._segments:
+                    # Skip segments which can't hold any of the issuances.
+                    if issuance_start is not None and np.datetime64(segment['issuance_max']) < issuance_start:
+                        continue
+                    if issuance_end is not None and np.datetime64(segment['issuance_min']) > issuance_end:
+                        continue
+
+                    columns = self._segment_columns(segment)
+                    start, end = np.searchsorted(columns['point'], [point_id, point_id + 1])
+                    chunk = {column: np.asarray(columns[column][start:end]) for column in COLUMNS}
+
+                    mask = np.ones(end - start, dtype=bool)
+                    if variable_ids is not None:
+                        mask &= np.isin(chunk['variable'], variable_ids)
+                    if issuance_start is not None:
+                        mask &= chunk['issuance_time'] >= issuance_start
+                    if issuance_end is not None:
+                        mask &= chunk['issuance_time'] <= issuance_end
+                    if valid_start is not None:
+                        mask &= chunk['valid_time'] >= valid_start
+                    if valid_end is not None:
+                        mask &= chunk['valid_time'] <= valid_end
+                    chunks.append({column: values[mask] for column, values in chunk.items()})
+
+        if chunks:
+            rows = {column: np.concatenate([chunk[column] for chunk in chunks]) for column in COLUMNS}
+        else:
+            rows = {column: np.empty(0, dtype=dtype) for column, dtype in COLUMNS.items()}
+
+        # Keep only the most recently added value for each key.
+        keys = np.stack([rows['variable'].astype(np.int64), rows['valid_time'].astype(np.int64),
+                         rows['issuance_time'].astype(np.int64)], axis=1)
+        latest = _latest_unique(keys)
+
+        names = np.array(self._variables or [''], dtype=object)
+        return {
+            'issuance_time': rows['issuance_time'][latest],
+            'valid_time': rows['valid_time'][latest],
+            'variable': names[rows['variable'][latest]],
+            'value': rows['value'][latest],
+        }
+
+    def get_forecast(self, lat, lon, issuance_time):
+        """
+        Rebuild the stored forecast of one issuance for a point as a PointForecast.
+        """
+        issuance_time = _datetime64(issuance_time)
+        rows = self.query(lat, lon, issuance_start=issuance_time, issuance_end=issuance_time)
+
+        fields = tuple(sorted(set(rows['variable'])))
+        valid_times, time_index = np.unique(rows['valid_time'], return_inverse=True)
+        field_index = {field: i for i, field in enumerate(fields)}
+        values = np.full((len(fields), len(valid_times)), np.nan)
+        values[[field_index[name] for name in rows['variable']], time_index] = rows['value']
+
+        issuance_times = np.full(len(valid_times), issuance_time, dtype=COLUMNS['issuance_time'])
+        return PointForecast(fields, values, issuance_times, valid_times)
+
+    def issuances_valid_at(self, lat, lon, valid_time, variables=None):
+        """
+        Get every stored issuance's forecast for one valid time at a point, oldest issuance first.
+
+        Returns a dict with an 'issuance_time' array, a 'lead_time' array in hours and an array of values for
+        each variable, which is NaN for issuances that didn't include it.
+        """
+        valid_time = _datetime64(valid_time)
+        rows = self.query(lat, lon, variables, valid_start=valid_time, valid_end=valid_time)
+
+        issuance_times, time_index = np.unique(rows['issuance_time'], return_inverse=True)
+        runs = {
+            'issuance_time': issuance_times,
+            'lead_time': ((valid_time - issuance_times) // np.timedelta64(1, 'h')).astype(np.int64),
+        }
+        for name in variables or sorted(set(rows['variable'])):
+            values = np.full(len(issuance_times), np.nan)
+            selected = rows['variable'] == name
+            values[time_index[selected]] = rows['value'][selected]
+            runs[name] = values
+
+        return runs
+
+    def lead_time_errors(self, lat, lon, variable, observations=None, issuance_start=None, issuance_end=None):
+        """
+        Calculate the forecast error of a variable at a point as a function of lead time.
+
+        observations is a pair of arrays of valid times and observed values. Without observations, each
+        forecast is compared with the stored analysis (the lead time 0 forecast) of the issuance at its valid
+        time, so the store needs to hold later issuances than the forecasts being verified.
+
+        Returns arrays of the lead times in hours, and the mean error (bias), mean absolute error and number
+        of forecasts at each lead time.
+        """
+        rows = self.query(lat, lon, [variable], issuance_start, issuance_end)
+        lead_times = ((rows['valid_time'] - rows['issuance_time']) // np.timedelta64(1, 'h')).astype(np.int64)
+
+        if observations is None:
+            analysis = lead_times == 0
+            truth_times, truth_values = rows['valid_time'][analysis], rows['value'][analysis]
+            forecast = ~analysis
+        else:
+            truth_times = np.asarray(observations[0])
+            if truth_times.dtype.kind != 'M':
+                truth_times = to_datetime64(list(truth_times))
+            truth_values = np.asarray(observations[1], dtype=np.float64)
+            forecast = np.ones(len(lead_times), dtype=bool)
+
+        if not len(truth_times):
+            return np.empty(0, dtype=np.int64), np.empty(0), np.empty(0), np.empty(0, dtype=np.int64)
+
+        # Match each forecast to the truth at its valid time.
+        order = np.argsort(truth_times)
+        truth_times, truth_values = truth_times[order], truth_values[order]
+        positions = np.minimum(np.searchsorted(truth_times, rows['valid_time']), len(truth_times) - 1)
+        matched = forecast & (truth_times[positions] == rows['valid_time'])
+
+        errors = rows['value'][matched].astype(np.float64) - truth_values[positions[matched]]
+        matched_lead_times = lead_times[matched]
+
+        unique_lead_times, index = np.unique(matched_lead_times, return_inverse=True)
+        counts = np.bincount(index, minlength=len(unique_lead_times))
+        bias = np.bincount(index, weights=errors, minlength=len(unique_lead_times)) / np.maximum(counts, 1)
+        mae = np.bincount(index, weights=np.abs(errors), minlength=len(unique_lead_times)) / np.maximum(counts, 1)
+        return unique_lead_times, bias, mae, counts
+
+    def compact(self):
+        """
+        Merge every segment into one, dropping values which have been replaced by later ones.
+        """
+        with self._lock:
+            self.flush()
+            if len(self._segments) < 2:
+                return
+
+            columns = {column: np.concatenate([self._segment_columns(segment)[column]
+                                               for segment in self._segments]) for column in COLUMNS}
+            keys = np.stack([columns['point'].astype(np.int64), columns['variable'].astype(np.int64),
+                             columns['valid_time'].astype(np.int64), columns['issuance_time'].astype(np.int64)],
+                            axis=1)
+            latest = _latest_unique(keys)
+            merged = self._write_segment({column: values[latest] for column, values in columns.items()})
+
+            old_segments = self._segments
+            self._segments = [merged]
+            self._write_catalog()
+
+            self._columns = {}
+            for segment in old_segments:
+                shutil.rmtree(os.path.join(self.path, 'segments', segment['name']))
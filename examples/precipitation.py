@@ -0,0 +1,138 @@
+"""
+De-accumulation of forecast-total precipitation.
+
+Spire forecasts give precipitation as the total accumulated since the start of the forecast. The functions here
+turn those totals into amounts over intervals, either between consecutive lead times or over fixed windows such
+as 1, 6 or 24 hours, for arrays of any shape with lead times along the last axis (such as points x lead times).
+
+The total at lead time 0 is zero by definition, so it doesn't need to be present. Missing lead times are allowed:
+an amount between lead times is taken over the whole gap, and a fixed window is only given a value when the
+totals at both of its ends are known. This also handles the mixed 1 and 6 hour spacing of medium_range_high_freq,
+where 1 hour windows can only be filled for the first 24 hours.
+
+For whole grids, WindowAccumulator takes one lead time at a time and only keeps the total at the start of the
+current window in memory.
+"""
+import numpy as np
+
+
+def get_lead_times(issuance_times, valid_times):
+    """
+    The lead times in hours of forecast times given as datetime64 arrays, such as those of a PointForecast.
+    """
+    return ((valid_times - issuance_times) // np.timedelta64(1, 'h')).astype(np.int64)
+
+
+def _with_zero_start(totals, lead_times):
+    """
+    Add the zero total at lead time 0 if it isn't already there.
+    """
+    lead_times = np.asarray(lead_times)
+    totals = np.asarray(totals, dtype=np.float64)
+    if len(lead_times) and lead_times[0] == 0:
+        return totals, lead_times
+
+    zeros = np.zeros(totals.shape[:-1] + (1,))
+    return np.concatenate([zeros, totals], axis=-1), np.concatenate([[0], lead_times])
+
+
+def deaccumulate(totals, lead_times):
+    """
+    Turn forecast-total accumulations into the amount since the previous lead time.
+
+    totals has the lead times along its last axis, which must be in increasing order. Returns an array of the
+    lead time each interval starts at and an array of the amounts, both the same shape as totals. The first
+    interval starts at lead time 0. Where a total is missing (NaN) the amount is NaN, and the next amount covers
+    the whole gap back to the last known total. Small negative amounts caused by rounding are set to zero.
+    """
+    lead_times = np.asarray(lead_times)
+    totals = np.asarray(totals, dtype=np.float64)
+    padded = np.concatenate([np.zeros(totals.shape[:-1] + (1,)), totals], axis=-1)
+    padded_lead_times = np.concatenate([[0], lead_times])
+
+    # Carry the last known total forward over gaps so each amount is relative to it.
+    known = ~np.isnan(padded)
+    last_known = np.where(known, np.arange(padded.shape[-1]), 0)
+    np.maximum.accumulate(last_known, axis=-1, out=last_known)
+    filled = np.take_along_axis(padded, last_known, axis=-1)
+
+    amounts = np.diff(filled, axis=-1)
+    amounts[~known[..., 1:]] = np.nan
+    np.maximum(amounts, 0, out=amounts, where=~np.isnan(amounts))
+
+    return padded_lead_times[last_known[..., :-1]], amounts
+
+
+def resample(totals, lead_times, window):
+    """
+    Get the precipitation over fixed windows of window hours from forecast-total accumulations.
+
+    Returns the lead time at the end of each window and an array of the amounts with the windows along the last
+    axis. The windows run from 0 to the last lead time. A window is NaN if the total at either end is missing.
+    """
+    totals, lead_times = _with_zero_start(totals, lead_times)
+    window_ends = np.arange(window, lead_times[-1] + 1, window)
+
+    # Look up the total at each window boundary, leaving NaN where that lead time isn't available.
+    boundaries = np.concatenate([[0], window_ends])
+    positions = np.searchsorted(lead_times, boundaries)
+    found = (positions < len(lead_times)) & (lead_times[np.minimum(positions, len(lead_times) - 1)] == boundaries)
+
+    boundary_totals = np.full(totals.shape[:-1] + (len(boundaries),), np.nan)
+    boundary_totals[..., found] = totals[..., positions[found]]
+
+    amounts = np.diff(boundary_totals, axis=-1)
+    np.maximum(amounts, 0, out=amounts, where=~np.isnan(amounts))
+    return window_ends, amounts
+
+
+class WindowAccumulator(object):
+    """
+    Turns a stream of forecast-total grids, one lead time at a time, into amounts over fixed windows.
+
+    Only the total at the start of the current window is kept. Lead times must be given in increasing order,
+    but need not all be present: a window with a missing lead time at either end has no amounts. With no window,
+    the amounts are between consecutive lead times as deaccumulate gives them.
+    """
+
+    def __init__(self, window=None):
+        self.window = window
+        self.start = 0
+        # The total at lead time 0 is zero, which broadcasts against the first grid.
+        self.start_total = 0.0
+
+    def _amount(self, total):
+        amount = np.asarray(np.subtract(total, self.start_total, dtype=np.float64))
+        np.maximum(amount, 0, out=amount, where=~np.isnan(amount))
+        return amount
+
+    def add(self, lead_time, total):
+        """
+        Add the total for a lead time. Returns a list of (window start, window end, amounts) for the windows
+        which have now ended, which is empty unless lead_time is the end of a window. The amounts are None
+        for windows which can't be calculated because a lead time is missing.
+        """
+        if lead_time <= self.start:
+            self.start_total = np.array(total, dtype=np.float64, copy=True)
+            return []
+
+        window = self.window
+        if window is None:
+            # Every lead time ends an interval, however long the gap since the last one.
+            windows = [(self.start, lead_time, self._amount(total))]
+        elif lead_time % window:
+            return []
+        else:
+            windows = []
+            # Windows ending at boundaries which were skipped over can't be calculated.
+            for end in range(self.start + window, lead_time, window):
+                windows.append((end - window, end, None))
+
+            if lead_time - self.start == window:
+                windows.append((self.start, lead_time, self._amount(total)))
+            else:
+                windows.append((lead_time - window, lead_time, None))
+
+        self.start = lead_time
+        self.start_total = np.array(total, dtype=np.float64, copy=True)
+        return windows
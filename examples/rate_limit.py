@@ -0,0 +1,368 @@
+"""
+A client-side rate limiter and adaptive concurrency controller shared by all API calls in a process.
+
+Every Point API request, File API download and export download takes a slot from the shared ApiLimiter
+before it is sent. The limiter combines:
+
+    - a token bucket, which caps the request rate if one is configured, and pauses every request when the
+      API returns a Retry-After header
+    - an AIMD concurrency limit, which grows by roughly one request per round trip while latency stays close to
+      the fastest seen, and halves when the API responds with a 429 or a server error
+
+so worker pools can be sized generously and the number of requests actually in flight settles at whatever the
+API will sustain. The rate can be set with the spire-api-rate-limit environment variable (requests per second).
+
+The concurrency limit starts at DEFAULT_CONCURRENCY and by default grows to at most MAX_CONCURRENCY. A caller
+which wants more requests in flight, such as the asyncio client with a large max_concurrency, can ask for them
+with get_limiter(concurrency), which raises the maximum (and the limit, until the API first shows it is
+overloaded) to that number. The spire-api-max-concurrency environment variable sets a fixed maximum instead,
+which callers can't raise.
+
+The asyncio client in async_utils.py shares the same limiter through async_slot(), which waits for a slot
+without blocking the event loop.
+"""
+import os
+import random
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+
+# The number of times to retry a request that failed with a retryable error, and the delay in seconds before
+# the first retry. The delay doubles with each retry.
+DEFAULT_RETRIES = 5
+DEFAULT_BACKOFF = 1.0
+
+# The concurrency limit starts at DEFAULT_CONCURRENCY and is kept between MIN_CONCURRENCY and MAX_CONCURRENCY,
+# unless a caller asks for more (see get_limiter).
+DEFAULT_CONCURRENCY = 8
+MIN_CONCURRENCY = 1
+MAX_CONCURRENCY = 32
+
+# The concurrency limit only grows while the smoothed latency is within this multiple of the fastest latency seen.
+LATENCY_TOLERANCE = 2.0
+
+# The weight given to each new latency in the exponentially weighted moving average.
+LATENCY_SMOOTHING = 0.1
+
+# The minimum number of seconds between decreases of the concurrency limit, so that a burst of errors from
+# requests which were already in flight only halves the limit once.
+DECREASE_COOLDOWN = 1.0
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def is_overloaded(status):
+    """
+    Check whether an HTTP status means the API wants us to slow down.
+    """
+    return status == 429 or status >= 500
+
+
+def get_retry_after(response):
+    """
+    Get the number of seconds to wait from a response's Retry-After header, or None if it doesn't have one.
+    """
+    value = response.headers.get('Retry-After') if response is not None else None
+    if not value:
+        return None
+
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    from datetime import datetime, timezone
+    from email.utils import parsedate_to_datetime
+
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+def backoff_delay(attempt, backoff=DEFAULT_BACKOFF):
+    """
+    The delay before a retry, doubling with each attempt. Jitter is added so that parallel requests
+    don't all retry at the same moment.
+    """
+    return backoff * 2 ** attempt + random.uniform(0, backoff)
+
+
+class TokenBucket(object):
+    """
+    Allows requests at an average of rate per second with bursts of up to burst requests.
+    With no rate, requests are only held back while the bucket is paused.
+    """
+
+    def __init__(self, rate=None, burst=None):
+        self.rate = rate
+        self.burst = burst or max(1.0, rate or 1.0)
+        self.tokens = self.burst
+        self.paused_until = 0.0
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def pause(self, seconds):
+        """
+        Hold back all requests for a number of seconds, for example as asked by a Retry-After header.
+        """
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def try_acquire(self):
+        """
+        Take a token if a request can be made now and return 0, or otherwise return the number of seconds to
+        wait before trying again.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if now < self.paused_until:
+                return self.paused_until - now
+            if self.rate is None:
+                return 0
+
+            self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+    def acquire(self):
+        """
+        Wait until a request can be made.
+        """
+        wait = self.try_acquire()
+        while wait:
+            time.sleep(wait)
+            wait = self.try_acquire()
+
+    async def acquire_async(self):
+        import asyncio
+
+        wait = self.try_acquire()
+        while wait:
+            await asyncio.sleep(wait)
+            wait = self.try_acquire()
+
+
+class AdaptiveConcurrency(object):
+    """
+    A concurrency limit adjusted by additive increase and multiplicative decrease.
+
+    Each healthy response adds 1 / limit to the limit, so it grows by about one for each round of requests,
+    as long as the smoothed latency stays within LATENCY_TOLERANCE of the fastest response seen. Latency rising
+    above that means requests are queueing at the server, so the limit holds. A response which shows the API
+    is overloaded multiplies the limit by decrease.
+    """
+
+    def __init__(self, initial=DEFAULT_CONCURRENCY, minimum=MIN_CONCURRENCY, maximum=MAX_CONCURRENCY, decrease=0.5,
+                 latency_tolerance=LATENCY_TOLERANCE, cooldown=DECREASE_COOLDOWN):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.decrease = decrease
+        self.latency_tolerance = latency_tolerance
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self.min_latency = None
+        self.smoothed_latency = None
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+        # The (event loop, future) of each asyncio task waiting for a slot, in the order they started waiting.
+        self._async_waiters = deque()
+
+    def acquire(self):
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+
+    async def acquire_async(self):
+        """
+        Wait for a slot from a coroutine. Waiting tasks are woken in turn as slots are released.
+        """
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._condition:
+                if self.in_flight < int(self.limit):
+                    self.in_flight += 1
+                    return
+                waiter = loop.create_future()
+                self._async_waiters.append((loop, waiter))
+
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                # Pass the wake up on to another task, in case this one was chosen for a free slot.
+                with self._condition:
+                    self._wake_async_waiters(1)
+                raise
+
+    def _wake_async_waiters(self, count):
+        # Called with the condition held.
+        while count > 0 and self._async_waiters:
+            loop, waiter = self._async_waiters.popleft()
+            if not waiter.done():
+                loop.call_soon_threadsafe(_set_waiter_result, waiter)
+                count -= 1
+
+    def raise_maximum(self, maximum):
+        """
+        Allow up to maximum requests at once. Until a response has shown that the API is overloaded the limit is
+        raised straight to the new maximum, rather than growing to it one request per round trip.
+        """
+        with self._condition:
+            if maximum <= self.maximum:
+                return
+            self.maximum = maximum
+            if not self._last_decrease:
+                self.limit = max(self.limit, float(maximum))
+
+            self._condition.notify_all()
+            self._wake_async_waiters(int(self.limit) - self.in_flight)
+
+    def release(self, latency=None, overloaded=False):
+        with self._condition:
+            self.in_flight -= 1
+
+            if overloaded:
+                now = time.monotonic()
+                if now - self._last_decrease > self.cooldown:
+                    self.limit = max(self.minimum, self.limit * self.decrease)
+                    self._last_decrease = now
+            elif latency is not None:
+                if self.min_latency is None:
+                    self.min_latency = self.smoothed_latency = latency
+                self.min_latency = min(self.min_latency, latency)
+                self.smoothed_latency += LATENCY_SMOOTHING * (latency - self.smoothed_latency)
+                if self.smoothed_latency <= self.min_latency * self.latency_tolerance:
+                    self.limit = min(self.maximum, self.limit + 1 / self.limit)
+
+            self._condition.notify_all()
+            self._wake_async_waiters(int(self.limit) - self.in_flight)
+
+
+def _set_waiter_result(waiter):
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+class Slot(object):
+    """
+    Permission to make one request. Record the response so the limiter can adapt to it.
+    """
+
+    def __init__(self):
+        self.start = time.monotonic()
+        self.status = None
+        self.latency = None
+        self.retry_after = None
+
+    @property
+    def overloaded(self):
+        return self.status is not None and is_overloaded(self.status)
+
+    def record(self, response):
+        """
+        Record the status and Retry-After header of a response. Call this as soon as the headers have arrived,
+        so that the time taken to stream a large body isn't counted as latency.
+        """
+        self.latency = time.monotonic() - self.start
+        # requests and simple_http responses have status_code, and aiohttp responses have status.
+        self.status = getattr(response, 'status_code', None) or response.status
+        if self.overloaded:
+            self.retry_after = get_retry_after(response)
+
+
+class ApiLimiter(object):
+    """
+    Combines a token bucket and an adaptive concurrency limit. Use slot() around each request:
+
+        with limiter.slot() as slot:
+            response = session.get(url)
+            slot.record(response)
+    """
+
+    def __init__(self, rate=None, burst=None, initial_concurrency=DEFAULT_CONCURRENCY, max_concurrency=None):
+        self.bucket = TokenBucket(rate, burst)
+        # A maximum given here is fixed. Otherwise it's MAX_CONCURRENCY unless a caller asks for more.
+        self.fixed_maximum = max_concurrency is not None
+        maximum = max_concurrency or MAX_CONCURRENCY
+        self.concurrency = AdaptiveConcurrency(min(initial_concurrency, maximum), maximum=maximum)
+
+    @property
+    def limit(self):
+        return int(self.concurrency.limit)
+
+    def allow_concurrency(self, concurrency):
+        """
+        Let up to concurrency requests run at once, unless the maximum was fixed when the limiter was created.
+        """
+        if not self.fixed_maximum:
+            self.concurrency.raise_maximum(concurrency)
+
+    @contextmanager
+    def slot(self):
+        self.concurrency.acquire()
+        slot = Slot()
+        failed = True
+        try:
+            self.bucket.acquire()
+            slot.start = time.monotonic()
+            yield slot
+            failed = False
+        finally:
+            if slot.retry_after is not None:
+                self.bucket.pause(slot.retry_after)
+            # A request which failed without a response, such as a timeout, is also a sign of overload.
+            overloaded = slot.overloaded or (failed and slot.status is None)
+            self.concurrency.release(slot.latency, overloaded)
+
+    @asynccontextmanager
+    async def async_slot(self):
+        """
+        The same as slot(), for use with 'async with' from a coroutine.
+        """
+        import asyncio
+
+        await self.concurrency.acquire_async()
+        slot = Slot()
+        failed = True
+        try:
+            await self.bucket.acquire_async()
+            slot.start = time.monotonic()
+            yield slot
+            failed = False
+        except asyncio.CancelledError:
+            # A cancelled request says nothing about the API.
+            failed = False
+            raise
+        finally:
+            if slot.retry_after is not None:
+                self.bucket.pause(slot.retry_after)
+            overloaded = slot.overloaded or (failed and slot.status is None)
+            self.concurrency.release(slot.latency, overloaded)
+
+
+def get_limiter(concurrency=None):
+    """
+    Return the limiter shared by all API calls in this process. If concurrency is given, the limiter lets that
+    many requests run at once unless spire-api-max-concurrency sets a lower maximum.
+    """
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            rate = os.getenv('spire-api-rate-limit')
+            max_concurrency = os.getenv('spire-api-max-concurrency')
+            _limiter = ApiLimiter(rate=float(rate) if rate else None,
+                                  max_concurrency=int(max_concurrency) if max_concurrency else None)
+
+    if concurrency is not None:
+        _limiter.allow_concurrency(concurrency)
+    return _limiter
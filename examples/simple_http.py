@@ -0,0 +1,176 @@
+"""
+A small HTTP session built on the standard library, for short-lived commands where start-up time matters.
+
+Importing requests takes longer than a single Point API call, so spire_wx.py uses SimpleSession for its point
+and file commands instead. SimpleSession supports the part of the requests.Session interface that utils.py
+and downloads.py use: get() with headers, params, stream and allow_redirects, and responses with status_code,
+headers, content, json(), iter_content() and raise_for_status(). Connections are kept alive per host and per
+thread, so it can be shared by a thread pool. Anything long-running should use utils.get_session() instead.
+
+Like requests, it sends requests through the proxies given by the http_proxy, https_proxy and no_proxy
+environment variables. urllib.request, which reads them, is only imported when one of them is set.
+"""
+import http.client
+import json
+import os
+import threading
+from urllib.parse import urlencode, urljoin, urlsplit
+
+# The number of redirects to follow before giving up, as requests does.
+MAX_REDIRECTS = 30
+
+DEFAULT_TIMEOUT = 60
+
+_REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+
+
+class HTTPError(IOError):
+    """
+    Raised by raise_for_status for 4xx and 5xx responses. Like requests.HTTPError it carries the response.
+    """
+
+    def __init__(self, message, response=None):
+        super().__init__(message)
+        self.response = response
+
+
+class SimpleResponse(object):
+
+    def __init__(self, url, response, stream):
+        self.url = url
+        self.status_code = response.status
+        self.reason = response.reason
+        self.headers = response.headers
+        self._response = response
+        self._content = None if stream else response.read()
+
+    @property
+    def content(self):
+        if self._content is None:
+            self._content = self._response.read()
+        return self._content
+
+    def json(self):
+        return json.loads(self.content)
+
+    def iter_content(self, chunk_size=1024 * 1024):
+        if self._content is not None:
+            yield self._content
+            return
+
+        while True:
+            chunk = self._response.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+    def raise_for_status(self):
+        if 400 <= self.status_code < 600:
+            raise HTTPError('%d %s for url: %s' % (self.status_code, self.reason, self.url), response=self)
+
+    def close(self):
+        # Read whatever is left of the body so the connection can be reused for the next request.
+        if self._content is None:
+            self._response.read()
+            self._content = b''
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def get_proxy(scheme, host):
+    """
+    Get the URL of the proxy to use for a host from the environment, or None to connect directly.
+    """
+    if not any(name.lower() in ('http_proxy', 'https_proxy', 'all_proxy') for name in os.environ):
+        return None
+
+    from urllib.request import getproxies, proxy_bypass
+
+    proxy = getproxies().get(scheme) or getproxies().get('all')
+    if not proxy or proxy_bypass(host):
+        return None
+    return proxy if '://' in proxy else 'http://' + proxy
+
+
+def _proxy_headers(proxy):
+    parts = urlsplit(proxy)
+    if parts.username is None:
+        return {}
+
+    import base64
+    from urllib.parse import unquote
+
+    credentials = '%s:%s' % (unquote(parts.username), unquote(parts.password or ''))
+    return {'Proxy-Authorization': 'Basic ' + base64.b64encode(credentials.encode('utf-8')).decode('ascii')}
+
+
+class SimpleSession(object):
+    """
+    Make GET requests with the standard library's http.client, keeping a connection open to each host.
+    """
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT):
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self, scheme, netloc):
+        """
+        Get this thread's connection for a host, and the headers each request on it needs for a proxy. Requests
+        sent to an HTTP proxy have the headers of its credentials, if it has any, and ask for the full URL.
+        """
+        connections = self._local.__dict__.setdefault('connections', {})
+        if (scheme, netloc) not in connections:
+            connection_class = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+            proxy = get_proxy(scheme, urlsplit('//' + netloc).hostname)
+            if proxy is None:
+                connection, proxy_headers = connection_class(netloc, timeout=self.timeout), None
+            else:
+                proxy_netloc = urlsplit(proxy).netloc.rpartition('@')[2]
+                connection = connection_class(proxy_netloc, timeout=self.timeout)
+                if scheme == 'https':
+                    # HTTPS goes through a tunnel which the proxy opens with CONNECT.
+                    connection.set_tunnel(netloc, headers=_proxy_headers(proxy))
+                    proxy_headers = None
+                else:
+                    proxy_headers = _proxy_headers(proxy)
+            connections[(scheme, netloc)] = (connection, proxy_headers)
+        return connections[(scheme, netloc)]
+
+    def _send(self, url, headers):
+        parts = urlsplit(url)
+        connection, proxy_headers = self._connection(parts.scheme, parts.netloc)
+        if proxy_headers is None:
+            path = (parts.path or '/') + ('?' + parts.query if parts.query else '')
+        else:
+            path = url
+            headers = dict(headers, **proxy_headers)
+        try:
+            connection.request('GET', path, headers=headers)
+            return connection.getresponse()
+        except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+            # The server closed a kept-alive connection, so try once more on a new one.
+            connection.close()
+            connection.request('GET', path, headers=headers)
+            return connection.getresponse()
+
+    def get(self, url, headers=None, params=None, stream=False, allow_redirects=True):
+        if params:
+            url += ('&' if urlsplit(url).query else '?') + urlencode(params)
+
+        for _ in range(MAX_REDIRECTS + 1):
+            response = self._send(url, headers or {})
+            if not allow_redirects or response.status not in _REDIRECT_STATUSES:
+                return SimpleResponse(url, response, stream)
+
+            response.read()
+            url = urljoin(url, response.getheader('Location'))
+
+        raise HTTPError('Exceeded %d redirects' % MAX_REDIRECTS)
+
+    def close(self):
+        for connection, _ in self._local.__dict__.get('connections', {}).values():
+            connection.close()
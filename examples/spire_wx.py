@@ -0,0 +1,229 @@
+"""
+A single command line entry point for the examples:
+
+    python spire_wx.py point --lat 49.6 --lon 6.1 --format ndjson --output forecast.ndjson
+    python spire_wx.py point --lat 49.6 --lon 6.1 --derive wind_speed,wind_direction,interval_precipitation
+    python spire_wx.py file --list --time_bundle short_range_high_freq
+    python spire_wx.py file --output_directory forecasts --workers 8
+    python spire_wx.py export <export id> --prefix exports
+    python spire_wx.py grib-extract sof-d.20190920.t00z.0p125.basic.global.f006.grib2 --lat 49.6 --lon 6.1
+
+Only the standard library modules needed to parse the arguments are imported up front. Each command imports
+what it uses when it runs, and the API key is only read once a command needs it, so --help works without one.
+The point and file commands make their requests with simple_http.SimpleSession rather than requests, which
+takes longer to import than a point request takes to make. That keeps them quick to start when they are run
+over and over, for example from cron or a shell loop.
+
+With --timing the time taken to start up (to the point where the command begins), to import the command's
+modules and to run the command is written to stderr.
+"""
+import argparse
+import os
+import sys
+import time
+
+_START = time.perf_counter()
+
+GRIB_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'working_with_grib_data')
+
+# The times at which each stage of the command finished, in order.
+_marks = [('start', _START)]
+
+
+def _mark(stage):
+    _marks.append((stage, time.perf_counter()))
+
+
+def _report_timing():
+    stages = ['%s %.1fms' % (stage, (end - start) * 1000) for (_, start), (stage, end) in zip(_marks, _marks[1:])]
+    print('timing: %s, total %.1fms' % (', '.join(stages), (_marks[-1][1] - _START) * 1000), file=sys.stderr)
+
+
+def _parse_floats(value):
+    return [float(part) for part in value.split(',')]
+
+
+def run_point(args):
+    from simple_http import SimpleSession
+    from utils import build_point_api_params, get_api_key, print_point_api_data, request_point_api_data
+    _mark('imports')
+
+    params = build_point_api_params(args.lat, args.lon, args.bundles, args.time_bundle, args.valid_time_interval,
+                                    args.issuance_time)
+    data = request_point_api_data(SimpleSession(), params, get_api_key())
+
+    names = list(data[0]['values']) if data else []
+    headers = ['issuance_time', 'valid_time'] + names
+    rows = ([entry['times']['issuance_time'], entry['times']['valid_time']] +
+            [entry['values'].get(name) for name in names] for entry in data)
+
+    if args.derive:
+        # NumPy is only needed to derive variables, so it's only imported then.
+        from derived_variables import forecast_evaluator
+        from point_columns import PointForecast
+
+        derived_names = args.derive.split(',')
+        derived = forecast_evaluator(PointForecast.from_data(data)).compute(derived_names)
+        headers += derived_names
+        rows = (row + list(values) for row, values in zip(rows, zip(*[derived[name].tolist()
+                                                                       for name in derived_names])))
+
+    print_point_api_data(headers, rows, args.format, args.output)
+
+
+def run_file(args):
+    from file_api_download_full_issuance import download_complete_issuance, get_file_list
+    from simple_http import SimpleSession
+    from utils import get_api_key
+    _mark('imports')
+
+    session = SimpleSession()
+    api_key = get_api_key()
+    if args.list:
+        for forecast in get_file_list(session, {'spire-api-key': api_key}, args.bundles, args.time_bundle):
+            print(forecast)
+    else:
+        download_complete_issuance(api_key, args.output_directory, args.workers, args.bundles, args.time_bundle,
+                                   session=session)
+
+
+def run_export(args):
+    from export_download import download_export
+    _mark('imports')
+
+    if download_export(args.export_id, args.prefix, args.parallelism):
+        sys.exit(1)
+
+
+def run_grib_extract(args):
+    sys.path.insert(0, GRIB_DIRECTORY)
+    names = set(args.variables.split(',')) if args.variables else None
+
+    if args.bbox:
+        import numpy as np
+        from grib_region import read_region
+        _mark('imports')
+
+        if len(args.filepaths) != 1:
+            raise Exception('--bbox reads a single file')
+        lats, lons, regions = read_region(args.filepaths[0], *_parse_floats(args.bbox), names=names)
+        for name, values in regions.items():
+            print('%s: %d x %d, min %.2f, max %.2f' % (name, values.shape[0], values.shape[1], np.nanmin(values),
+                                                        np.nanmax(values)))
+        if args.output:
+            np.savez(args.output, lat=lats, lon=lons, **regions)
+        return
+
+    from batch_point_extraction import extract_points_from_files, get_variable_names, read_points, write_points
+    from output_sinks import open_sink
+    _mark('imports')
+
+    if args.points:
+        lats, lons = read_points(args.points)
+    elif args.lat is not None and args.lon is not None:
+        lats, lons = [args.lat], [args.lon]
+    else:
+        raise Exception('Give --lat and --lon, --points or --bbox')
+
+    columns = ['file', 'latitude', 'longitude'] + get_variable_names(args.filepaths, names)
+    with open_sink(args.format, columns, args.output) as sink:
+        for filepath, variables, values in extract_points_from_files(args.filepaths, lats, lons, names):
+            write_points(sink, filepath, lats, lons, variables, values)
+
+
+def build_parser():
+    from output_sinks import add_output_arguments
+
+    parser = argparse.ArgumentParser(prog='spire_wx.py', description='Spire Weather API and GRIB file tools')
+    parser.add_argument('--timing', action='store_true',
+                        help='Write the start up, import and run times to stderr')
+    parser.add_argument('--metrics', action='store_true',
+                        help='Print a summary of the requests made when the command finishes')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    point = subparsers.add_parser('point', help='Print the forecast for a point from the Point API')
+    point.add_argument('--lat', type=float, required=True,
+                       help='The latitude of the point')
+    point.add_argument('--lon', type=float, required=True,
+                       help='The longitude of the point')
+    point.add_argument('--bundles', type=str,
+                       help='The data bundles to request (separate by commas)')
+    point.add_argument('--time_bundle', type=str,
+                       help='The time bundle to request')
+    point.add_argument('--valid_time_interval', type=str,
+                       help='Only return forecasts valid in this ISO 8601 interval')
+    point.add_argument('--issuance_time', type=str,
+                       help='The issuance to request rather than the latest')
+    point.add_argument('--derive', type=str,
+                       help='Variables to derive, such as wind_speed or gust_factor (separate by commas, see '
+                            'derived_variables.py)')
+    add_output_arguments(point, default='csv')
+    point.set_defaults(handler=run_point)
+
+    file = subparsers.add_parser('file', help='List or download the forecast files of the latest issuance')
+    file.add_argument('--bundles', type=str, default='basic',
+                      help='The data bundles of the files')
+    file.add_argument('--time_bundle', type=str, default='medium_range_std_freq',
+                      help='The time bundle of the files')
+    file.add_argument('--list', action='store_true',
+                      help='Only list the available files')
+    file.add_argument('--output_directory', type=str,
+                      help='The directory to download the files into')
+    file.add_argument('--workers', type=int, default=4,
+                      help='The number of files to download at once')
+    file.set_defaults(handler=run_file)
+
+    export = subparsers.add_parser('export', help='Download every file of a data export')
+    export.add_argument('export_id', type=str,
+                        help='The export id given to you by Spire')
+    export.add_argument('--prefix', type=str, default='.',
+                        help='The local path to download the files into')
+    export.add_argument('--parallelism', type=int, default=32,
+                        help='The maximum number of download workers')
+    export.set_defaults(handler=run_export)
+
+    grib_extract = subparsers.add_parser('grib-extract', help='Extract points or a bounding box from GRIB files')
+    grib_extract.add_argument('filepaths', type=str, nargs='+',
+                              help='The GRIB files to read')
+    grib_extract.add_argument('--lat', type=float,
+                              help='The latitude of a single point to extract')
+    grib_extract.add_argument('--lon', type=float,
+                              help='The longitude of a single point to extract')
+    grib_extract.add_argument('--points', type=str,
+                              help='A CSV file of points to extract, one "lat,lon" pair per line')
+    grib_extract.add_argument('--bbox', type=str,
+                              help='Read a bounding box given as lat_min,lat_max,lon_min,lon_max instead of points, '
+                                   'saving it to --output as a .npz file')
+    grib_extract.add_argument('-v', '--variables', type=str,
+                              help='The names of the variables to read, such as "2 metre temperature" '
+                                   '(separate by commas)')
+    add_output_arguments(grib_extract, default='csv')
+    grib_extract.set_defaults(handler=run_grib_extract)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    _mark('startup')
+
+    if args.metrics:
+        from instrumentation import MetricsCollector, add_hooks
+        metrics = MetricsCollector()
+        add_hooks(metrics)
+
+    try:
+        args.handler(args)
+    finally:
+        _mark('command')
+        if args.metrics:
+            for operation, summary in metrics.summary().items():
+                print('%s: %d requests, %d retries, p50 <= %ss, p99 <= %ss' % (
+                    operation, summary['requests'], summary['retries'], summary['p50_seconds'],
+                    summary['p99_seconds']), file=sys.stderr)
+        if args.timing:
+            _report_timing()
+
+
+if __name__ == '__main__':
+    main()
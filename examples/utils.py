@@ -1,10 +1,25 @@
 import os
+import sys
+import threading
+import time
+from collections import namedtuple
 from urllib.parse import urljoin
 
-import requests
-from tabulate import tabulate
+from instrumentation import record_retry, trace
+from rate_limit import DEFAULT_RETRIES, backoff_delay, get_limiter
 
-HOST = 'https://api.wx.spire.com'
+# The API host can be overridden, for example to use a local point server (see working_with_grib_data/point_server.py).
+HOST = os.getenv('spire-api-host', 'https://api.wx.spire.com')
+
+# The maximum number of keep-alive connections held open to the API host by the shared session.
+# This also bounds the number of point requests the batch fetcher will keep in flight at once.
+MAX_POOL_SIZE = 32
+
+# The result of a single point request made by the batch fetcher, including the time the request took.
+PointResult = namedtuple('PointResult', ['lat', 'lon', 'data', 'latency'])
+
+_session = None
+_session_lock = threading.Lock()
 
 
 def get_api_key():
@@ -15,15 +30,63 @@ def get_api_key():
     return api_key
 
 
-def get_point_api_response(lat, lon, bundles=None, time_bundle=None, valid_time_interval=None, issuance_time=None, api_key=get_api_key()):
+def get_session():
     """
-    Fetch the point forecast data.
+    Return the HTTP session shared by all API calls.
+
+    Reusing one session keeps connections to the API alive between requests so that we only pay for
+    the TLS handshake once per pooled connection rather than once per request.
     """
+    global _session
+    with _session_lock:
+        if _session is None:
+            # requests is imported here rather than at the top so commands that don't use it start quickly.
+            import requests
+            from requests.adapters import HTTPAdapter
 
-    print(f'Retrieving forecast for point ({lat},{lon})')
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=MAX_POOL_SIZE)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _session = session
 
-    # Build the URL, add the headers and query parameters.
-    url = urljoin(HOST, '/forecast/point')
+    return _session
+
+
+def get_expected_forecast_size(time_bundle):
+    if time_bundle == 'short_range_high_freq':
+        # The short range, high time frequency bundle contains data for 25 lead times (or steps)
+        # representing forecasts at 1 hour intervals from 0 to 24 hours.
+        return 25
+    elif time_bundle == 'medium_range_std_freq':
+        # The medium range, standard time frequency bundle contains data for 29 lead times (or steps)
+        # representing forecasts at six hour intervals from 0 to 168 hours.
+        return 29
+    elif time_bundle == 'medium_range_high_freq':
+        # The medium range, high time frequency bundle contains data for 49 lead times (or steps)
+        # representing forecasts at 1 hour intervals from 0 to 24 hours,
+        # as well as 6 hour intervals up to 168 hours.
+        return 49
+    else:
+        raise Exception('Unexpected time bundle', time_bundle)
+
+
+def get_issuance_interval(time_bundle):
+    """
+    Get the number of hours between issuances of a time bundle.
+    """
+    if 'medium_range' in time_bundle:
+        # Medium range forecasts are issued every 12 hours
+        return 12
+    else:
+        # Short range forecasts are issued every 6 hours
+        return 6
+
+
+def build_point_api_params(lat, lon, bundles=None, time_bundle=None, valid_time_interval=None, issuance_time=None):
+    """
+    Build the query parameters for a Point API request, leaving out any that have not been set.
+    """
     params = {'lat': lat, 'lon': lon}
 
     if bundles:
@@ -35,16 +98,158 @@ def get_point_api_response(lat, lon, bundles=None, time_bundle=None, valid_time_
     if issuance_time:
         params['issuance_time'] = issuance_time
 
+    return params
+
+
+def request_point_api_data(session, params, api_key, retries=DEFAULT_RETRIES, columnar=False):
+    """
+    Make a single Point API request on the given session and return the 'data' element.
+
+    The request waits for a slot from the shared limiter (see rate_limit.py). If the API is rate limiting us or
+    has a server error, the request is retried after the Retry-After delay or an exponential backoff.
+    If columnar is set, the response body is decoded straight into a PointForecast rather than a list of dicts.
+    """
+    url = urljoin(HOST, '/forecast/point')
     headers = {'spire-api-key': api_key}
-    response = requests.get(url, headers=headers, params=params)
+    for attempt in range(retries + 1):
+        with get_limiter().slot() as slot, trace('point', url) as request_trace:
+            response = session.get(url, headers=headers, params=params)
+            slot.record(response)
+            request_trace.status = response.status_code
+            request_trace.add_bytes(len(response.content))
+            if not slot.overloaded or attempt == retries:
+                if columnar:
+                    from point_columns import PointForecast
+
+                    return request_trace.decode_json(lambda: PointForecast.from_json(response.content))
+
+                json_response = request_trace.decode_json(response.json)
+                break
+
+        delay = slot.retry_after if slot.retry_after is not None else backoff_delay(attempt)
+        record_retry('point', url, attempt + 1, delay, response.status_code)
+        time.sleep(delay)
 
     # If there is no 'data' element then raise an error.
-    json_response = response.json()
     if 'data' not in json_response:
         raise Exception('Response did not contain a data element', json_response)
 
     return json_response['data']
 
 
-def print_point_api_data(headers, data):
-    print(tabulate(data, headers=headers))
+def _to_columnar(data):
+    from point_columns import PointForecast
+
+    return data if isinstance(data, PointForecast) else PointForecast.from_data(data)
+
+
+def get_point_api_response(lat, lon, bundles=None, time_bundle=None, valid_time_interval=None, issuance_time=None, api_key=None, cache=None, columnar=False, history=None):
+    """
+    Fetch the point forecast data.
+
+    If a PointCache is given, complete issuances are read from and saved to it rather than refetched.
+    If a PointHistory is given, fetched forecasts are added to it.
+    If columnar is set, the data is returned as a PointForecast rather than a list of dicts.
+    """
+    if api_key is None:
+        api_key = get_api_key()
+
+    data = None
+    if cache is not None:
+        data = cache.get(lat, lon, bundles, time_bundle, valid_time_interval, issuance_time)
+
+    if data is None:
+        # Progress goes to stderr so it doesn't mix with data written to standard output.
+        print(f'Retrieving forecast for point ({lat},{lon})', file=sys.stderr)
+
+        # The cache stores the response as JSON, so it needs the list of dicts.
+        params = build_point_api_params(lat, lon, bundles, time_bundle, valid_time_interval, issuance_time)
+        data = request_point_api_data(get_session(), params, api_key, columnar=columnar and cache is None)
+
+        if cache is not None:
+            cache.put(lat, lon, data, bundles, time_bundle, valid_time_interval, issuance_time)
+        if history is not None:
+            history.add(lat, lon, data)
+
+    return _to_columnar(data) if columnar else data
+
+
+def _timed_point_request(session, lat, lon, params, api_key, cache, columnar, history):
+    start = time.perf_counter()
+    data = request_point_api_data(session, params, api_key, columnar=columnar and cache is None)
+    latency = time.perf_counter() - start
+
+    if cache is not None:
+        cache.put(lat, lon, data, params.get('bundles'), params.get('time_bundle'),
+                  params.get('valid_time_interval'), params.get('issuance_time'))
+    if history is not None:
+        history.add(lat, lon, data)
+
+    return PointResult(lat, lon, _to_columnar(data) if columnar else data, latency)
+
+
+def get_point_api_responses(points, bundles=None, time_bundle=None, valid_time_interval=None, issuance_time=None,
+                            api_key=None, max_in_flight=8, cache=None, columnar=False, history=None):
+    """
+    Fetch the point forecast data for many (lat, lon) points.
+
+    Requests share the pooled session and at most max_in_flight of them run at once. A PointResult is
+    yielded for each point as soon as its request finishes, so results are not in the order of the input.
+    Once every point has been fetched the overall throughput is printed.
+
+    If a PointCache is given, cached points are yielded straight away with a latency of zero.
+    If columnar is set, each result's data is a PointForecast rather than a list of dicts.
+    If a PointHistory is given, fetched forecasts are added to it.
+    """
+    # concurrent.futures imports logging, which would slow down commands that only make a single request.
+    from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+    if api_key is None:
+        api_key = get_api_key()
+    max_in_flight = min(max_in_flight, MAX_POOL_SIZE)
+
+    session = get_session()
+    count = 0
+    start = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+        pending = set()
+        for lat, lon in points:
+            if cache is not None:
+                data = cache.get(lat, lon, bundles, time_bundle, valid_time_interval, issuance_time)
+                if data is not None:
+                    count += 1
+                    yield PointResult(lat, lon, _to_columnar(data) if columnar else data, 0.0)
+                    continue
+
+            # Wait for a request to finish before submitting more than max_in_flight of them.
+            if len(pending) >= max_in_flight:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    count += 1
+                    yield future.result()
+
+            params = build_point_api_params(lat, lon, bundles, time_bundle, valid_time_interval, issuance_time)
+            pending.add(pool.submit(_timed_point_request, session, lat, lon, params, api_key, cache, columnar,
+                                    history))
+
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                count += 1
+                yield future.result()
+
+    elapsed = time.perf_counter() - start
+    if count:
+        print(f'Retrieved forecasts for {count} points in {elapsed:.2f}s ({count / elapsed:.1f} points/s)',
+              file=sys.stderr)
+
+
+def print_point_api_data(headers, data, output_format='table', output=None):
+    """
+    Write rows of point data as a table, or in another of the output_sinks formats, to output or standard output.
+    """
+    from output_sinks import open_sink
+
+    with open_sink(output_format, headers, output) as sink:
+        sink.write_rows(data)
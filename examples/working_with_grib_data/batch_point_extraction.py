@@ -0,0 +1,140 @@
+"""
+Extract many points from GRIB files using PyGRIB
+
+Unlike get_data_from_grib_file_pygrib.py, which reads one point per call, this decodes each GRIB message
+once and interpolates it to every point at the same time. The bilinear interpolation weights are calculated
+once per grid and reused across messages and files, so extracting from a whole issuance costs one decode
+per message no matter how many points there are.
+
+https://github.com/jswhit/pygrib/
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+import pygrib
+
+import grib_index
+from grid_interpolation import PointInterpolator, grid_definition_from_message
+from grid_store import get_variable_key
+
+# The output sinks are shared with the Point API examples.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from output_sinks import add_output_arguments, open_sink
+
+
+def read_points(filepath):
+    """
+    Read latitude and longitude arrays from a CSV file with one "lat,lon" pair per line.
+    """
+    points = np.loadtxt(filepath, delimiter=',', ndmin=2)
+    return points[:, 0], points[:, 1]
+
+
+def message_values(msg):
+    """
+    Decode a message's values, with any missing values set to NaN.
+    """
+    values = msg.values
+    if np.ma.isMaskedArray(values):
+        values = values.astype(np.float64).filled(np.nan)
+
+    return values
+
+
+def extract_points(filepath, interpolator, names=None, seen=None):
+    """
+    Interpolate each message in a GRIB file to the interpolator's points.
+
+    Returns a list of variable keys (see grid_store.get_variable_key) and an array of shape (points, variables).
+    If names are given, only messages with those names are decoded. Pass the same seen dict for each file of
+    an issuance so that a variable has the same key in all of them.
+    """
+    if seen is None:
+        seen = {}
+    variables = []
+    columns = []
+
+    grib = pygrib.open(filepath)
+    for msg in grib:
+        if names and msg.name not in names:
+            continue
+
+        entry = {key: msg[key] for key in ('shortName', 'typeOfLevel', 'level')}
+        grid = grid_definition_from_message(msg)
+        variables.append(get_variable_key(entry, seen))
+        seen.setdefault(entry['shortName'], (entry['typeOfLevel'], entry['level']))
+        columns.append(interpolator.interpolate(grid, message_values(msg)))
+    grib.close()
+
+    if not columns:
+        return variables, np.empty((len(interpolator), 0))
+
+    return variables, np.column_stack(columns)
+
+
+def get_variable_names(filepaths, names=None):
+    """
+    The keys of the variables in any of the files, in the order they are first found, from the files' indexes
+    (see grib_index.py). If names are given, only those are included. Not every lead time has every variable,
+    so this gives a fixed set of columns for the output with the missing variables left as NaN.
+    """
+    variables = []
+    seen = {}
+    for filepath in filepaths:
+        for entry in grib_index.load_index(filepath):
+            if names and entry['name'] not in names:
+                continue
+
+            key = get_variable_key(entry, seen)
+            seen.setdefault(entry['shortName'], (entry['typeOfLevel'], entry['level']))
+            if key not in variables:
+                variables.append(key)
+
+    return variables
+
+
+def write_points(sink, filepath, lats, lons, variables, values):
+    """
+    Write the points extracted from a file to a sink opened with the columns file, latitude, longitude and the
+    keys from get_variable_names.
+    """
+    columns = dict(zip(variables, values.T))
+    columns.update(file=filepath, latitude=lats, longitude=lons)
+    sink.write_columns(columns)
+
+
+def extract_points_from_files(filepaths, lats, lons, names=None):
+    """
+    Extract the points from each of several GRIB files, such as all the lead times of an issuance.
+
+    Yields the file path, variable keys and (points, variables) array for each file.
+    The interpolation weights are shared between all of the files.
+    """
+    interpolator = PointInterpolator(lats, lons)
+    seen = {}
+    for filepath in filepaths:
+        variables, values = extract_points(filepath, interpolator, names, seen)
+        yield filepath, variables, values
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Extract many points from GRIB files using pygrib')
+    parser.add_argument('points_file', type=str,
+                        help='A CSV file of points, one "lat,lon" pair per line')
+    parser.add_argument('filepaths', type=str, nargs='+',
+                        help='The GRIB files to extract the points from')
+    parser.add_argument('-v', '--variables', type=str,
+                        help='The names of the variables to extract (separate by commas)')
+    add_output_arguments(parser, default='csv')
+
+    args = parser.parse_args()
+    lats, lons = read_points(args.points_file)
+    names = set(args.variables.split(',')) if args.variables else None
+
+    # Each file's points are written as a block as soon as the file has been read.
+    columns = ['file', 'latitude', 'longitude'] + get_variable_names(args.filepaths, names)
+    with open_sink(args.format, columns, args.output) as sink:
+        for filepath, variables, values in extract_points_from_files(args.filepaths, lats, lons, names):
+            write_points(sink, filepath, lats, lons, variables, values)
@@ -7,6 +7,8 @@ import argparse
 
 import pygrib
 
+import grib_index
+
 
 def print_variables_for_single_coordinate(filepath, lat, lon):
     """
@@ -22,11 +24,10 @@ def print_select_variables_for_single_coordinate(filepath, lat, lon):
     """
     Extract and print just temperature and precipitation variables from the GRIB file
     """
-    grib = pygrib.open(filepath)
-
     # Select only the 2-m temperature and precipitation messages.
-    temperature_message = grib.select(name='2 metre temperature')[0]
-    precipitation_message = grib.select(name='Total Precipitation')[0]
+    # The index lets us read just these two messages rather than scanning the whole file for each one.
+    temperature_message = grib_index.select(filepath, name='2 metre temperature')[0]
+    precipitation_message = grib_index.select(filepath, name='Total Precipitation')[0]
 
     point_temperature = temperature_message.data(lat1=lat, lat2=lat, lon1=lon, lon2=lon)[0][0][0]
     point_precipitation = precipitation_message.data(lat1=lat, lat2=lat, lon1=lon, lon2=lon)[0][0][0]
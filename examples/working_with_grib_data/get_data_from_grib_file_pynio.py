@@ -9,11 +9,15 @@ the chosen location is not one of the grid points from the forecast fields.
 """
 from __future__ import print_function
 import argparse
-import csv
+import os
 import sys
 
 import Nio
 
+# The output sinks are shared with the Point API examples.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from output_sinks import add_output_arguments, open_sink
+
 
 # The default set of fields to extract if none are provided on the command line.
 # The simplest way to get this list is to open the file and print the file object:
@@ -34,7 +38,7 @@ DEF_VARIABLES = (
     'APCP_P8_L1_GLL0_acc',  # accumulated precipitation amount
 )
 
-def process_file(filename, variables, lat, lon):
+def process_file(filename, variables, lat, lon, output_format='csv', output=None):
     # Use PyNio's extended selection to do the interpolation for us.
     # https://www.pyngl.ucar.edu/NioExtendedSelection.shtml
     # Here all variables are 2-D. If 3-D (or higher dimension) fields will be extracted
@@ -53,9 +57,8 @@ def process_file(filename, variables, lat, lon):
         data.append([name, value, units])
     nc.close()
 
-    writer = csv.writer(sys.stdout)
-    writer.writerow(('Variable', 'Value', 'Units'))
-    writer.writerows(data)
+    with open_sink(output_format, ['Variable', 'Value', 'Units'], output) as sink:
+        sink.write_rows(data)
 
 
 if __name__ == '__main__':
@@ -68,7 +71,8 @@ if __name__ == '__main__':
                         help='The latitude of the extraction point')
     parser.add_argument('longitude', type=float,
                         help='The longitude (0-360) of the extraction point')
+    add_output_arguments(parser, default='csv')
 
     args = parser.parse_args()
     variables = args.variables.split(',') if args.variables else DEF_VARIABLES
-    process_file(args.filename, variables, args.latitude, args.longitude)
+    process_file(args.filename, variables, args.latitude, args.longitude, args.format, args.output)
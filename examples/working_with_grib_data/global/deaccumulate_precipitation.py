@@ -0,0 +1,108 @@
+"""
+De-accumulate global precipitation from the GRIB files of an issuance
+
+Spire forecast files hold precipitation as the total since the start of the forecast. This reads the total from
+each lead time's file in turn and writes the precipitation over fixed windows, such as every 6 or 24 hours, as
+NumPy arrays. Only one lead time is read at a time, and only the total at the start of each window is kept, so
+memory use doesn't grow with the number of files.
+
+Missing lead times are allowed. Windows which start or end at a missing lead time are reported and skipped.
+
+    python deaccumulate_precipitation.py output sof-d.20190920.t00z.0p125.basic.global.f*.grib2 --windows 6,24
+
+For each window this writes precipitation_<window>h_f<end>.npy, with latitudes and longitudes in lat.npy and
+lon.npy.
+"""
+import argparse
+import os
+import re
+import sys
+
+import numpy as np
+import xarray as xr
+
+# The de-accumulation code is shared with the Point API examples.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from precipitation import WindowAccumulator
+
+DEF_VARIABLE = 'APCP_P8_L1_GLL0_acc'
+
+_LEAD_TIME = re.compile(r'\.f(\d+)\.')
+
+
+def get_lead_time(filepath):
+    match = _LEAD_TIME.search(os.path.basename(filepath))
+    if not match:
+        raise Exception('Could not find the lead time in the file name', filepath)
+
+    return int(match.group(1))
+
+
+def read_total(filepath, variable=DEF_VARIABLE):
+    """
+    Read the accumulated precipitation grid and its coordinates from a GRIB file.
+    """
+    ds = xr.open_dataset(filepath, engine='pynio')
+    try:
+        if variable not in ds:
+            # The first lead time of a forecast has no accumulation yet.
+            return None, ds['lat_0'].values, ds['lon_0'].values
+
+        return ds[variable].values, ds['lat_0'].values, ds['lon_0'].values
+    finally:
+        ds.close()
+
+
+def iter_windows(filepaths, windows, variable=DEF_VARIABLE):
+    """
+    Read the files in lead time order and yield (window, start, end, amounts, lats, lons) as each window ends.
+    The amounts are None for a window which can't be calculated because a lead time is missing.
+    """
+    accumulators = [WindowAccumulator(window) for window in windows]
+    for filepath in sorted(filepaths, key=get_lead_time):
+        lead_time = get_lead_time(filepath)
+        total, lats, lons = read_total(filepath, variable)
+        if total is None:
+            if lead_time:
+                raise Exception('%s does not contain %s' % (filepath, variable))
+            continue
+
+        for window, accumulator in zip(windows, accumulators):
+            for start, end, amounts in accumulator.add(lead_time, total):
+                yield window, start, end, amounts, lats, lons
+
+
+def deaccumulate_files(filepaths, output_directory, windows, variable=DEF_VARIABLE):
+    os.makedirs(output_directory, exist_ok=True)
+
+    coordinates_written = False
+    for window, start, end, amounts, lats, lons in iter_windows(filepaths, windows, variable):
+        if amounts is None:
+            print('Skipping %dh window %d-%dh: a lead time is missing' % (window, start, end))
+            continue
+
+        if not coordinates_written:
+            np.save(os.path.join(output_directory, 'lat.npy'), lats)
+            np.save(os.path.join(output_directory, 'lon.npy'), lons)
+            coordinates_written = True
+
+        output_path = os.path.join(output_directory, 'precipitation_%dh_f%03d.npy' % (window, end))
+        np.save(output_path, amounts.astype(np.float32))
+        print('%dh window %d-%dh: max %.2f, mean %.3f' % (window, start, end, np.nanmax(amounts),
+                                                          np.nanmean(amounts)))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Write precipitation over fixed windows from forecast totals')
+    parser.add_argument('output_directory', type=str,
+                        help='The directory to write the windows to')
+    parser.add_argument('filepaths', type=str, nargs='+',
+                        help='The GRIB files of every lead time of an issuance')
+    parser.add_argument('--windows', type=str, default='6,24',
+                        help='The window lengths in hours (separate by commas)')
+    parser.add_argument('--variable', type=str, default=DEF_VARIABLE,
+                        help='The name of the accumulated precipitation variable')
+
+    args = parser.parse_args()
+    deaccumulate_files(args.filepaths, args.output_directory, [int(w) for w in args.windows.split(',')],
+                       args.variable)
@@ -2,48 +2,152 @@
 Extract swell wave height from Maritime Waves GRIB messages
 
 This program extracts wave data from a GRIB file and writes it to a CSV
+
+Only the requested variables are read, a block of latitude rows at a time, and land (NaN) cells are dropped
+before anything is written, so the whole globe is never held in memory at once. Output can also be written as
+newline-delimited JSON, Parquet (which requires pyarrow) or a directory of .npy files (see output_sinks.py):
+    pip install pyarrow
+
+Several files, such as every lead time of an issuance, can be processed in parallel:
+
+    python get_global_swell_wave_height.py --jobs 4 sof-d.20190920.t00z.0p125.maritime-wave.global.f*.grib2
+
+Variables derived from the wave variables, such as swell_wave_power, can be added with --derive (see
+derived_variables.py). They are calculated for each block from the columns already read:
+
+    python get_global_swell_wave_height.py -v SWELL_P0_L101_GLL0,SWPER_P0_L101_GLL0 --derive swell_wave_power f006.grib2
 """
 import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
 import xarray as xr
 
-# DEF_VARIABLES = (
-#     'WVDIR_P0_L101_GLL0', # Direction of wind waves
-#     'WVHGT_P0_L101_GLL0', # Significant height of wind waves
-#     'WVPER_P0_L101_GLL0', # Mean period of wind waves
-#     'SWDIR_P0_L101_GLL0', # Direction of Swell Waves
-#     'SWELL_P0_L101_GLL0', # Significant height of swell waves
-#     'SWPER_P0_L101_GLL0', # Mean period of swell waves
-# )
-
-# Load and filter grib data to get global swell wave height
-def parse_data(filepath):
-    # Load the grib file into an xarray dataset
+# The derived variables and output sinks are shared with the Point API examples.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from derived_variables import VariableEvaluator
+from output_sinks import add_output_arguments, open_sink
+
+# The output column name for each of the Maritime Waves variables.
+VARIABLE_COLUMNS = {
+    'WVDIR_P0_L101_GLL0': 'wind_wave_direction',  # Direction of wind waves
+    'WVHGT_P0_L101_GLL0': 'wind_wave_height',     # Significant height of wind waves
+    'WVPER_P0_L101_GLL0': 'wind_wave_period',     # Mean period of wind waves
+    'SWDIR_P0_L101_GLL0': 'swell_direction',      # Direction of Swell Waves
+    'SWELL_P0_L101_GLL0': 'swell_height',         # Significant height of swell waves
+    'SWPER_P0_L101_GLL0': 'swell_period',         # Mean period of swell waves
+}
+
+DEF_VARIABLES = ('SWELL_P0_L101_GLL0',)
+
+# The number of latitude rows to read and write at a time.
+DEFAULT_BLOCK_ROWS = 64
+
+
+def get_columns(variables, derived=()):
+    return ['latitude', 'longitude'] + [VARIABLE_COLUMNS.get(name, name) for name in variables] + list(derived)
+
+
+def add_derived(block, columns, derived):
+    """
+    Add a column to a block for each derived variable, calculated from the block's columns.
+    """
+    evaluator = VariableEvaluator(lambda name: block[:, columns.index(name)], columns)
+    values = evaluator.compute(derived)
+    return np.column_stack([block] + [values[name] for name in derived])
+
+
+def iter_blocks(filepath, variables=DEF_VARIABLES, block_rows=DEFAULT_BLOCK_ROWS):
+    """
+    Yield blocks of rows from a GRIB file as 2-D arrays with the columns given by get_columns(variables).
+
+    Longitudes are mapped from (0 to 360) to (-180 to 180) and each latitude row is ordered from west to east.
+    Cells where every variable is missing, such as over land, are dropped.
+    """
+    # Load the grib file into an xarray dataset. The values are only read when they are accessed below.
     ds = xr.open_dataset(filepath, engine='pynio')
-    # Print information on data variables
-    # print(ds.keys())
-    # Convert the xarray dataset to a dataframe
-    df = ds.to_dataframe()
-    # Get longitude values from index
-    lons = df.index.get_level_values('lon_0')
-    # Define mapping of longitude range from (0 to 360) to (-180 to 180)
-    maplon = lambda lon: (lon - 360) if (lon > 180) else lon
-    # Create new longitude and latitude columns in the dataframe
-    df['longitude'] = lons.map(maplon)
-    df['latitude'] = df.index.get_level_values('lat_0')
-    # Rename the data field for clarity (see DEF_VARIABLES above)
-    df['swell_height'] = df['SWELL_P0_L101_GLL0']
-    # Trim the data to just the lat, lon, and swell_height columns
-    df_trim = df.loc[:, ['latitude','longitude','swell_height']]
-    return df_trim
+    try:
+        data_arrays = [ds[name] for name in variables]
+        lats = ds['lat_0'].values
+        lons = ds['lon_0'].values
+
+        # Map longitudes from (0 to 360) to (-180 to 180), and find the order which runs west to east.
+        lons = np.where(lons > 180, lons - 360, lons)
+        order = np.argsort(lons, kind='stable')
+        lons = lons[order]
+
+        for start in range(0, len(lats), block_rows):
+            stop = min(start + block_rows, len(lats))
+            values = np.stack([array[start:stop].values[:, order] for array in data_arrays])
+
+            keep = ~np.all(np.isnan(values), axis=0)
+            rows, columns = np.nonzero(keep)
+            if not len(rows):
+                continue
+
+            yield np.column_stack([lats[start:stop][rows], lons[columns]] + [v[keep] for v in values])
+    finally:
+        ds.close()
+
+
+def extract_file(filepath, output_path, variables=DEF_VARIABLES, output_format='csv', derived=()):
+    """
+    Extract variables, and any derived from them, from a GRIB file and stream them to output_path. Returns the
+    output path.
+    """
+    columns = get_columns(variables)
+    options = {'float_format': '%.6g'} if output_format == 'csv' else {}
+    with open_sink(output_format, get_columns(variables, derived), output_path, **options) as sink:
+        for block in iter_blocks(filepath, variables):
+            sink.write_block(add_derived(block, columns, derived) if derived else block)
+
+    return output_path
+
+
+def parse_data(filepath, variables=DEF_VARIABLES):
+    """
+    Load and filter grib data to get global swell wave height as a DataFrame.
+    """
+    import pandas as pd
+
+    blocks = list(iter_blocks(filepath, variables))
+    columns = get_columns(variables)
+    data = np.concatenate(blocks) if blocks else np.empty((0, len(columns)))
+    return pd.DataFrame(data, columns=columns)
+
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(
         description='Get global ocean wave height from a GRIB file'
     )
     parser.add_argument(
-        'filepath', type=str, help='The path to the Maritime Waves bundle GRIB file to open'
+        'filepaths', type=str, nargs='+', help='The path to the Maritime Waves bundle GRIB files to open'
+    )
+    parser.add_argument(
+        '-v', '--variables', type=str, help='The variables to extract (separate by commas)'
+    )
+    parser.add_argument(
+        '--derive', type=str, help='Variables to derive, such as swell_wave_power (separate by commas)'
+    )
+    # --output is only used when processing a single GRIB file, and defaults to global_swell_wave_height.<format>.
+    add_output_arguments(parser, default='csv')
+    parser.add_argument(
+        '--jobs', type=int, default=1, help='The number of files to process in parallel'
     )
     args = parser.parse_args()
-    data = parse_data(args.filepath)
-    # Write all of the columns to CSV, ignoring the index values
-    data.to_csv('global_swell_wave_height.csv', index=False)
+    variables = tuple(args.variables.split(',')) if args.variables else DEF_VARIABLES
+    derived_names = tuple(args.derive.split(',')) if args.derive else ()
+
+    if len(args.filepaths) == 1:
+        output_paths = [args.output or 'global_swell_wave_height.' + args.format]
+    else:
+        # Write each file's output next to it.
+        output_paths = ['%s.%s' % (os.path.splitext(filepath)[0], args.format) for filepath in args.filepaths]
+
+    with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        futures = [pool.submit(extract_file, filepath, output_path, variables, args.format, derived_names)
+                   for filepath, output_path in zip(args.filepaths, output_paths)]
+        for future in futures:
+            print(future.result())
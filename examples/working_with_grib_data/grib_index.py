@@ -0,0 +1,135 @@
+"""
+Index the messages in GRIB files for random access
+
+pygrib's select() reads every message in the file each time it is called. This builds a sidecar index,
+saved as JSON next to the GRIB file, which records the byte offset and length of each message along with
+its name, level and step. Readers can then seek straight to the messages they need.
+
+Build the indexes once after downloading the files:
+
+    python grib_index.py sof-d.20190920.t00z.0p125.basic.global.f*.grib2
+
+https://github.com/jswhit/pygrib/
+"""
+import argparse
+import json
+import os
+import struct
+
+import pygrib
+
+INDEX_SUFFIX = '.idx.json'
+
+# The message keys recorded in the index, which can be used to select messages.
+INDEX_KEYS = ('shortName', 'name', 'typeOfLevel', 'level', 'stepRange')
+
+
+def scan_messages(filepath):
+    """
+    Yield the byte offset and length of each message in a GRIB file by reading just the message headers.
+    """
+    with open(filepath, 'rb') as f:
+        offset = 0
+        while True:
+            f.seek(offset)
+            header = f.read(16)
+            if len(header) < 16:
+                return
+
+            if header[:4] != b'GRIB':
+                # Skip any padding between messages.
+                f.seek(offset)
+                chunk = f.read(1024 * 1024)
+                position = chunk.find(b'GRIB')
+                if position >= 0:
+                    offset += position
+                elif len(chunk) < 1024 * 1024:
+                    return
+                else:
+                    offset += len(chunk) - 3
+                continue
+
+            edition = header[7]
+            if edition == 2:
+                length = struct.unpack('>Q', header[8:16])[0]
+            else:
+                length = int.from_bytes(header[4:7], 'big')
+
+            yield offset, length
+            offset += length
+
+
+def get_index_path(filepath):
+    return filepath + INDEX_SUFFIX
+
+
+def build_index(filepath):
+    """
+    Build and save the index for a GRIB file, returning the list of index entries.
+    """
+    messages = []
+    with open(filepath, 'rb') as f:
+        for offset, length in scan_messages(filepath):
+            f.seek(offset)
+            # The whole message is read, but only its keys are looked up, so the data section is never decoded.
+            msg = pygrib.fromstring(f.read(length))
+            entry = {'offset': offset, 'length': length}
+            for key in INDEX_KEYS:
+                value = msg[key]
+                # Convert NumPy scalars so they can be saved as JSON.
+                entry[key] = value.item() if hasattr(value, 'item') else value
+            messages.append(entry)
+
+    stat = os.stat(filepath)
+    index = {'size': stat.st_size, 'mtime': stat.st_mtime, 'messages': messages}
+    with open(get_index_path(filepath), 'w') as f:
+        json.dump(index, f)
+
+    return messages
+
+
+def load_index(filepath):
+    """
+    Load the index for a GRIB file, building it first if it is missing or the file has changed.
+    """
+    try:
+        with open(get_index_path(filepath)) as f:
+            index = json.load(f)
+    except (IOError, ValueError):
+        return build_index(filepath)
+
+    stat = os.stat(filepath)
+    if index['size'] != stat.st_size or index['mtime'] != stat.st_mtime:
+        return build_index(filepath)
+
+    return index['messages']
+
+
+def read_message(f, entry):
+    """
+    Read and parse a single message from an open GRIB file.
+    """
+    f.seek(entry['offset'])
+    return pygrib.fromstring(f.read(entry['length']))
+
+
+def select(filepath, **criteria):
+    """
+    Return the messages in a GRIB file which match all of the criteria, like pygrib's select().
+    Only the matching messages are read from the file.
+    """
+    entries = [entry for entry in load_index(filepath)
+               if all(entry.get(key) == value for key, value in criteria.items())]
+
+    with open(filepath, 'rb') as f:
+        return [read_message(f, entry) for entry in entries]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build indexes of the messages in GRIB files')
+    parser.add_argument('filepaths', type=str, nargs='+',
+                        help='The GRIB files to index')
+
+    args = parser.parse_args()
+    for filepath in args.filepaths:
+        print('%s: %d messages' % (filepath, len(build_index(filepath))))
@@ -0,0 +1,298 @@
+"""
+Read a latitude/longitude bounding box from GRIB files without decoding whole global fields
+
+pygrib and PyNIO decode every value of a message even when only a small region is needed. GRIB2 messages
+which use simple packing store each value as a fixed number of bits, so the bits of any grid point can be
+found directly. For those messages this parses the section headers itself, seeks to the bytes holding each
+row of the region and unpacks only those. Messages with other packing, such as JPEG 2000 or complex packing,
+are decoded in full with pygrib and then cut down to the region.
+
+The messages to read are found with the sidecar index from grib_index.py. The result is a dense array for
+each variable with the latitudes and longitudes of its rows and columns:
+
+    python grib_region.py sof-d.20190920.t00z.0p125.basic.global.f006.grib2 --bbox 35,60,-15,30 --output europe.npz
+
+Longitudes can be given from -180 to 180 or 0 to 360. For a box which crosses the dateline give lon_min
+greater than lon_max, for example --bbox -50,0,160,-120.
+
+https://github.com/jswhit/pygrib/
+"""
+import argparse
+import struct
+import sys
+
+import numpy as np
+import pygrib
+
+import grib_index
+from batch_point_extraction import message_values
+from grid_interpolation import GridDefinition, grid_coordinates, grid_definition_from_message, region_indices
+from grid_store import get_variable_key
+
+# Scanning mode flags from GRIB2 code table 3.4.
+_I_NEGATIVE = 0x80
+_J_POSITIVE = 0x40
+_J_CONSECUTIVE = 0x20
+
+
+def _signed(data):
+    """
+    Decode a GRIB2 sign and magnitude integer.
+    """
+    value = int.from_bytes(data, 'big')
+    sign_bit = 1 << (len(data) * 8 - 1)
+    return -(value & ~sign_bit) if value & sign_bit else value
+
+
+# Bitmap indicators from GRIB2 code table 6.0. Values from 1 to 253 are predefined bitmaps, which aren't supported.
+BITMAP_PRESENT = 0
+BITMAP_PREVIOUS = 254
+BITMAP_NONE = 255
+
+
+def _section_positions(f, offset, length):
+    """
+    Yield the number, file offset and length of the body of each section of a GRIB2 message after section 0.
+    """
+    position = offset + 16
+    end = offset + length - 4
+    while position < end:
+        f.seek(position)
+        section_length, number = struct.unpack('>IB', f.read(5))
+        yield number, position + 5, section_length - 5
+        position += section_length
+
+
+def read_sections(f, offset, length):
+    """
+    Read the sections of a GRIB2 message, except for the data section, without decoding anything.
+
+    Returns a dict of section number to the section's bytes. For the data section (7) the file offset and
+    length of the packed data are given instead. If a later field of the message reuses the previous bitmap,
+    the bitmap section which defined it is kept.
+    """
+    sections = {}
+    for number, body_offset, body_length in _section_positions(f, offset, length):
+        if number == 7:
+            sections[7] = (body_offset, body_length)
+            continue
+
+        f.seek(body_offset)
+        body = f.read(body_length)
+        if not (number == 6 and body[0] == BITMAP_PREVIOUS and 6 in sections):
+            sections[number] = body
+
+    return sections
+
+
+def previous_bitmap(f, entry):
+    """
+    Find the bitmap section for a message whose bitmap indicator is 254, meaning it uses the bitmap most recently
+    defined in the file. The earlier messages are found with the file's index (see grib_index.py).
+    """
+    earlier = [other for other in grib_index.load_index(f.name) if other['offset'] < entry['offset']]
+    for other in reversed(earlier):
+        f.seek(other['offset'] + 7)
+        if f.read(1)[0] != 2:
+            continue
+
+        bitmaps = []
+        for number, body_offset, body_length in _section_positions(f, other['offset'], other['length']):
+            if number == 6:
+                f.seek(body_offset)
+                if f.read(1)[0] == BITMAP_PRESENT:
+                    bitmaps.append((body_offset, body_length))
+        if bitmaps:
+            body_offset, body_length = bitmaps[-1]
+            f.seek(body_offset)
+            return f.read(body_length)
+
+    raise Exception('The message at offset %d of %s uses a previously defined bitmap, but no earlier message '
+                    'defines one' % (entry['offset'], f.name))
+
+
+def parse_grid(section3):
+    """
+    Read a regular latitude/longitude grid from grid definition template 3.0, or None for any other grid.
+    """
+    template = struct.unpack('>H', section3[7:9])[0]
+    if template != 0:
+        return None
+
+    nlon, nlat = struct.unpack('>II', section3[25:33])
+    scanning_mode = section3[66]
+    if scanning_mode & _J_CONSECUTIVE:
+        return None
+
+    # Angles are in millionths of a degree, and the increments are unsigned with the direction in the scanning mode.
+    lat_first = _signed(section3[41:45]) / 1e6
+    lon_first = _signed(section3[45:49]) / 1e6
+    lon_step, lat_step = (value / 1e6 for value in struct.unpack('>II', section3[58:66]))
+    if not scanning_mode & _J_POSITIVE:
+        lat_step = -lat_step
+    if scanning_mode & _I_NEGATIVE:
+        lon_step = -lon_step
+
+    return GridDefinition(lat_first, lon_first, lat_step, lon_step, nlat, nlon)
+
+
+def parse_simple_packing(section5):
+    """
+    Read the reference value, binary and decimal scale factors and bits per value from data representation
+    template 5.0, or None for any other packing.
+    """
+    template = struct.unpack('>H', section5[4:6])[0]
+    if template != 0:
+        return None
+
+    reference = struct.unpack('>f', section5[6:10])[0]
+    binary_scale = _signed(section5[10:12])
+    decimal_scale = _signed(section5[12:14])
+    return reference, binary_scale, decimal_scale, section5[14]
+
+
+def _unpack(f, data_offset, indices, bits):
+    """
+    Read the packed integers at increasing positions in the data section, reading only the bytes which span them.
+    """
+    first_bit = int(indices[0]) * bits
+    last_bit = (int(indices[-1]) + 1) * bits
+    f.seek(data_offset + first_bit // 8)
+    chunk = np.frombuffer(f.read((last_bit + 7) // 8 - first_bit // 8), dtype=np.uint8)
+
+    # Pick out each value's bits and combine them, most significant first.
+    positions = (indices - indices[0]) * bits + first_bit % 8
+    value_bits = np.unpackbits(chunk)[positions[:, None] + np.arange(bits)]
+    return value_bits.astype(np.uint64) @ (np.uint64(1) << np.arange(bits - 1, -1, -1, dtype=np.uint64))
+
+
+def _split_runs(columns):
+    """
+    Split an array of column numbers into runs of consecutive columns.
+    """
+    return np.split(columns, np.flatnonzero(np.diff(columns) != 1) + 1)
+
+
+def read_simple_packed_region(f, sections, grid, rows, columns):
+    """
+    Unpack just the grid points at the given rows and columns of a message which uses simple packing.
+    """
+    reference, binary_scale, decimal_scale, bits = parse_simple_packing(sections[5])
+    data_offset, _ = sections[7]
+    if not len(rows) or not len(columns):
+        return np.empty((len(rows), len(columns)))
+
+    # With a bitmap, only the grid points whose bit is set have packed values, so each grid point's position in
+    # the packed data is the number of set bits before it.
+    bitmap = None
+    if sections[6][0] == BITMAP_PRESENT:
+        present = np.unpackbits(np.frombuffer(sections[6], dtype=np.uint8, offset=1))[:grid.nlat * grid.nlon]
+        bitmap = np.cumsum(present, dtype=np.int64) - 1
+        bitmap[present == 0] = -1
+
+    packed = np.full((len(rows), len(columns)), np.nan)
+    if bits == 0:
+        packed[:] = 0
+    else:
+        position = 0
+        for run in _split_runs(columns):
+            for i, row in enumerate(rows):
+                indices = row * grid.nlon + run
+                if bitmap is not None:
+                    indices = bitmap[indices]
+                    valid = indices >= 0
+                    if valid.any():
+                        packed[i, position + np.flatnonzero(valid)] = _unpack(f, data_offset, indices[valid], bits)
+                else:
+                    packed[i, position:position + len(run)] = _unpack(f, data_offset, indices, bits)
+            position += len(run)
+
+    values = (reference + packed * 2.0 ** binary_scale) / 10.0 ** decimal_scale
+    if bitmap is not None and bits == 0:
+        values[bitmap[rows[:, None] * grid.nlon + columns[None, :]] < 0] = np.nan
+
+    return values
+
+
+def read_message_region(f, entry, lat_min, lat_max, lon_min, lon_max):
+    """
+    Read the bounding box from one message. Returns (latitudes, longitudes, values, partially decoded).
+    """
+    f.seek(entry['offset'] + 7)
+    partial = f.read(1)[0] == 2
+    if partial:
+        sections = read_sections(f, entry['offset'], entry['length'])
+        grid = parse_grid(sections[3])
+        partial = grid is not None and parse_simple_packing(sections[5]) is not None
+
+    if partial:
+        indicator = sections[6][0]
+        if indicator == BITMAP_PREVIOUS:
+            sections[6] = previous_bitmap(f, entry)
+        elif indicator not in (BITMAP_PRESENT, BITMAP_NONE):
+            raise Exception('The message at offset %d of %s uses predefined bitmap %d, which isn\'t supported'
+                            % (entry['offset'], f.name, indicator))
+
+    if not partial:
+        msg = grib_index.read_message(f, entry)
+        grid = grid_definition_from_message(msg)
+
+    rows, columns = region_indices(grid, lat_min, lat_max, lon_min, lon_max)
+    if partial:
+        values = read_simple_packed_region(f, sections, grid, rows, columns)
+    else:
+        values = message_values(msg).reshape(grid.nlat, grid.nlon)[rows[:, None], columns[None, :]]
+
+    lats, lons = grid_coordinates(grid)
+    return lats[rows], (lons[columns] + 180.0) % 360.0 - 180.0, values, partial
+
+
+def read_region(filepath, lat_min, lat_max, lon_min, lon_max, names=None):
+    """
+    Read a bounding box from every message in a GRIB file, or only those with the given names (such as
+    "2 metre temperature"), which select messages as batch_point_extraction.py does. The arrays are keyed by
+    short name as in grid_store.py.
+
+    Returns the latitudes, the longitudes (from -180 to 180) and a dict of variable name to a 2-D array of values.
+    """
+    lats = lons = None
+    regions = {}
+    partial_count = 0
+    seen = {}
+    with open(filepath, 'rb') as f:
+        for entry in grib_index.load_index(filepath):
+            if names and entry['name'] not in names:
+                continue
+
+            key = get_variable_key(entry, seen)
+            seen.setdefault(entry['shortName'], (entry['typeOfLevel'], entry['level']))
+
+            lats, lons, regions[key], partial = read_message_region(f, entry, lat_min, lat_max, lon_min, lon_max)
+            partial_count += partial
+
+    print('Read %d messages, %d without decoding the whole field' % (len(regions), partial_count), file=sys.stderr)
+    return lats, lons, regions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Read a bounding box from a GRIB file')
+    parser.add_argument('filepath', type=str,
+                        help='The path to the file to open')
+    parser.add_argument('--bbox', type=str, required=True,
+                        help='The bounding box as lat_min,lat_max,lon_min,lon_max')
+    parser.add_argument('-v', '--variables', type=str,
+                        help='The names of the variables to read (separate by commas)')
+    parser.add_argument('--output', type=str,
+                        help='Save the region to a .npz file with lat, lon and an array for each variable')
+
+    args = parser.parse_args()
+    bbox = [float(value) for value in args.bbox.split(',')]
+    names = set(args.variables.split(',')) if args.variables else None
+    region_lats, region_lons, region_values = read_region(args.filepath, *bbox, names=names)
+
+    for name, values in region_values.items():
+        print('%s: %d x %d, min %.2f, max %.2f' % (name, values.shape[0], values.shape[1], np.nanmin(values),
+                                                    np.nanmax(values)))
+
+    if args.output:
+        np.savez(args.output, lat=region_lats, lon=region_lons, **region_values)
@@ -0,0 +1,144 @@
+"""
+Bilinear interpolation of regular latitude/longitude grids to many points at once.
+
+The indices and weights of the four grid points surrounding each extraction point only depend on the grid
+definition, so they are calculated once and reused for every field on the same grid.
+"""
+from collections import namedtuple
+
+import numpy as np
+
+# A regular latitude/longitude grid. The increments are negative if the grid runs north to south
+# or east to west, and values are stored in rows of constant latitude.
+GridDefinition = namedtuple('GridDefinition', ['lat_first', 'lon_first', 'lat_step', 'lon_step', 'nlat', 'nlon'])
+
+
+def grid_definition_from_message(msg):
+    """
+    Read the grid definition of a pygrib message on a regular latitude/longitude grid.
+    """
+    if msg['gridType'] != 'regular_ll':
+        raise Exception('Only regular latitude/longitude grids are supported', msg['gridType'])
+
+    lat_step = msg['jDirectionIncrementInDegrees']
+    lon_step = msg['iDirectionIncrementInDegrees']
+    if not msg['jScansPositively']:
+        lat_step = -lat_step
+    if msg['iScansNegatively']:
+        lon_step = -lon_step
+
+    return GridDefinition(msg['latitudeOfFirstGridPointInDegrees'], msg['longitudeOfFirstGridPointInDegrees'],
+                          lat_step, lon_step, msg['Nj'], msg['Ni'])
+
+
+def grid_coordinates(grid):
+    """
+    Return the 1-D arrays of latitudes and longitudes of the grid's rows and columns.
+    """
+    lats = grid.lat_first + grid.lat_step * np.arange(grid.nlat)
+    lons = grid.lon_first + grid.lon_step * np.arange(grid.nlon)
+    return lats, lons
+
+
+def region_indices(grid, lat_min, lat_max, lon_min, lon_max):
+    """
+    Find the rows and columns of the grid within a bounding box.
+
+    Longitudes can be given in either the -180 to 180 or the 0 to 360 convention, and a box which crosses
+    the dateline can be given with lon_min greater than lon_max. The columns are ordered eastwards from lon_min,
+    so a box crossing the dateline comes out as one contiguous region.
+    """
+    lats, lons = grid_coordinates(grid)
+    rows = np.flatnonzero((lats >= lat_min) & (lats <= lat_max))
+
+    # Measure longitudes eastwards from lon_min so that boxes crossing the dateline are contiguous.
+    width = (lon_max - lon_min) % 360.0 or 360.0
+    offsets = (lons - lon_min) % 360.0
+    columns = np.flatnonzero(offsets <= width)
+    columns = columns[np.argsort(offsets[columns], kind='stable')]
+
+    return rows, columns
+
+
+def is_global(grid):
+    """
+    Check whether the grid wraps all the way around in longitude.
+    """
+    return abs(abs(grid.lon_step) * grid.nlon - 360.0) < 1e-6
+
+
+def bilinear_weights(grid, lats, lons):
+    """
+    Calculate the flat indices and weights of the four grid points surrounding each point.
+
+    Returns two arrays of shape (4, N). Points outside the grid get NaN weights, so their
+    interpolated values are NaN.
+    """
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+
+    # Fractional row and column of each point. Longitudes are measured from the first column
+    # so that points given in either -180 to 180 or 0 to 360 land in the right place.
+    y = (lats - grid.lat_first) / grid.lat_step
+    x = (((lons - grid.lon_first) * np.sign(grid.lon_step)) % 360.0) / abs(grid.lon_step)
+
+    y0 = np.floor(y).astype(np.int64)
+    x0 = np.floor(x).astype(np.int64)
+    dy = y - y0
+    dx = x - x0
+
+    # Points on the last row or column use it as the lower corner with a weight of one.
+    on_last_row = y0 == grid.nlat - 1
+    y0[on_last_row] -= 1
+    dy[on_last_row] = 1.0
+
+    y1 = y0 + 1
+    x1 = x0 + 1
+    if is_global(grid):
+        x1 %= grid.nlon
+    else:
+        on_last_column = x0 == grid.nlon - 1
+        x0[on_last_column] -= 1
+        x1[on_last_column] -= 1
+        dx[on_last_column] = 1.0
+
+    outside = (y0 < 0) | (y1 >= grid.nlat) | (x0 < 0) | (x1 >= grid.nlon)
+
+    indices = np.stack([y0 * grid.nlon + x0, y0 * grid.nlon + x1, y1 * grid.nlon + x0, y1 * grid.nlon + x1])
+    weights = np.stack([(1 - dy) * (1 - dx), (1 - dy) * dx, dy * (1 - dx), dy * dx])
+
+    indices[:, outside] = 0
+    weights[:, outside] = np.nan
+    return indices, weights
+
+
+def interpolate(field, indices, weights):
+    """
+    Interpolate a 2-D field to points using indices and weights from bilinear_weights.
+    """
+    corners = np.asarray(field).ravel()[indices]
+    return np.einsum('ij,ij->j', corners, weights)
+
+
+class PointInterpolator(object):
+    """
+    Interpolates fields to a fixed set of points, caching the weights for each grid definition it sees.
+    """
+
+    def __init__(self, lats, lons):
+        self.lats = np.asarray(lats, dtype=np.float64)
+        self.lons = np.asarray(lons, dtype=np.float64)
+        self._weights = {}
+
+    def __len__(self):
+        return len(self.lats)
+
+    def weights(self, grid):
+        if grid not in self._weights:
+            self._weights[grid] = bilinear_weights(grid, self.lats, self.lons)
+
+        return self._weights[grid]
+
+    def interpolate(self, grid, field):
+        indices, weights = self.weights(grid)
+        return interpolate(field, indices, weights)
@@ -0,0 +1,270 @@
+"""
+Convert a downloaded issuance of GRIB files into a memory-mapped array store
+
+Decoding GRIB is expensive, so rather than reopening the GRIB files for every lookup this converts all of
+the lead times and variables of an issuance into raw arrays on disk once. Each variable is stored in its own
+file, split into spatial tiles with every lead time of a tile stored together. Readers map the files with
+np.memmap, so a point lookup only touches the pages of the tiles around the point, and the pages are shared
+between every process reading the store.
+
+The store is a directory containing:
+
+    header.json    the grid definition, tile size, lead times, variables, bundles and time bundle
+    <name>.npy     float32 values for each variable, laid out as (tile row, tile column, step, row, column)
+
+The bundles are taken from the file names. The time bundle can't be, so it is only recorded if it is given:
+
+    python grid_store.py store_directory sof-d.20190920.t00z.0p125.basic.global.f*.grib2 \
+        --time_bundle medium_range_std_freq
+"""
+import argparse
+import json
+import os
+import re
+
+import numpy as np
+import pygrib
+
+import grib_index
+from grid_interpolation import (GridDefinition, bilinear_weights, grid_coordinates, grid_definition_from_message,
+                                region_indices)
+
+HEADER_FILENAME = 'header.json'
+
+# The number of grid rows and columns in each tile.
+DEFAULT_TILE_SIZE = (64, 64)
+
+DTYPE = np.float32
+
+_LEAD_TIME = re.compile(r'\.f(\d+)\.')
+_BUNDLE = re.compile(r'\.\d+p\d+\.([^.]+)\.[^.]+\.f\d+\.')
+
+# The Point API name for each GRIB short name. Variables not listed here are returned by their short name.
+POINT_API_NAMES = {
+    '2t': 'air_temperature',
+    '2d': 'dew_point_temperature',
+    '2r': 'relative_humidity',
+    '10u': 'eastward_wind',
+    '10v': 'northward_wind',
+    'gust': 'wind_gust',
+    'i10fg': 'wind_gust',
+    'prmsl': 'air_pressure_at_sea_level',
+    'tp': 'precipitation_amount',
+}
+
+
+def get_lead_time(filepath):
+    """
+    Get the lead time in hours from a Spire forecast file name, such as sof-d.20190920.t00z.0p125.basic.global.f006.grib2
+    """
+    match = _LEAD_TIME.search(os.path.basename(filepath))
+    if not match:
+        raise Exception('Could not find the lead time in the file name', filepath)
+
+    return int(match.group(1))
+
+
+def get_bundle(filepath):
+    """
+    Get the data bundle from a Spire forecast file name, or None if the name doesn't include one.
+    """
+    match = _BUNDLE.search(os.path.basename(filepath))
+    return match.group(1) if match else None
+
+
+def get_variable_key(entry, seen):
+    """
+    Name a variable by its short name, adding the level if another variable already has that short name.
+    """
+    key = entry['shortName']
+    if key in seen and seen[key] != (entry['typeOfLevel'], entry['level']):
+        key = '%s_%s%s' % (key, entry['typeOfLevel'], entry['level'])
+
+    return key
+
+
+def _tile_shape(grid, tile_size):
+    tile_rows = -(-grid.nlat // tile_size[0])
+    tile_columns = -(-grid.nlon // tile_size[1])
+    return tile_rows, tile_columns
+
+
+def convert_issuance(filepaths, output_directory, names=None, tile_size=DEFAULT_TILE_SIZE, time_bundle=None):
+    """
+    Convert the GRIB files of an issuance into a store in output_directory.
+
+    If names are given, only the variables whose GRIB names are in the list are converted.
+    Variables that are missing from some lead times are filled with NaN for those steps.
+    The time bundle of the files, if given, is recorded in the header along with their bundles.
+    """
+    filepaths = sorted(filepaths, key=get_lead_time)
+    os.makedirs(output_directory, exist_ok=True)
+
+    # Use the indexes to find every variable in the issuance without decoding any data.
+    variables = {}
+    levels = {}
+    for filepath in filepaths:
+        for entry in grib_index.load_index(filepath):
+            if names and entry['name'] not in names:
+                continue
+            key = get_variable_key(entry, levels)
+            levels.setdefault(entry['shortName'], (entry['typeOfLevel'], entry['level']))
+            variables.setdefault(key, {'name': entry['name'], 'typeOfLevel': entry['typeOfLevel'],
+                                       'level': entry['level']})
+
+    grid = None
+    arrays = {}
+    valid_times = []
+    issuance_time = None
+    for step, filepath in enumerate(filepaths):
+        grib = pygrib.open(filepath)
+        valid_time = None
+        for msg in grib:
+            entry = {key: msg[key] for key in ('shortName', 'typeOfLevel', 'level')}
+            key = get_variable_key(entry, levels)
+            if key not in variables:
+                continue
+
+            if grid is None:
+                grid = grid_definition_from_message(msg)
+                tile_rows, tile_columns = _tile_shape(grid, tile_size)
+                issuance_time = msg.analDate.isoformat()
+                for name in variables:
+                    arrays[name] = np.lib.format.open_memmap(
+                        os.path.join(output_directory, name + '.npy'), mode='w+', dtype=DTYPE,
+                        shape=(tile_rows, tile_columns, len(filepaths), tile_size[0], tile_size[1])
+                    )
+                    arrays[name][:] = np.nan
+            elif grid_definition_from_message(msg) != grid:
+                raise Exception('All messages in the issuance must be on the same grid', filepath, msg.name)
+
+            values = msg.values
+            if np.ma.isMaskedArray(values):
+                values = values.filled(np.nan)
+
+            # Pad the field out to a whole number of tiles and split it into tiles.
+            padded = np.full((tile_rows * tile_size[0], tile_columns * tile_size[1]), np.nan, dtype=DTYPE)
+            padded[:grid.nlat, :grid.nlon] = values
+            tiles = padded.reshape(tile_rows, tile_size[0], tile_columns, tile_size[1]).transpose(0, 2, 1, 3)
+            arrays[key][:, :, step] = tiles
+            valid_time = msg.validDate.isoformat()
+        grib.close()
+
+        valid_times.append(valid_time)
+
+    if grid is None:
+        raise Exception('No variables were found to convert')
+
+    for array in arrays.values():
+        array.flush()
+
+    header = {
+        'grid': grid._asdict(),
+        'tile_size': list(tile_size),
+        'issuance_time': issuance_time,
+        'lead_times': [get_lead_time(filepath) for filepath in filepaths],
+        'valid_times': valid_times,
+        'variables': variables,
+        'bundles': sorted({get_bundle(filepath) for filepath in filepaths} - {None}),
+        'time_bundle': time_bundle,
+    }
+    with open(os.path.join(output_directory, HEADER_FILENAME), 'w') as f:
+        json.dump(header, f, indent=1)
+
+    return header
+
+
+class GridStore(object):
+    """
+    Read point time series and regions from a store created by convert_issuance.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, HEADER_FILENAME)) as f:
+            self.header = json.load(f)
+
+        self.grid = GridDefinition(**self.header['grid'])
+        self.tile_size = tuple(self.header['tile_size'])
+        self.variables = self.header['variables']
+        self.lead_times = self.header['lead_times']
+        self.valid_times = self.header['valid_times']
+        self.issuance_time = self.header['issuance_time']
+        # Stores converted before these were recorded don't know their bundles or time bundle.
+        self.bundles = self.header.get('bundles', [])
+        self.time_bundle = self.header.get('time_bundle')
+        self._arrays = {}
+
+    def array(self, name):
+        """
+        Return the memory-mapped array for a variable.
+        """
+        if name not in self._arrays:
+            if name not in self.variables:
+                raise KeyError('Unknown variable', name)
+            self._arrays[name] = np.load(os.path.join(self.directory, name + '.npy'), mmap_mode='r')
+
+        return self._arrays[name]
+
+    def _gather(self, name, rows, columns):
+        """
+        Read the values at grid rows and columns for every step. The result has the shape of rows and
+        columns broadcast together, followed by a dimension for the steps.
+        """
+        tile_rows, tile_columns = self.tile_size
+        return self.array(name)[rows // tile_rows, columns // tile_columns, :, rows % tile_rows, columns % tile_columns]
+
+    def weights(self, lats, lons):
+        """
+        Calculate the interpolation weights for points, which can be reused across calls to points().
+        """
+        return bilinear_weights(self.grid, np.atleast_1d(lats), np.atleast_1d(lons))
+
+    def points(self, name, lats, lons, weights=None):
+        """
+        Interpolate a variable to points, returning an array of shape (points, steps).
+        """
+        indices, weights = weights or self.weights(lats, lons)
+        rows, columns = np.divmod(indices, self.grid.nlon)
+        corners = self._gather(name, rows, columns)
+        return np.einsum('ijk,ij->jk', corners, weights)
+
+    def point(self, name, lat, lon):
+        """
+        Interpolate a variable to a single point, returning an array of values for each step.
+        """
+        return self.points(name, [lat], [lon])[0]
+
+    def region(self, name, lat_min, lat_max, lon_min, lon_max):
+        """
+        Read the grid points of a variable within a bounding box.
+
+        Longitudes can be given in either the -180 to 180 or the 0 to 360 convention, and a box which crosses
+        the dateline can be given with lon_min greater than lon_max. Returns the latitudes, the longitudes
+        (from -180 to 180) and an array of values with the shape (steps, latitudes, longitudes).
+        """
+        lats, lons = grid_coordinates(self.grid)
+        rows, columns = region_indices(self.grid, lat_min, lat_max, lon_min, lon_max)
+
+        values = self._gather(name, rows[:, None], columns[None, :])
+        return lats[rows], (lons[columns] + 180.0) % 360.0 - 180.0, values.transpose(2, 0, 1)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Convert the GRIB files of an issuance into a memory-mapped store')
+    parser.add_argument('output_directory', type=str,
+                        help='The directory to write the store to')
+    parser.add_argument('filepaths', type=str, nargs='+',
+                        help='The GRIB files of the issuance')
+    parser.add_argument('-v', '--variables', type=str,
+                        help='The names of the variables to convert (separate by commas)')
+    parser.add_argument('--tile_size', type=int, default=DEFAULT_TILE_SIZE[0],
+                        help='The number of rows and columns in each tile')
+    parser.add_argument('--time_bundle', type=str,
+                        help='The time bundle of the files, such as medium_range_std_freq')
+
+    args = parser.parse_args()
+    names = set(args.variables.split(',')) if args.variables else None
+    header = convert_issuance(args.filepaths, args.output_directory, names, (args.tile_size, args.tile_size),
+                              args.time_bundle)
+    print('Converted %d variables at %d lead times' % (len(header['variables']), len(header['lead_times'])))
@@ -0,0 +1,386 @@
+"""
+Process every lead time of an issuance in parallel
+
+The other GRIB examples each handle one file. This runs a chain of stages over all of the files of an issuance,
+such as a directory written by file_api_download_full_issuance.py, with the files spread over a pool of worker
+processes. Each worker runs every stage on a file and returns its (usually much smaller) result, and the
+results are put back in lead time order before they are written out, so the output is the same whatever
+order the workers finish in.
+
+The stages are:
+
+    SelectVariables(names)                 keep only these variables, by short name, store key (see grid_store.py)
+                                           or Point API name
+    ExtractRegion(lat_min, lat_max, lon_min, lon_max)
+                                           cut out a bounding box, unpacking only its values where the packing
+                                           allows (see grib_region.py)
+    ExtractPoints(lats, lons)              bilinearly interpolate to points (see grid_interpolation.py)
+    Derive(names)                          add derived variables such as wind_speed (see derived_variables.py)
+
+Variables are only decoded when a stage needs their values, so selecting and extracting before deriving means
+a worker never decodes a field it will throw away. Each file is one task and the stages are sent to each worker
+once, so the interpolation weights are reused for every file a worker handles.
+
+    python issuance_pipeline.py data --variables 10u,10v,2t --points points.csv --derive wind_speed --workers 8
+    python issuance_pipeline.py data --bbox 35,60,-15,30 --format parquet --output europe.parquet
+
+The output has a row per lead time and grid point (or extraction point), written with output_sinks.py. Its
+columns are worked out from the indexes of all of the files before they are processed, and a variable which
+a lead time doesn't have, such as precipitation at lead time 0, is written as NaN for that lead time.
+"""
+import argparse
+import glob
+import os
+import sys
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+
+import grib_index
+from batch_point_extraction import message_values, read_points
+from grib_region import read_message_region
+from grid_interpolation import (PointInterpolator, grid_coordinates, grid_definition_from_message, interpolate,
+                                region_indices)
+from grid_store import POINT_API_NAMES, get_lead_time, get_variable_key
+
+# The derived variables and output sinks are shared with the Point API examples.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from derived_variables import DERIVED_VARIABLES, VariableEvaluator, raw_inputs
+from output_sinks import add_output_arguments, open_sink
+
+# The stages each worker process runs, set once when the worker starts.
+_worker_stages = None
+
+
+class Fields(object):
+    """
+    The variables of one GRIB file as they pass through the stages.
+
+    Variables start out as index entries and are decoded on first use. Once a region or points have been
+    extracted, lats and lons are the coordinates of the values: for a region, the latitudes of its rows and
+    longitudes of its columns, and for points, the coordinates of each point.
+    """
+
+    def __init__(self, filepath, lead_time, entries):
+        self.filepath = filepath
+        self.lead_time = lead_time
+        self.entries = entries
+        self.values = {}
+        self.grid = None
+        self.lats = None
+        self.lons = None
+        self.points = False
+
+    @classmethod
+    def from_file(cls, filepath):
+        entries = {}
+        seen = {}
+        for entry in grib_index.load_index(filepath):
+            entries[get_variable_key(entry, seen)] = entry
+            seen.setdefault(entry['shortName'], (entry['typeOfLevel'], entry['level']))
+
+        return cls(filepath, get_lead_time(filepath), entries)
+
+    @property
+    def names(self):
+        return list(self.entries) + list(self.values)
+
+    def decode(self, names=None):
+        """
+        Decode the whole fields of variables which haven't been decoded yet, or all of them.
+        """
+        pending = [name for name in (names or list(self.entries)) if name in self.entries]
+        if not pending:
+            return
+
+        with open(self.filepath, 'rb') as f:
+            for name in pending:
+                msg = grib_index.read_message(f, self.entries.pop(name))
+                self.grid = grid_definition_from_message(msg)
+                self.values[name] = message_values(msg).reshape(self.grid.nlat, self.grid.nlon)
+
+        if self.lats is None:
+            lats, lons = grid_coordinates(self.grid)
+            self.lats, self.lons = lats, (lons + 180.0) % 360.0 - 180.0
+
+    def merge(self, other):
+        """
+        Add the variables of another file of the same lead time, such as a different bundle.
+        """
+        if self.points != other.points or not (np.array_equal(self.lats, other.lats) and
+                                               np.array_equal(self.lons, other.lons)):
+            raise Exception('%s and %s have different grids and can\'t be combined' % (self.filepath,
+                                                                                       other.filepath))
+        self.values.update(other.values)
+
+
+class SelectVariables(object):
+    """
+    Keep only the variables with these short names, store keys or Point API names.
+    """
+
+    def __init__(self, names):
+        self.names = set(names)
+
+    def _keep(self, key):
+        return key in self.names or POINT_API_NAMES.get(key) in self.names
+
+    def output_names(self, names, short_names):
+        return [name for name in names if self._keep(name) or self._keep(short_names.get(name))]
+
+    def __call__(self, fields):
+        fields.entries = {key: entry for key, entry in fields.entries.items()
+                          if self._keep(key) or self._keep(entry['shortName'])}
+        fields.values = {key: values for key, values in fields.values.items() if self._keep(key)}
+        return fields
+
+
+class ExtractRegion(object):
+    """
+    Cut out a latitude/longitude bounding box. For a box crossing the dateline give lon_min greater than lon_max.
+    """
+
+    def __init__(self, lat_min, lat_max, lon_min, lon_max):
+        self.bbox = (lat_min, lat_max, lon_min, lon_max)
+
+    def output_names(self, names, short_names):
+        return names
+
+    def __call__(self, fields):
+        if fields.points:
+            raise Exception('A region can\'t be extracted from points')
+
+        # Fields which are already decoded are cut down, and the rest are read straight from the file.
+        if fields.values:
+            rows, columns = region_indices(fields.grid, *self.bbox)
+            for name, values in fields.values.items():
+                fields.values[name] = values[rows[:, None], columns[None, :]]
+            fields.lats, fields.lons = fields.lats[rows], fields.lons[columns]
+
+        with open(fields.filepath, 'rb') as f:
+            for name, entry in fields.entries.items():
+                fields.lats, fields.lons, fields.values[name], _ = read_message_region(f, entry, *self.bbox)
+        fields.entries = {}
+        fields.grid = None
+        return fields
+
+
+class ExtractPoints(object):
+    """
+    Interpolate every variable to points. The weights are kept for each grid, and reused for every file.
+    """
+
+    def __init__(self, lats, lons):
+        self.interpolator = PointInterpolator(lats, lons)
+
+    def output_names(self, names, short_names):
+        return names
+
+    def __call__(self, fields):
+        if fields.points:
+            raise Exception('Points have already been extracted')
+
+        if fields.values and fields.grid is None:
+            raise Exception('Points can\'t be extracted from a region')
+
+        interpolator = self.interpolator
+        for name, values in fields.values.items():
+            fields.values[name] = interpolate(values, *interpolator.weights(fields.grid))
+
+        with open(fields.filepath, 'rb') as f:
+            for name, entry in fields.entries.items():
+                msg = grib_index.read_message(f, entry)
+                fields.values[name] = interpolator.interpolate(grid_definition_from_message(msg), message_values(msg))
+        fields.entries = {}
+
+        fields.lats, fields.lons, fields.points = interpolator.lats, interpolator.lons, True
+        return fields
+
+
+class Derive(object):
+    """
+    Add derived variables, such as wind_speed, from DERIVED_VARIABLES in derived_variables.py. Their inputs are
+    found by Point API name (so eastward_wind is 10u), and each is decoded once however many variables use it.
+    Variables which need a lead_time along an axis, like interval_precipitation, can't be derived from one file.
+    A variable is left out of any file which doesn't have its inputs, such as a gust at lead time 0.
+    """
+
+    def __init__(self, names):
+        unknown = [name for name in names if name not in DERIVED_VARIABLES]
+        if unknown:
+            raise Exception('Unknown derived variables', unknown)
+        self.names = list(names)
+
+    def _evaluator(self, names, source=None):
+        keys = {POINT_API_NAMES.get(name, name): name for name in names}
+        return VariableEvaluator(lambda name: source(keys[name]), keys)
+
+    def output_names(self, names, short_names):
+        evaluator = self._evaluator(names)
+        return names + [name for name in self.names if name in evaluator]
+
+    def __call__(self, fields):
+        def source(key):
+            fields.decode([key])
+            return fields.values[key]
+
+        evaluator = self._evaluator(fields.names, source)
+        fields.values.update(evaluator.compute([name for name in self.names if name in evaluator]))
+        return fields
+
+
+def find_issuance_files(path, pattern='*.grib2'):
+    """
+    Find the GRIB files of an issuance in a directory, in lead time order.
+    """
+    filepaths = glob.glob(os.path.join(path, pattern))
+    if not filepaths:
+        raise Exception('No GRIB files found in', path)
+
+    return sorted(filepaths, key=get_lead_time)
+
+
+def get_output_names(filepaths, stages):
+    """
+    The sorted names of the variables the stages give for any of the files, from the files' indexes. Raises an
+    exception if a derived variable can't be calculated for any of them.
+    """
+    names = set()
+    for filepath in filepaths:
+        fields = Fields.from_file(filepath)
+        short_names = {key: entry['shortName'] for key, entry in fields.entries.items()}
+        file_names = fields.names
+        for stage in stages:
+            file_names = stage.output_names(file_names, short_names)
+        names.update(file_names)
+
+    derived = [name for stage in stages if isinstance(stage, Derive) for name in stage.names]
+    missing = [name for name in derived if name not in names]
+    if missing:
+        raise Exception('None of the files have the inputs for', missing)
+
+    return sorted(names)
+
+
+def apply_stages(filepath, stages):
+    """
+    Run the stages over one file and decode anything they didn't.
+    """
+    fields = Fields.from_file(filepath)
+    for stage in stages:
+        fields = stage(fields)
+
+    fields.decode()
+    return fields
+
+
+def _init_worker(stages):
+    global _worker_stages
+    _worker_stages = stages
+
+
+def _process_file(filepath):
+    return apply_stages(filepath, _worker_stages)
+
+
+def run_pipeline(filepaths, stages, workers=None):
+    """
+    Run the stages over every file in a pool of worker processes, and yield a Fields for each lead time in
+    lead time order. Files with the same lead time, such as different bundles, are combined.
+
+    Results are yielded as soon as they and every earlier lead time are done, so only the results which
+    finished out of order are held in memory.
+    """
+    lead_times = sorted({get_lead_time(filepath) for filepath in filepaths})
+    remaining = {lead_time: 0 for lead_time in lead_times}
+    for filepath in filepaths:
+        remaining[get_lead_time(filepath)] += 1
+
+    done = {}
+    next_index = 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(stages,)) as pool:
+        pending = {pool.submit(_process_file, filepath) for filepath in filepaths}
+        while pending:
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                fields = future.result()
+                if fields.lead_time in done:
+                    done[fields.lead_time].merge(fields)
+                else:
+                    done[fields.lead_time] = fields
+                remaining[fields.lead_time] -= 1
+
+            while next_index < len(lead_times) and not remaining[lead_times[next_index]]:
+                yield done.pop(lead_times[next_index])
+                next_index += 1
+
+
+def get_columns(names):
+    return ['lead_time', 'latitude', 'longitude'] + list(names)
+
+
+def write_fields(sink, fields):
+    """
+    Write a lead time's values to a sink opened with get_columns, with a row per grid point or extraction point.
+    Variables the lead time doesn't have are written as NaN.
+    """
+    if fields.points:
+        lats, lons = fields.lats, fields.lons
+    else:
+        lons, lats = np.meshgrid(fields.lons, fields.lats)
+
+    columns = {name: values.ravel() for name, values in fields.values.items()}
+    columns.update(lead_time=fields.lead_time, latitude=lats.ravel(), longitude=lons.ravel())
+    sink.write_columns(columns)
+
+
+def build_stages(variables=None, bbox=None, points=None, derived=()):
+    """
+    Build a chain of stages in the order select, extract, derive.
+    """
+    stages = []
+    if variables:
+        # The inputs of derived variables have to be kept as well.
+        stages.append(SelectVariables(set(variables) | set(raw_inputs(derived))))
+    if bbox:
+        stages.append(ExtractRegion(*bbox))
+    if points is not None:
+        stages.append(ExtractPoints(*points))
+    if derived:
+        stages.append(Derive(derived))
+    return stages
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Process every lead time of an issuance in parallel')
+    parser.add_argument('paths', type=str, nargs='+',
+                        help='A directory holding the GRIB files of an issuance, or the files themselves')
+    parser.add_argument('-v', '--variables', type=str,
+                        help='The short names of the variables to keep (separate by commas)')
+    parser.add_argument('--bbox', type=str,
+                        help='Extract a bounding box given as lat_min,lat_max,lon_min,lon_max')
+    parser.add_argument('--points', type=str,
+                        help='Extract points from a CSV file with one "lat,lon" pair per line')
+    parser.add_argument('--derive', type=str,
+                        help='Variables to derive (separate by commas): %s' % ', '.join(sorted(DERIVED_VARIABLES)))
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help='The number of worker processes')
+    add_output_arguments(parser, default='csv')
+
+    args = parser.parse_args()
+    if len(args.paths) == 1 and os.path.isdir(args.paths[0]):
+        files = find_issuance_files(args.paths[0])
+    else:
+        files = sorted(args.paths, key=get_lead_time)
+
+    pipeline_stages = build_stages(
+        args.variables.split(',') if args.variables else None,
+        [float(value) for value in args.bbox.split(',')] if args.bbox else None,
+        read_points(args.points) if args.points else None,
+        args.derive.split(',') if args.derive else (),
+    )
+
+    output_names = get_output_names(files, pipeline_stages)
+    with open_sink(args.format, get_columns(output_names), args.output) as output_sink:
+        for lead_time_fields in run_pipeline(files, pipeline_stages, args.workers):
+            write_fields(output_sink, lead_time_fields)
@@ -0,0 +1,274 @@
+"""
+Serve point forecasts from locally converted GRIB issuances
+
+This runs a local HTTP server which answers /forecast/point requests with the same request parameters and
+response shape as the Spire Weather Point API, using issuances converted with grid_store.py. The server
+forks several worker processes which all read the same memory-mapped stores, so the data is only held in
+memory once. When a newer issuance is converted into the stores directory the workers switch to it.
+
+    python grid_store.py stores/20190920.t00z sof-d.20190920.t00z.0p125.basic.global.f*.grib2 \
+        --time_bundle medium_range_std_freq
+    python point_server.py stores --port 8080 --workers 4
+
+The bundles, time_bundle and valid_time_interval parameters are applied as the API does. Since a store holds a
+single issuance, a request for a bundle or time bundle it doesn't hold is answered with a 400 error rather
+than with the data it does hold.
+
+The API examples can then be pointed at the server instead of the Spire Weather API:
+
+    env spire-api-key=unused spire-api-host=http://localhost:8080 python ../point_api_example.py --lat 10 --lon 10
+"""
+import argparse
+import json
+import os
+import re
+import signal
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+from grid_store import HEADER_FILENAME, POINT_API_NAMES, GridStore
+
+# How often, in seconds, each worker checks the stores directory for a newer issuance.
+RELOAD_INTERVAL = 5
+
+# An ISO 8601 duration such as P0DT15H. Years and months aren't a fixed length, so they aren't accepted.
+_DURATION = re.compile(r'^P(?:(\d+(?:\.\d+)?)W)?(?:(\d+(?:\.\d+)?)D)?'
+                       r'(?:T(?:(\d+(?:\.\d+)?)H)?(?:(\d+(?:\.\d+)?)M)?(?:(\d+(?:\.\d+)?)S)?)?$')
+
+
+def _utc_isoformat(time_string):
+    return time_string if time_string.endswith('+00:00') else time_string + '+00:00'
+
+
+def _parse_utc(time_string):
+    parsed = datetime.fromisoformat(time_string.strip().replace('Z', '+00:00'))
+    if parsed.tzinfo is None:
+        return parsed
+    return parsed.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _parse_duration(duration_string):
+    match = _DURATION.match(duration_string.strip())
+    if not match or duration_string.strip() in ('P', 'PT') or duration_string.strip().endswith('T'):
+        raise ValueError('Not an ISO 8601 duration in weeks, days, hours, minutes and seconds', duration_string)
+
+    weeks, days, hours, minutes, seconds = [float(value) if value else 0.0 for value in match.groups()]
+    return timedelta(weeks=weeks, days=days, hours=hours, minutes=minutes, seconds=seconds)
+
+
+def parse_interval(interval):
+    """
+    Parse an ISO 8601 time interval given as <start>/<end>, <start>/<duration> or <duration>/<end>, such as
+    2019-09-20T00:00:00/P0DT15H, into its start and end times in UTC.
+    """
+    parts = interval.split('/')
+    if len(parts) != 2:
+        raise ValueError('An interval has two parts separated by "/"', interval)
+
+    start, end = parts
+    if start.strip().startswith('P'):
+        end = _parse_utc(end)
+        return end - _parse_duration(start), end
+    start = _parse_utc(start)
+    if end.strip().startswith('P'):
+        return start, start + _parse_duration(end)
+    return start, _parse_utc(end)
+
+
+def select_steps(store, params):
+    """
+    Check the bundles and time_bundle of a request against the store, and return the indices of the steps
+    within its valid_time_interval. Raises a ValueError describing the problem if the store can't answer it.
+    """
+    if 'bundles' in params:
+        requested = {bundle.strip() for bundle in params['bundles'][0].split(',') if bundle.strip()}
+        missing = sorted(requested - set(store.bundles))
+        if missing:
+            raise ValueError('The store does not hold the bundles %s' % ', '.join(missing))
+
+    if 'time_bundle' in params and params['time_bundle'][0] != store.time_bundle:
+        raise ValueError('The store does not hold the time bundle %s' % params['time_bundle'][0])
+
+    steps = list(range(len(store.valid_times)))
+    if 'valid_time_interval' in params:
+        try:
+            start, end = parse_interval(params['valid_time_interval'][0])
+        except ValueError:
+            raise ValueError('valid_time_interval must be an ISO 8601 interval of two times, or a time and a '
+                             'duration, separated by "/"')
+        steps = [step for step in steps if start <= _parse_utc(store.valid_times[step]) <= end]
+
+    return steps
+
+
+class LatestStore(object):
+    """
+    Keeps the store of the latest converted issuance open, switching to a newer one when it appears.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.store = None
+        self._checked = 0
+        self.reload()
+
+    def reload(self):
+        """
+        Open the store with the latest issuance time in the stores directory.
+        """
+        latest = None
+        for name in os.listdir(self.directory):
+            header_path = os.path.join(self.directory, name, HEADER_FILENAME)
+            # The header is written last, so a store without one is still being converted.
+            if not os.path.exists(header_path):
+                continue
+            with open(header_path) as f:
+                issuance_time = json.load(f)['issuance_time']
+            if latest is None or issuance_time > latest[0]:
+                latest = (issuance_time, os.path.join(self.directory, name))
+
+        if latest and (self.store is None or latest[1] != self.store.directory):
+            self.store = GridStore(latest[1])
+
+        self._checked = time.monotonic()
+
+    def get(self):
+        if time.monotonic() - self._checked > RELOAD_INTERVAL:
+            self.reload()
+
+        return self.store
+
+
+def get_point_data(store, lat, lon, steps=None):
+    """
+    Build the 'data' element of a Point API response for a point, for every step or just the given ones.
+    """
+    if steps is None:
+        steps = range(len(store.valid_times))
+    steps = list(steps)
+
+    weights = store.weights(lat, lon)
+    names = list(store.variables)
+    values = np.stack([store.points(name, lat, lon, weights)[0][steps] for name in names], axis=1)
+    valid_times = [store.valid_times[step] for step in steps]
+
+    issuance_time = _utc_isoformat(store.issuance_time)
+    point_api_names = [POINT_API_NAMES.get(name, name) for name in names]
+
+    data = []
+    for valid_time, row in zip(valid_times, values.tolist()):
+        # NaN isn't valid JSON, so missing values are returned as null.
+        data.append({
+            'times': {'issuance_time': issuance_time, 'valid_time': _utc_isoformat(valid_time)},
+            'values': {name: None if value != value else value for name, value in zip(point_api_names, row)},
+        })
+
+    return data
+
+
+class PointRequestHandler(BaseHTTPRequestHandler):
+    # Keep connections alive so clients using a pooled session don't reconnect for every request.
+    protocol_version = 'HTTP/1.1'
+
+    # Set by serve() in each worker process.
+    latest_store = None
+
+    def send_json(self, status, body):
+        content = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path != '/forecast/point':
+            self.send_json(404, {'error': 'Not found'})
+            return
+
+        params = parse_qs(url.query)
+        try:
+            lat = float(params['lat'][0])
+            lon = float(params['lon'][0])
+        except (KeyError, ValueError):
+            self.send_json(400, {'error': 'lat and lon are required'})
+            return
+
+        store = self.latest_store.get()
+        if store is None:
+            self.send_json(503, {'error': 'No issuances have been converted yet'})
+            return
+
+        if 'issuance_time' in params:
+            try:
+                issuance_time = _parse_utc(params['issuance_time'][0])
+            except ValueError:
+                self.send_json(400, {'error': 'issuance_time must be an ISO 8601 time'})
+                return
+            if issuance_time != _parse_utc(store.issuance_time):
+                self.send_json(404, {'error': 'Only the latest issuance is available',
+                                     'issuance_time': store.issuance_time})
+                return
+
+        try:
+            steps = select_steps(store, params)
+        except ValueError as error:
+            self.send_json(400, {'error': str(error)})
+            return
+
+        self.send_json(200, {'data': get_point_data(store, lat, lon, steps)})
+
+    def log_message(self, format, *args):
+        # Logging every request would cost more than answering it.
+        pass
+
+
+def serve(stores_directory, host='localhost', port=8080, workers=4):
+    """
+    Start the server with a number of forked worker processes sharing the listening socket.
+    """
+    # Each worker handles its keep-alive connections on threads, so a long-lived client only ties up a thread.
+    server = ThreadingHTTPServer((host, port), PointRequestHandler)
+    print('Serving point forecasts from %s on http://%s:%d with %d workers' % (stores_directory, host, port, workers))
+
+    children = []
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            # Each worker opens its own memory maps, which share pages through the operating system's cache.
+            PointRequestHandler.latest_store = LatestStore(stores_directory)
+            try:
+                server.serve_forever()
+            finally:
+                os._exit(0)
+        children.append(pid)
+
+    def stop(signum, frame):
+        for child in children:
+            os.kill(child, signal.SIGTERM)
+        raise SystemExit(0)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for child in children:
+        os.waitpid(child, 0)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve point forecasts from converted GRIB issuances')
+    parser.add_argument('stores_directory', type=str,
+                        help='The directory containing stores created by grid_store.py')
+    parser.add_argument('--host', type=str, default='localhost',
+                        help='The address to listen on')
+    parser.add_argument('--port', type=int, default=8080,
+                        help='The port to listen on')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help='The number of worker processes')
+
+    args = parser.parse_args()
+    serve(args.stores_directory, args.host, args.port, args.workers)
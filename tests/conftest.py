@@ -0,0 +1,12 @@
+"""
+The examples are scripts rather than a package, so put their directories on the path as running them would.
+"""
+import os
+import sys
+
+EXAMPLES_DIRECTORY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'examples')
+
+for directory in ('', 'working_with_grib_data', 'benchmarks'):
+    path = os.path.join(EXAMPLES_DIRECTORY, directory)
+    if path not in sys.path:
+        sys.path.insert(0, path)
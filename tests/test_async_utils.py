@@ -0,0 +1,159 @@
+import asyncio
+import os
+
+import pytest
+
+aiohttp = pytest.importorskip('aiohttp')
+
+import async_utils
+import rate_limit
+from stub_server import StubApi, start_server
+
+
+@pytest.fixture
+def stub(tmp_path, monkeypatch):
+    grib_directory = tmp_path / 'grib'
+    grib_directory.mkdir()
+    (grib_directory / 'sof-d.20190920.t00z.0p25.basic.global.f000.grib2').write_bytes(os.urandom(100000))
+
+    api = StubApi(grib_directory=str(grib_directory))
+    server, url = start_server(api)
+    monkeypatch.setattr(async_utils, 'HOST', url)
+    # Use a limiter of our own for each test, and don't wait between retries.
+    monkeypatch.setattr(rate_limit, '_limiter', rate_limit.ApiLimiter())
+    monkeypatch.setattr(async_utils, 'backoff_delay', lambda attempt: 0.0)
+    yield api
+    server.shutdown()
+    server.server_close()
+
+
+def test_point_api_response(stub):
+    data = asyncio.run(async_utils.get_point_api_response(10.0, 20.0, api_key='test'))
+
+    assert data == stub.point['data']
+    assert stub.requests == 1
+
+
+def test_file_list_and_download(stub, tmp_path):
+    async def fetch():
+        async with async_utils.create_session() as session:
+            files = await async_utils.get_file_list(api_key='test', session=session)
+            path = await async_utils.download_file(files[0], str(tmp_path), api_key='test', session=session)
+            return files, path
+
+    files, path = asyncio.run(fetch())
+
+    assert files == stub.files['files']
+    with open(path, 'rb') as f:
+        assert f.read() == stub.forecast_file(files[0])
+
+
+@pytest.mark.parametrize('status', [429, 500, 503])
+def test_overloaded_responses_are_retried(stub, status):
+    stub.fail_next(status, count=2, retry_after=0 if status == 429 else None)
+
+    data = asyncio.run(async_utils.get_point_api_response(10.0, 20.0, api_key='test'))
+
+    assert data == stub.point['data']
+    assert stub.requests == 3
+
+
+def test_retry_after_is_honoured(stub, monkeypatch):
+    stub.fail_next(429, retry_after=1)
+    delays = []
+    original_sleep = asyncio.sleep
+
+    async def sleep(delay):
+        delays.append(delay)
+        await original_sleep(0)
+
+    # The limiter also pauses every request for the Retry-After delay.
+    monkeypatch.setattr(asyncio, 'sleep', sleep)
+    asyncio.run(async_utils.get_point_api_response(10.0, 20.0, api_key='test'))
+
+    assert delays[0] == 1.0
+    assert stub.requests == 2
+
+
+def test_gives_up_after_the_last_retry(stub):
+    stub.fail_next(503, count=3)
+
+    async def fetch():
+        async with async_utils.create_session() as session:
+            url = async_utils.HOST + '/forecast/point'
+            return await async_utils._get_json(session, 'point', url, {'lat': 10.0, 'lon': 20.0},
+                                               {'spire-api-key': 'test'}, retries=2)
+
+    with pytest.raises(aiohttp.ClientResponseError) as error:
+        asyncio.run(fetch())
+
+    assert error.value.status == 503
+    assert stub.requests == 3
+
+
+def test_client_errors_are_not_retried(stub):
+    stub.fail_next(404)
+
+    with pytest.raises(aiohttp.ClientResponseError):
+        asyncio.run(async_utils.get_point_api_response(10.0, 20.0, api_key='test'))
+
+    assert stub.requests == 1
+
+
+def test_download_is_retried_without_leaving_a_partial_file(stub, tmp_path):
+    stub.fail_next(500)
+    name = stub.files['files'][0]
+
+    path = asyncio.run(async_utils.download_file(name, str(tmp_path), api_key='test'))
+
+    assert stub.requests == 2
+    assert os.path.getsize(path) == len(stub.forecast_file(name))
+
+
+async def _collect(points, **kwargs):
+    return [result async for result in async_utils.get_point_api_responses(points, api_key='test', **kwargs)]
+
+
+def test_max_concurrency_bounds_requests_in_flight(stub):
+    stub.latency = 0.05
+    points = [(float(lat), 0.0) for lat in range(20)]
+
+    results = asyncio.run(_collect(points, max_concurrency=3))
+
+    assert sorted((result.lat, result.lon) for result in results) == points
+    assert stub.max_in_flight == 3
+
+
+def test_shared_limiter_bounds_requests_in_flight(stub, monkeypatch):
+    monkeypatch.setattr(rate_limit, '_limiter', rate_limit.ApiLimiter(initial_concurrency=2, max_concurrency=2))
+    stub.latency = 0.05
+    points = [(float(lat), 0.0) for lat in range(12)]
+
+    results = asyncio.run(_collect(points, max_concurrency=100))
+
+    assert len(results) == 12
+    assert stub.max_in_flight == 2
+    assert rate_limit.get_limiter().concurrency.in_flight == 0
+
+
+def test_limiter_allows_more_than_its_default_maximum(stub):
+    stub.latency = 0.2
+    points = [(float(lat), 0.0) for lat in range(2 * rate_limit.MAX_CONCURRENCY)]
+
+    results = asyncio.run(_collect(points, max_concurrency=len(points)))
+
+    assert len(results) == len(points)
+    # The stub server accepts connections one at a time, so not quite every request overlaps.
+    assert rate_limit.MAX_CONCURRENCY < stub.max_in_flight <= len(points)
+
+
+def test_max_concurrency_environment_variable_is_a_fixed_maximum(stub, monkeypatch):
+    monkeypatch.setattr(rate_limit, '_limiter', None)
+    monkeypatch.setenv('spire-api-max-concurrency', '5')
+    stub.latency = 0.05
+    points = [(float(lat), 0.0) for lat in range(20)]
+
+    results = asyncio.run(_collect(points, max_concurrency=100))
+
+    assert len(results) == 20
+    assert stub.max_in_flight == 5
@@ -0,0 +1,45 @@
+import csv
+
+import numpy as np
+import pytest
+
+pygrib = pytest.importorskip('pygrib')
+
+import synthetic_grib
+from batch_point_extraction import extract_points_from_files, get_variable_names, write_points
+from output_sinks import open_sink
+
+# Temperature at three levels, which all have the GRIB name "Temperature" and short name "t".
+TEMPERATURE_LEVELS = (
+    ('Temperature', 0, 0, 103, 80),
+    ('Temperature', 0, 0, 100, 85000),
+    ('Temperature', 0, 0, 1, 0),
+)
+
+
+def test_variables_with_the_same_name_at_different_levels_are_kept_apart(tmp_path):
+    first = str(tmp_path / 'f000.grib2')
+    second = str(tmp_path / 'f006.grib2')
+    synthetic_grib.write_file(first, '1p0', 0, fields=TEMPERATURE_LEVELS)
+    synthetic_grib.write_file(second, '1p0', 6, fields=TEMPERATURE_LEVELS[1:2])
+    lats, lons = np.array([10.0, 45.5]), np.array([20.0, 300.25])
+
+    variables = get_variable_names([first, second])
+    assert variables == ['t', 't_isobaricInhPa850', 't_surface0']
+
+    path = str(tmp_path / 'points.csv')
+    results = list(extract_points_from_files([first, second], lats, lons))
+    with open_sink('csv', ['file', 'latitude', 'longitude'] + variables, path) as sink:
+        for filepath, file_variables, values in results:
+            write_points(sink, filepath, lats, lons, file_variables, values)
+
+    assert results[0][1] == variables
+    assert results[1][1] == ['t_isobaricInhPa850']
+    first_values = results[0][2]
+    assert not np.allclose(first_values[:, 0], first_values[:, 1])
+    assert not np.allclose(first_values[:, 1], first_values[:, 2])
+
+    with open(path) as f:
+        rows = list(csv.DictReader(f))
+    assert [row['t_isobaricInhPa850'] != 'nan' for row in rows] == [True] * 4
+    assert [row['t'] == 'nan' for row in rows] == [False, False, True, True]
@@ -0,0 +1,62 @@
+import os
+
+import pytest
+
+requests = pytest.importorskip('requests')
+
+import downloads
+import rate_limit
+from stub_server import StubApi, start_server
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    api = StubApi(export_file_size=10000)
+    server, url = start_server(api)
+    monkeypatch.setattr(rate_limit, '_limiter', rate_limit.ApiLimiter())
+    monkeypatch.setattr(downloads, 'backoff_delay', lambda attempt, backoff: 0.0)
+    yield api, url + '/export/test/part-00000.bin'
+    server.shutdown()
+    server.server_close()
+
+
+def test_stale_destination_is_downloaded_from_the_start(stub, tmp_path):
+    api, url = stub
+    output_path = tmp_path / 'part-00000.bin'
+    output_path.write_bytes(os.urandom(1000))
+
+    with requests.Session() as session:
+        downloaded = downloads.download_file(session, url, str(output_path))
+
+    assert downloaded == len(api.export_content)
+    assert output_path.read_bytes() == api.export_content
+    assert not os.path.exists(str(output_path) + downloads.PARTIAL_SUFFIX)
+
+
+def test_partial_download_is_resumed(stub, tmp_path):
+    api, url = stub
+    output_path = tmp_path / 'part-00000.bin'
+    (tmp_path / ('part-00000.bin' + downloads.PARTIAL_SUFFIX)).write_bytes(api.export_content[:1000])
+
+    with requests.Session() as session:
+        downloaded = downloads.download_file(session, url, str(output_path))
+
+    assert downloaded == len(api.export_content) - 1000
+    assert output_path.read_bytes() == api.export_content
+
+    with requests.Session() as session:
+        assert downloads.download_file(session, url, str(output_path)) == 0
+
+
+def test_retries_are_reported_on_stderr(stub, tmp_path, capsys):
+    api, url = stub
+    api.fail_next(503)
+    output_path = tmp_path / 'part-00000.bin'
+
+    with requests.Session() as session:
+        downloads.download_file_with_retries(session, url, str(output_path))
+
+    captured = capsys.readouterr()
+    assert 'Retrying' in captured.err
+    assert captured.out == ''
+    assert output_path.read_bytes() == api.export_content
@@ -0,0 +1,50 @@
+import pytest
+
+pytest.importorskip('requests')
+
+import export_download
+import rate_limit
+from downloads import file_sha256
+from export_download import is_downloaded
+from stub_server import StubApi, start_server
+
+
+def test_is_downloaded_checks_size_and_checksum(tmp_path):
+    path = tmp_path / 'file.grib2'
+    path.write_bytes(b'GRIB' + bytes(100))
+    manifest = {'file.grib2': {'size': 104, 'sha256': file_sha256(path)}}
+
+    assert is_downloaded(manifest, 'file.grib2', str(tmp_path))
+    assert not is_downloaded(manifest, 'other.grib2', str(tmp_path))
+
+    # A file of the same size with different contents is downloaded again.
+    path.write_bytes(b'GRIB' + bytes(99) + b'\x01')
+    assert not is_downloaded(manifest, 'file.grib2', str(tmp_path))
+
+    path.write_bytes(b'GRIB')
+    assert not is_downloaded(manifest, 'file.grib2', str(tmp_path))
+
+
+def test_rerun_downloads_files_which_no_longer_match(tmp_path, monkeypatch):
+    api = StubApi(export_files=5, export_file_size=10000)
+    server, url = start_server(api)
+    monkeypatch.setattr(export_download, 'base_url', url + '/export')
+    monkeypatch.setattr(rate_limit, '_limiter', rate_limit.ApiLimiter())
+    try:
+        assert export_download.download_export('test', str(tmp_path), parallelism=2) == 0
+
+        # Corrupt a file without changing its size, so only the checksum shows it's wrong.
+        path = tmp_path / 'part-00002.bin'
+        path.write_bytes(bytes(len(api.export_content)))
+        requests_before = api.requests
+
+        assert export_download.download_export('test', str(tmp_path), parallelism=2) == 0
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert path.read_bytes() == api.export_content
+    # Only the file list and the corrupted file were fetched again.
+    assert api.requests - requests_before == 2
+    manifest = export_download.load_manifest(export_download.get_manifest_path('test', str(tmp_path)))
+    assert manifest['part-00002.bin']['sha256'] == file_sha256(path)
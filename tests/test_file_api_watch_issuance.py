@@ -0,0 +1,50 @@
+import os
+
+import pytest
+
+pytest.importorskip('requests')
+
+import file_api_download_full_issuance
+import file_api_watch_issuance
+import rate_limit
+from stub_server import StubApi, start_server
+
+BUNDLES = 'basic,maritime'
+
+
+def _forecast_files(issuance):
+    return ['sof-d.%s.0p125.%s.global.f%03d.grib2' % (issuance, bundle, step)
+            for bundle in BUNDLES.split(',') for step in range(0, 169, 6)]
+
+
+@pytest.fixture
+def stub(tmp_path, monkeypatch):
+    grib_directory = tmp_path / 'grib'
+    grib_directory.mkdir()
+    (grib_directory / 'forecast.grib2').write_bytes(os.urandom(1000))
+
+    # The previous issuance is listed too, and is already on disk from an earlier run.
+    old_files = _forecast_files('20190919.t12z')
+    output_directory = tmp_path / 'output'
+    output_directory.mkdir()
+    for forecast in old_files:
+        (output_directory / forecast).write_bytes((grib_directory / 'forecast.grib2').read_bytes())
+
+    api = StubApi(grib_directory=str(grib_directory), forecast_files=old_files + _forecast_files('20190920.t00z'))
+    server, url = start_server(api)
+    monkeypatch.setattr(file_api_download_full_issuance, 'HOST', url)
+    monkeypatch.setattr(file_api_watch_issuance, 'MIN_POLL_INTERVAL', 0)
+    monkeypatch.setattr(rate_limit, '_limiter', rate_limit.ApiLimiter())
+    yield str(output_directory)
+    server.shutdown()
+    server.server_close()
+
+
+def test_new_issuance_of_every_bundle_is_reported_complete(stub):
+    completed = []
+
+    issuance = file_api_watch_issuance.watch_issuances(
+        'test', stub, bundles=BUNDLES, on_complete=lambda *args: completed.append(args), exit_on_complete=True)
+
+    assert issuance == '20190920.t00z'
+    assert [(issuance, len(paths)) for issuance, paths in completed] == [('20190920.t00z', 58)]
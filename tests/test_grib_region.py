@@ -0,0 +1,74 @@
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+pygrib = pytest.importorskip('pygrib')
+
+import synthetic_grib
+from grib_region import read_region
+
+BBOX = (30.0, 60.0, -20.0, 40.0)
+
+
+def _write_masked_file(filepath, indicators):
+    """
+    Write a message per bitmap indicator, all with the same land mask. Indicator 254 reuses the previous bitmap.
+    """
+    shape = synthetic_grib.grid_shape('1p0')
+    lats = np.linspace(90, -90, shape[0])[:, None]
+    lons = np.linspace(0, 360, shape[1], endpoint=False)[None, :]
+    land = (np.abs(lats - 45) < 10) & (lons > 5) & (lons < 30)
+
+    fields = []
+    with open(filepath, 'wb') as f:
+        for index, indicator in enumerate(indicators):
+            values = synthetic_grib.synthetic_field(shape, index, 0)
+            values[land] = np.nan
+            f.write(synthetic_grib.encode_message(values, 0, datetime(2019, 9, 20), 0, [0, 2, 3, 4][index], 1, 0,
+                                                  previous_bitmap=indicator == 254))
+            fields.append(values)
+
+    return fields
+
+
+def test_previously_defined_bitmap_is_reused(tmp_path):
+    filepath = str(tmp_path / 'masked.grib2')
+    fields = _write_masked_file(filepath, [0, 254, 254])
+
+    lats, lons, regions = read_region(filepath, *BBOX)
+
+    assert len(regions) == 3
+    rows = np.searchsorted(-np.linspace(90, -90, fields[0].shape[0]), -lats)
+    columns = np.round(lons % 360).astype(int)
+    for values, field in zip(regions.values(), fields):
+        expected = field[rows[:, None], columns[None, :]]
+        assert np.isnan(values).any()
+        np.testing.assert_allclose(values, expected, atol=0.006)
+
+
+def test_predefined_bitmaps_are_rejected(tmp_path):
+    filepath = str(tmp_path / 'masked.grib2')
+    _write_masked_file(filepath, [0])
+    with open(filepath, 'rb') as f:
+        data = bytearray(f.read())
+
+    # Change the bitmap indicator to a predefined bitmap, which isn't supported.
+    position = 16
+    while data[position + 4] != 6:
+        position += int.from_bytes(data[position:position + 4], 'big')
+    data[position + 5] = 100
+    with open(filepath, 'wb') as f:
+        f.write(data)
+
+    with pytest.raises(Exception, match='predefined bitmap 100'):
+        read_region(filepath, *BBOX)
+
+
+def test_names_select_messages_like_batch_extraction(tmp_path):
+    filepath = str(tmp_path / 'basic.grib2')
+    synthetic_grib.write_file(filepath, '1p0')
+
+    _, _, regions = read_region(filepath, *BBOX, names={'2 metre temperature'})
+
+    assert list(regions) == ['2t']
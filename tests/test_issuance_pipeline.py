@@ -0,0 +1,78 @@
+import csv
+
+import numpy as np
+import pytest
+
+pytest.importorskip('pygrib')
+
+import synthetic_grib
+from issuance_pipeline import build_stages, get_columns, get_output_names, run_pipeline, write_fields
+from output_sinks import open_sink
+
+POINTS = (np.array([10.0, -33.9, 51.5]), np.array([20.0, 18.4, -0.1]))
+
+
+@pytest.fixture
+def issuance(tmp_path):
+    """
+    Three lead times of a 1 degree issuance, where lead time 0 has no pressure, as it has no precipitation in
+    the real files.
+    """
+    filepaths = []
+    for step in (0, 6, 12):
+        filepath = str(tmp_path / ('sof-d.20190920.t00z.1p0.basic.global.f%03d.grib2' % step))
+        fields = synthetic_grib.BASIC_FIELDS[:3] if step == 0 else synthetic_grib.BASIC_FIELDS
+        synthetic_grib.write_file(filepath, '1p0', step, fields=fields)
+        filepaths.append(filepath)
+
+    return filepaths
+
+
+def _run(filepaths, stages, output_format, path, workers=1):
+    names = get_output_names(filepaths, stages)
+    with open_sink(output_format, get_columns(names), str(path)) as sink:
+        for fields in run_pipeline(filepaths, stages, workers):
+            write_fields(sink, fields)
+    return names
+
+
+def test_missing_variable_is_nan_for_that_lead_time(issuance, tmp_path):
+    stages = build_stages(points=POINTS, derived=['wind_speed'])
+    path = tmp_path / 'points.csv'
+    names = _run(issuance, stages, 'csv', path, workers=2)
+    assert names == ['10u', '10v', '2t', 'prmsl', 'wind_speed']
+
+    with open(path, newline='') as f:
+        rows = list(csv.reader(f))
+
+    # One header, then the points of each lead time in order.
+    assert rows[0] == get_columns(names)
+    assert [row[0] for row in rows[1:]] == ['0'] * 3 + ['6'] * 3 + ['12'] * 3
+    prmsl = [float(row[rows[0].index('prmsl')]) for row in rows[1:]]
+    assert all(np.isnan(prmsl[:3])) and not any(np.isnan(prmsl[3:]))
+
+
+@pytest.mark.parametrize('output_format', ['npy', 'parquet'])
+def test_missing_variable_with_fixed_column_formats(issuance, tmp_path, output_format):
+    if output_format == 'parquet':
+        pytest.importorskip('pyarrow')
+
+    path = tmp_path / ('points.' + output_format if output_format == 'parquet' else 'points')
+    _run(issuance, build_stages(['2t', 'prmsl'], points=POINTS), output_format, path)
+
+    if output_format == 'npy':
+        lead_times = np.load(str(path / 'lead_time.npy'))
+        prmsl = np.load(str(path / 'prmsl.npy'))
+    else:
+        import pyarrow.parquet as pq
+        table = pq.read_table(str(path))
+        lead_times = table['lead_time'].to_numpy()
+        prmsl = table['prmsl'].to_numpy()
+
+    assert np.isnan(prmsl[lead_times == 0]).all()
+    assert not np.isnan(prmsl[lead_times > 0]).any()
+
+
+def test_derived_variable_without_inputs_raises(issuance):
+    with pytest.raises(Exception, match='inputs'):
+        get_output_names(issuance, build_stages(derived=['gust_factor']))
@@ -0,0 +1,34 @@
+from datetime import datetime, timezone
+
+import pytest
+
+import issuance_resolver
+from issuance_resolver import IssuanceResolver, parse_issuance_time
+from stub_server import generate_point_response
+
+
+@pytest.mark.parametrize('issuance_time', ['2019-09-20T00:00:00Z', '2019-09-20T00:00:00+00:00',
+                                           '2019-09-20T02:00:00+02:00', '2019-09-20T00:00:00'])
+def test_parse_issuance_time(issuance_time):
+    assert parse_issuance_time(issuance_time) == datetime(2019, 9, 20, tzinfo=timezone.utc)
+
+
+def test_requested_point_is_probed_and_incomplete_issuances_are_skipped(monkeypatch):
+    complete = generate_point_response()['data']
+    calls = []
+
+    def get_point_api_response(lat, lon, issuance_time=None, **kwargs):
+        calls.append((lat, lon, issuance_time))
+        # The latest issuance is still being populated.
+        return complete[:10] if issuance_time is None else complete
+
+    monkeypatch.setattr(issuance_resolver, 'get_point_api_response', get_point_api_response)
+    resolver = IssuanceResolver(api_key='test')
+
+    issuance_time = resolver.get_last_complete_issuance('basic', 'medium_range_std_freq', (49.6, 6.1))
+
+    assert issuance_time == complete[0]['times']['issuance_time']
+    assert calls == [(49.6, 6.1, None), (49.6, 6.1, '2019-09-19T12:00:00+00:00')]
+    # The answer is cached until the next issuance can be complete.
+    assert resolver.get_last_complete_issuance('basic', 'medium_range_std_freq', (10.0, 20.0)) == issuance_time
+    assert len(calls) == 2
@@ -0,0 +1,72 @@
+import csv
+import json
+
+import numpy as np
+import pytest
+
+from output_sinks import FORMATS, open_sink
+
+
+def _open(output_format, tmp_path, columns):
+    extension = '' if output_format == 'npy' else '.' + output_format
+    return open_sink(output_format, columns, str(tmp_path / ('out' + extension)))
+
+
+@pytest.mark.parametrize('output_format', [name for name in FORMATS if name != 'parquet'])
+def test_changing_columns_raises(output_format, tmp_path):
+    with _open(output_format, tmp_path, ['a', 'b']) as sink:
+        sink.set_columns(['a', 'b'])
+        with pytest.raises(Exception, match='same columns throughout'):
+            sink.set_columns(['a', 'b', 'c'])
+
+
+def test_csv_write_columns_fills_missing_with_nan(tmp_path):
+    path = tmp_path / 'out.csv'
+    with open_sink('csv', ['file', 'x', 'y'], str(path)) as sink:
+        sink.write_columns({'file': 'f000', 'x': np.array([1.0, 2.0])})
+        sink.write_columns({'file': 'f006', 'x': np.array([3.0, 4.0]), 'y': np.array([5.0, 6.0])})
+
+    with open(path, newline='') as f:
+        rows = list(csv.reader(f))
+
+    assert rows == [['file', 'x', 'y'], ['f000', '1.0', 'nan'], ['f000', '2.0', 'nan'], ['f006', '3.0', '5.0'],
+                    ['f006', '4.0', '6.0']]
+
+
+def test_write_columns_rejects_unknown_columns(tmp_path):
+    with open_sink('csv', ['x'], str(tmp_path / 'out.csv')) as sink:
+        with pytest.raises(Exception, match='not among'):
+            sink.write_columns({'x': [1.0], 'z': [2.0]})
+
+
+def test_ndjson_writes_missing_values_as_null(tmp_path):
+    path = tmp_path / 'out.ndjson'
+    with open_sink('ndjson', ['x', 'y'], str(path)) as sink:
+        sink.write_columns({'x': np.array([1.0])})
+
+    with open(path) as f:
+        assert [json.loads(line) for line in f] == [{'x': 1.0, 'y': None}]
+
+
+def test_npy_rows_and_blocks(tmp_path):
+    path = tmp_path / 'out'
+    with open_sink('npy', ['x', 'y'], str(path)) as sink:
+        sink.write_rows([[1.0, None], [2.0, 3.0]])
+        sink.write_columns({'x': np.array([4.0])})
+
+    np.testing.assert_array_equal(np.load(str(path / 'x.npy')), [1.0, 2.0, 4.0])
+    np.testing.assert_array_equal(np.load(str(path / 'y.npy')), [np.nan, 3.0, np.nan])
+
+
+def test_parquet_fills_missing_columns(tmp_path):
+    pq = pytest.importorskip('pyarrow.parquet')
+    path = tmp_path / 'out.parquet'
+    with open_sink('parquet', ['x', 'y'], str(path), row_group_size=1) as sink:
+        sink.write_columns({'x': np.array([1.0])})
+        sink.write_columns({'x': np.array([2.0]), 'y': np.array([3.0])})
+        with pytest.raises(Exception, match='same columns throughout'):
+            sink.set_columns(['x'])
+
+    table = pq.read_table(str(path)).to_pydict()
+    assert table['x'] == [1.0, 2.0]
+    assert np.isnan(table['y'][0]) and table['y'][1] == 3.0
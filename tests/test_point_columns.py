@@ -0,0 +1,57 @@
+import json
+
+import numpy as np
+import pytest
+
+import rate_limit
+import utils
+from point_columns import PointForecast
+from stub_server import StubApi, generate_point_response, start_server
+
+DATA = [
+    {'times': {'issuance_time': '2019-09-20T00:00:00+00:00', 'valid_time': '2019-09-20T00:00:00+00:00'},
+     'values': {'air_temperature': 280.5, 'eastward_wind': 3.0}},
+    {'times': {'issuance_time': '2019-09-20T00:00:00+00:00', 'valid_time': '2019-09-20T06:00:00+00:00'},
+     'values': {'air_temperature': None}},
+]
+
+
+def test_from_json_matches_from_data():
+    forecast = PointForecast.from_json(json.dumps({'data': DATA}).encode())
+
+    assert forecast.fields == ('air_temperature', 'eastward_wind')
+    assert forecast['air_temperature'].tolist()[0] == 280.5
+    assert np.isnan(forecast['air_temperature'][1]) and np.isnan(forecast['eastward_wind'][1])
+    assert forecast.valid_times.tolist() == PointForecast.from_data(DATA).valid_times.tolist()
+
+
+def test_from_json_requires_a_data_element():
+    with pytest.raises(Exception, match='data element'):
+        PointForecast.from_json(b'{"error": "Unauthorized"}')
+
+
+def test_rows_are_written_as_the_api_returned_them():
+    rows = list(PointForecast.from_data(DATA).rows())
+
+    assert rows == [
+        ['2019-09-20T00:00:00+00:00', '2019-09-20T00:00:00+00:00', 280.5, 3.0],
+        ['2019-09-20T00:00:00+00:00', '2019-09-20T06:00:00+00:00', None, None],
+    ]
+
+
+def test_columnar_request_is_decoded_from_the_body(monkeypatch):
+    api = StubApi()
+    server, url = start_server(api)
+    monkeypatch.setattr(utils, 'HOST', url)
+    monkeypatch.setattr(rate_limit, '_limiter', rate_limit.ApiLimiter())
+    try:
+        forecast = utils.get_point_api_response(10.0, 20.0, api_key='test', columnar=True)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    expected = PointForecast.from_data(generate_point_response()['data'])
+    assert isinstance(forecast, PointForecast)
+    assert forecast.fields == expected.fields
+    assert np.array_equal(forecast.values, expected.values)
+    assert list(forecast.rows())[0][:2] == ['2019-09-20T00:00:00+00:00', '2019-09-20T00:00:00+00:00']
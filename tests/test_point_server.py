@@ -0,0 +1,97 @@
+import json
+import os
+import threading
+from datetime import datetime
+from http.server import ThreadingHTTPServer
+from urllib.error import HTTPError
+from urllib.parse import urlencode
+from urllib.request import urlopen
+
+import pytest
+
+pytest.importorskip('pygrib')
+
+import synthetic_grib
+from grid_store import GridStore, convert_issuance
+from point_server import LatestStore, PointRequestHandler, get_point_data, parse_interval, select_steps
+
+
+@pytest.fixture
+def store(tmp_path):
+    filepaths = []
+    for step in (0, 6, 12):
+        filepath = str(tmp_path / ('sof-d.20190920.t00z.1p0.basic.global.f%03d.grib2' % step))
+        synthetic_grib.write_file(filepath, '1p0', step)
+        filepaths.append(filepath)
+
+    convert_issuance(filepaths, str(tmp_path / 'store'), time_bundle='medium_range_std_freq')
+    return GridStore(str(tmp_path / 'store'))
+
+
+def test_store_records_bundles(store):
+    assert store.bundles == ['basic']
+    assert store.time_bundle == 'medium_range_std_freq'
+
+
+def test_valid_time_interval_selects_steps(store):
+    params = {'bundles': ['basic'], 'time_bundle': ['medium_range_std_freq'],
+              'valid_time_interval': ['2019-09-20T05:00:00Z/2019-09-20T12:00:00+00:00']}
+    steps = select_steps(store, params)
+    assert steps == [1, 2]
+
+    data = get_point_data(store, 10.0, 20.0, steps)
+    assert [entry['times']['valid_time'] for entry in data] == ['2019-09-20T06:00:00+00:00',
+                                                               '2019-09-20T12:00:00+00:00']
+    assert data == get_point_data(store, 10.0, 20.0)[1:]
+    assert 'air_temperature' in data[0]['values']
+
+
+@pytest.mark.parametrize('interval', [
+    '2019-09-20T05:00:00/P0DT15H',
+    '2019-09-20T05:00:00Z/PT15H',
+    'P0DT15H/2019-09-20T20:00:00+00:00',
+    '2019-09-20T07:00:00+02:00/2019-09-20T20:00:00Z',
+])
+def test_intervals_with_durations(store, interval):
+    assert parse_interval(interval) == (datetime(2019, 9, 20, 5), datetime(2019, 9, 20, 20))
+    assert select_steps(store, {'valid_time_interval': [interval]}) == [1, 2]
+
+
+@pytest.mark.parametrize('params', [
+    {'valid_time_interval': ['2019-09-20T05:00:00Z/P1M']},
+    {'valid_time_interval': ['2019-09-20T05:00:00Z/PT']},
+    {'bundles': ['basic,maritime']},
+    {'time_bundle': ['short_range_high_freq']},
+    {'valid_time_interval': ['2019-09-20T05:00:00Z']},
+    {'valid_time_interval': ['yesterday/today']},
+])
+def test_requests_the_store_cannot_answer_are_rejected(store, params):
+    with pytest.raises(ValueError):
+        select_steps(store, params)
+
+
+@pytest.mark.parametrize('issuance_time, status', [
+    ('2019-09-20T00:00:00Z', 200),
+    ('2019-09-20T00:00:00+00:00', 200),
+    ('2019-09-20T02:00:00+02:00', 200),
+    ('2019-09-20T06:00:00Z', 404),
+    ('not a time', 400),
+])
+def test_issuance_time_is_compared_as_a_time(store, issuance_time, status):
+    handler = type('Handler', (PointRequestHandler,), {'latest_store': LatestStore(os.path.dirname(store.directory))})
+    server = ThreadingHTTPServer(('localhost', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        query = urlencode({'lat': 10, 'lon': 20, 'issuance_time': issuance_time,
+                           'valid_time_interval': '2019-09-20T00:00:00/P0DT6H'})
+        try:
+            with urlopen('http://localhost:%d/forecast/point?%s' % (server.server_address[1], query)) as response:
+                assert len(json.load(response)['data']) == 2
+                result = response.status
+        except HTTPError as error:
+            result = error.code
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert result == status
@@ -0,0 +1,38 @@
+import numpy as np
+
+from precipitation import WindowAccumulator, deaccumulate
+
+
+def _add_all(accumulator, lead_times, totals):
+    windows = []
+    for lead_time, total in zip(lead_times, totals):
+        windows.extend((start, end, None if amount is None else float(amount))
+                       for start, end, amount in accumulator.add(lead_time, total))
+    return windows
+
+
+def test_consecutive_intervals_with_uneven_gaps():
+    lead_times = [0, 6, 12, 18, 30, 36, 42]
+    totals = [0.0, 1.0, 3.0, 3.5, 5.5, 6.0, 8.0]
+
+    windows = _add_all(WindowAccumulator(), lead_times, totals)
+
+    assert windows == [(0, 6, 1.0), (6, 12, 2.0), (12, 18, 0.5), (18, 30, 2.0), (30, 36, 0.5), (36, 42, 2.0)]
+
+
+def test_consecutive_intervals_match_deaccumulate_from_hourly_to_six_hourly():
+    # medium_range_high_freq has hourly lead times for the first day and then six hourly ones.
+    lead_times = list(range(1, 25)) + [30, 36, 42, 48]
+    totals = np.cumsum(np.linspace(0.1, 2.8, len(lead_times)))
+
+    windows = _add_all(WindowAccumulator(), lead_times, totals)
+    starts, amounts = deaccumulate(totals, lead_times)
+
+    assert [(start, end) for start, end, _ in windows] == list(zip(starts.tolist(), lead_times))
+    np.testing.assert_allclose([amount for _, _, amount in windows], amounts)
+
+
+def test_fixed_windows_skip_missing_boundaries():
+    windows = _add_all(WindowAccumulator(6), [0, 3, 6, 18], [0.0, 0.5, 1.0, 4.0])
+
+    assert windows == [(0, 6, 1.0), (6, 12, None), (12, 18, None)]